@@ -0,0 +1,63 @@
+"""Time of 10k activity log inserts with commit() and with bulk_create().
+
+It uses a temporary file database, so the fsync cost of each transaction
+is included. Run it with:
+
+    python -m benchmarks.bulk
+"""
+
+from os import environ, remove
+from os.path import isfile
+from tempfile import mkstemp
+from time import perf_counter
+
+_db_path = mkstemp(suffix=".db")[1]
+environ["BOT_DB_NAME"] = _db_path
+
+from fjfnaranjobot.backends import sqldb  # noqa: E402
+from fjfnaranjobot.components.terraria.models import (  # noqa: E402
+    TerrariaActivityLogPortions,
+)
+
+ROWS = 10_000
+
+
+def _rows():
+    rows = []
+    for value in range(ROWS):
+        row = TerrariaActivityLogPortions()
+        row.nickname = f"nickname{value % 10}"
+        row.username = f"username{value % 10}"
+        row.date = "2024-01-01"
+        row.portion = value
+        rows.append(row)
+    return rows
+
+
+def _commit_each(rows):
+    for row in rows:
+        row.commit()
+
+
+def _bulk_create(rows):
+    TerrariaActivityLogPortions.bulk_create(rows)
+
+
+def main():
+    try:
+        for name, insert in (("commit()", _commit_each), ("bulk", _bulk_create)):
+            TerrariaActivityLogPortions.delete_where()
+            rows = _rows()
+            start = perf_counter()
+            insert(rows)
+            seconds = perf_counter() - start
+            print(f"{name:>8}: {seconds * 1000:8.1f} ms to insert {ROWS} rows")
+    finally:
+        sqldb.close()
+        for suffix in ["", "-wal", "-shm"]:
+            if isfile(_db_path + suffix):
+                remove(_db_path + suffix)
+
+
+if __name__ == "__main__":
+    main()
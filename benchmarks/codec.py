@@ -0,0 +1,53 @@
+"""Time of decoding webhook updates and encoding Celery payloads.
+
+Compares the json module with the codec in fjfnaranjobot.codec (orjson if
+it's installed) over the updates in fixtures/updates.json. Run it with:
+
+    python -m benchmarks.codec
+"""
+
+from json import dumps as json_dumps
+from json import loads as json_loads
+from os.path import dirname, join
+from timeit import timeit
+
+from fjfnaranjobot.codec import CODEC_NAME, dumps_message, loads
+
+ROUNDS = 20_000
+
+with open(join(dirname(__file__), "fixtures", "updates.json"), "rb") as fixtures:
+    _UPDATES = [json_dumps(update).encode() for update in json_loads(fixtures.read())]
+
+# Payload as it grows along the Terraria status chain
+_PAYLOAD = {
+    "profile_id": 1,
+    "instance_ip": "203.0.113.10",
+    "instance_state": "running",
+    "status_response": "running",
+    "tshock_status": "200",
+    "tshock_players": [
+        {"nickname": f"player{n}", "username": f"user{n}"} for n in range(8)
+    ],
+}
+
+
+def _decode(decoder):
+    for update in _UPDATES:
+        decoder(update)
+
+
+def main():
+    for name, decoder, encoder in [
+        ("json", json_loads, json_dumps),
+        (CODEC_NAME, loads, dumps_message),
+    ]:
+        decode_ms = timeit(lambda: _decode(decoder), number=ROUNDS) * 1000
+        encode_ms = timeit(lambda: encoder(_PAYLOAD), number=ROUNDS) * 1000
+        print(
+            f"{name:>8}: {decode_ms:7.1f} ms to decode {ROUNDS * len(_UPDATES)}"
+            f" updates, {encode_ms:7.1f} ms to encode {ROUNDS} payloads"
+        )
+
+
+if __name__ == "__main__":
+    main()
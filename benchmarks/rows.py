@@ -0,0 +1,56 @@
+"""Memory and construction time of 100k ORM rows.
+
+Compares the slotted rows built by DbRelation with the same rows holding
+their values in a __dict__. Run it with:
+
+    python -m benchmarks.rows
+"""
+
+from timeit import repeat
+from tracemalloc import get_traced_memory, start, stop
+
+from fjfnaranjobot.components.terraria.models import TerrariaActivityLogPortions
+
+ROWS = 100_000
+REPEAT = 5
+
+_ROW = (1, "nickname", "username", "2024-01-01", 3)
+
+
+class DictRow:
+    def __init__(self, fields, row):
+        for field, value in zip(fields, row):
+            setattr(self, field.name, value)
+
+
+def _build_slotted():
+    return [TerrariaActivityLogPortions._from_row(_ROW) for _ in range(ROWS)]
+
+
+def _build_dict():
+    fields = TerrariaActivityLogPortions.fields
+    return [DictRow(fields, _ROW) for _ in range(ROWS)]
+
+
+def _measure(build):
+    # The best of several runs, as a single one is noisy
+    seconds = min(repeat(build, number=1, repeat=REPEAT))
+    start()
+    rows = build()
+    size, _peak = get_traced_memory()
+    stop()
+    del rows
+    return seconds, size
+
+
+def main():
+    for name, build in (("slots", _build_slotted), ("__dict__", _build_dict)):
+        seconds, size = _measure(build)
+        print(
+            f"{name:>8}: {seconds * 1000:7.1f} ms to build {ROWS} rows,"
+            f" {size / ROWS:6.1f} bytes per row"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,36 @@
 # TODO: Clean _n
 # TODO: Consider move only_ to commands mixins
+from asyncio import to_thread
 from collections.abc import MutableSet
+from contextlib import contextmanager
 from functools import wraps
 from os import environ
+from time import monotonic
+from weakref import WeakSet
 
 from telegram.ext import ApplicationHandlerStop
 
-from fjfnaranjobot.backends import sqldb
-from fjfnaranjobot.common import SORRY_TEXT, User
+from fjfnaranjobot.backends import async_sqldb, redis, redis_is_enabled, sqldb
+from fjfnaranjobot.backends.lazy import unwrap
+from fjfnaranjobot.backends.sqldb.versions import (
+    bump_version,
+    get_version,
+    init_versions,
+)
+from fjfnaranjobot.common import SORRY_TEXT, PaginatorSource, User
 from fjfnaranjobot.logging import getLogger
 
 logger = getLogger(__name__)
 
+FRIENDS_CACHE_CHECK_SECONDS = 5
+
+_FRIENDS_VERSION_NAME = "friends"
+
+FRIENDS_HASH_NAME = "friends"
+
+_FRIENDS_COLUMNS = ("id", "username")
+_FRIENDS_KEYS = ("id",)
+
 
 def get_owner_id():
     owner_id = environ.get("BOT_OWNER_ID")
@@ -94,76 +113,257 @@ def only_owner(f):
     return wrapper
 
 
+class _Friends(MutableSet, PaginatorSource):
+    """Set of friends (as Users) whose __iter__() can sort them by id.
+
+    The async methods run the blocking ones with _run(), off the event loop.
+    """
+
+    async def _run(self, function, *args):
+        return function(*args)
+
+    async def acontains(self, user):
+        return await self._run(self.__contains__, user)
+
+    async def aadd(self, user):
+        await self._run(self.add, user)
+
+    async def adiscard(self, user):
+        await self._run(self.discard, user)
+
+    async def aget_by_id(self, id_):
+        return await self._run(self.get_by_id, id_)
+
+    def count(self):
+        return len(self)
+
+    def __ior__(self, users):
+        self.update(users)
+        return self
+
+    def sorted(self):
+        return self.__iter__(sort=True)
+
+    def __le__(self, _other):
+        raise NotImplementedError
+
+
 # TODO: Use the micro orm here
-class _FriendsProxy(MutableSet):
+class _FriendsProxy(_Friends):
+    """Set of friends persisted in the database.
+
+    Reads are served from an in-memory index (id to username). Writes go to
+    the database and to the index, and bump a shared version counter. Other
+    processes notice the new version (checked at most every
+    FRIENDS_CACHE_CHECK_SECONDS) and reload their index.
+    """
+
     def __init__(self):
-        sqldb.execute(
-            "CREATE TABLE IF NOT EXISTS friends (id INTEGER PRIMARY KEY, username)"
+        # Databases with the friends table already created
+        self._initialized = WeakSet()
+        self._index = None
+        self._index_version = None
+        self._index_checked_at = None
+
+    def _init_table(self):
+        database = unwrap(sqldb)
+        if database not in self._initialized:
+            sqldb.execute(
+                "CREATE TABLE IF NOT EXISTS friends (id INTEGER PRIMARY KEY, username TEXT)"
+            )
+            init_versions(sqldb)
+            if not sqldb.in_transaction:
+                self._initialized.add(database)
+
+    def _index_is_fresh(self):
+        return (
+            self._index is not None
+            and monotonic() - self._index_checked_at < FRIENDS_CACHE_CHECK_SECONDS
         )
 
+    def _load_index(self):
+        if self._index_is_fresh():
+            return self._index
+        self._init_table()
+        version = get_version(sqldb, _FRIENDS_VERSION_NAME)
+        if self._index is None or version != self._index_version:
+            logger.debug(f"Loading friends index with version {version}.")
+            rows = sqldb.execute_and_fetch_all("SELECT id, username FROM friends")
+            index = {row[0]: row[1] for row in rows}
+            if sqldb.in_transaction:
+                # Not kept, as it may have rows the transaction rolls back
+                return index
+            self._index = index
+            self._index_version = version
+        self._index_checked_at = monotonic()
+        return self._index
+
+    @contextmanager
+    def _writing(self):
+        # Yields the index to write through, or None if it must be reloaded.
+        # Inside an outer transaction the write may still be rolled back.
+        self._init_table()
+        outer_transaction = sqldb.in_transaction
+        try:
+            with sqldb.transaction():
+                previous = bump_version(sqldb, _FRIENDS_VERSION_NAME)
+                if (
+                    not outer_transaction
+                    and self._index is not None
+                    and previous == self._index_version
+                ):
+                    self._index_version = previous + 1
+                    yield self._index
+                else:
+                    self._index = None
+                    yield None
+        except BaseException:
+            self._index = None
+            raise
+
+    async def _run(self, function, *args):
+        return await async_sqldb.run(function, *args)
+
     def __contains__(self, user):
-        exists = sqldb.execute_and_fetch_one(
-            "SELECT id FROM friends WHERE id=?",
-            (user.id,),
+        return True if user.id in self._load_index() else None
+
+    async def acontains(self, user):
+        # Without queries while the index is fresh
+        index = (
+            self._index
+            if self._index_is_fresh()
+            else await async_sqldb.run(self._load_index)
         )
-        return True if exists is not None else None
+        return True if user.id in index else None
 
     def __iter__(self, *, sort=False):
-        statement = "SELECT id, username FROM friends"
+        items = list(self._load_index().items())
         if sort:
-            statement += " ORDER BY id"
-        rows = sqldb.execute_and_fetch_all(statement)
-        for row in rows:
-            yield User(row[0], row[1])
+            items.sort()
+        for id_, username in items:
+            yield User(id_, username)
 
     def __len__(self):
-        return sqldb.execute_and_fetch_one("SELECT count(*) FROM friends")[0]
+        return len(self._load_index())
+
+    def page(self, offset, limit):
+        index = self._load_index()
+        ids = sorted(index)[offset : offset + limit]
+        return [User(id_, index[id_]) for id_ in ids]
 
     def add(self, user):
         logger.debug(
             f"Adding user with id {user.id} and username {user.username} as a friend."
         )
-        current_friends = sqldb.execute_and_fetch_all(
-            "SELECT id FROM friends WHERE id=?",
-            (user.id,),
-        )
-        exists = True if len(current_friends) > 0 else False
-        if exists:
-            sqldb.execute(
-                "UPDATE friends SET id=?, username=? WHERE id=?",
-                (user.id, user.username, user.id),
+        with self._writing() as index:
+            sqldb.upsert(
+                "friends", _FRIENDS_COLUMNS, _FRIENDS_KEYS, (user.id, user.username)
             )
-        else:
+            if index is not None:
+                index[user.id] = user.username
+
+    def update(self, users):
+        rows = [(user.id, user.username) for user in users]
+        logger.debug(f"Adding {len(rows)} users as friends.")
+        with self._writing() as index:
+            sqldb.upsert_many("friends", _FRIENDS_COLUMNS, _FRIENDS_KEYS, rows)
+            if index is not None:
+                index.update(rows)
+
+    def get_by_id(self, id_):
+        logger.debug(f"Getting user with id {id_} as a friend.")
+        index = self._load_index()
+        return User(id_, index[id_]) if id_ in index else None
+
+    def discard(self, user):
+        logger.debug(
+            f"Removing user with id {user.id} and username {user.username} as a friend."
+        )
+        with self._writing() as index:
             sqldb.execute(
-                "INSERT INTO friends VALUES (?, ?)",
-                (user.id, user.username),
+                "DELETE FROM friends WHERE id=?",
+                (user.id,),
             )
+            if index is not None:
+                index.pop(user.id, None)
+
+    def clear(self):
+        logger.debug("Removing all the friends.")
+        with self._writing() as index:
+            sqldb.execute("DELETE FROM friends")
+            if index is not None:
+                index.clear()
+
+
+class _RedisFriendsProxy(_Friends):
+    """Set of friends stored in a Redis hash (id to username).
+
+    Every read goes to Redis, so all the processes and bot replicas using it
+    see the same friends at once. Missing usernames are stored as "".
+    """
+
+    async def _run(self, function, *args):
+        # The client blocks, so it's kept off the event loop
+        return await to_thread(function, *args)
+
+    @staticmethod
+    def _user(id_, username):
+        return User(int(id_), username or None)
+
+    def __contains__(self, user):
+        return True if redis.hexists(FRIENDS_HASH_NAME, user.id) else None
+
+    def __iter__(self, *, sort=False):
+        items = [
+            self._user(id_, username)
+            for id_, username in redis.hgetall(FRIENDS_HASH_NAME).items()
+        ]
+        if sort:
+            items.sort(key=lambda user: user.id)
+        yield from items
+
+    def __len__(self):
+        return redis.hlen(FRIENDS_HASH_NAME)
+
+    def page(self, offset, limit):
+        return list(self.sorted())[offset : offset + limit]
+
+    def add(self, user):
+        logger.debug(
+            f"Adding user with id {user.id} and username {user.username} as a friend."
+        )
+        redis.hset(FRIENDS_HASH_NAME, user.id, user.username or "")
+
+    def update(self, users):
+        mapping = {user.id: user.username or "" for user in users}
+        logger.debug(f"Adding {len(mapping)} users as friends.")
+        if mapping:
+            redis.hset(FRIENDS_HASH_NAME, mapping=mapping)
 
     def get_by_id(self, id_):
         logger.debug(f"Getting user with id {id_} as a friend.")
-        friend = sqldb.execute_and_fetch_one(
-            "SELECT id, username FROM friends WHERE id=?",
-            (id_,),
-        )
-        return User(friend[0], friend[1]) if friend else None
+        username = redis.hget(FRIENDS_HASH_NAME, id_)
+        return self._user(id_, username) if username is not None else None
 
     def discard(self, user):
         logger.debug(
             f"Removing user with id {user.id} and username {user.username} as a friend."
         )
-        sqldb.execute(
-            "DELETE FROM friends WHERE id=?",
-            (user.id,),
-        )
+        redis.hdel(FRIENDS_HASH_NAME, user.id)
 
-    def sorted(self):
-        return self.__iter__(sort=True)
+    def clear(self):
+        logger.debug("Removing all the friends.")
+        redis.delete(FRIENDS_HASH_NAME)
 
-    def __le__(self, _other):
-        raise NotImplementedError
+
+def _ensure_friends():
+    if redis_is_enabled():
+        logger.debug("Using Redis friends from BOT_REDIS_URL var.")
+        return _RedisFriendsProxy()
+    return _FriendsProxy()
 
 
-friends = _FriendsProxy()
+friends = _ensure_friends()
 
 
 def only_friends(f):
@@ -173,7 +373,9 @@ def only_friends(f):
         owner_id = get_owner_id()
         user = update.effective_user
         friend = User(user.id, user.username)
-        if (owner_id is not None and user.id == owner_id) or friend not in friends:
+        if (owner_id is not None and user.id == owner_id) or not (
+            await friends.acontains(friend)
+        ):
             await _reply_unauthorized(update, context)
             _report_user(update, user, "only_friends")
             raise ApplicationHandlerStop()
@@ -1,7 +1,15 @@
 from os import environ, makedirs, remove
 from os.path import isdir, isfile, split
 
+from redis import Redis
+
+from fjfnaranjobot.backends.config.cached import CachedConfiguration
+from fjfnaranjobot.backends.config.redis import RedisConfiguration
 from fjfnaranjobot.backends.config.sql import SQLConfiguration
+from fjfnaranjobot.backends.lazy import LazyBackend, unwrap
+from fjfnaranjobot.backends.sqldb.asynchronous import AsyncSQLDatabase
+from fjfnaranjobot.backends.sqldb.metrics import SLOW_QUERY_SECONDS, MetricsSQLDatabase
+from fjfnaranjobot.backends.sqldb.postgresql import PostgreSQLSQLDatabase
 from fjfnaranjobot.backends.sqldb.sqlite3 import SQLite3SQLDatabase
 from fjfnaranjobot.logging import getLogger
 
@@ -11,6 +19,10 @@ _BOT_DB_DEFAULT_NAME = ":memory:"
 
 
 def _ensure_sqldb():
+    dsn = environ.get("BOT_DB_DSN")
+    if dsn:
+        logger.debug("Using PostgreSQL database from BOT_DB_DSN var.")
+        return PostgreSQLSQLDatabase(dsn)
     db_path = environ.get("BOT_DB_NAME", _BOT_DB_DEFAULT_NAME)
     logger.debug(f"Using {db_path} as database.")
     if not db_path.startswith(":"):
@@ -30,6 +42,68 @@ def _ensure_sqldb():
     return SQLite3SQLDatabase(db_path)
 
 
-sqldb = _ensure_sqldb()
+def _ensure_metrics_sqldb():
+    slow_query_ms = environ.get("BOT_DB_SLOW_QUERY_MS")
+    try:
+        slow_query_seconds = (
+            int(slow_query_ms) / 1000
+            if slow_query_ms is not None
+            else SLOW_QUERY_SECONDS
+        )
+    except ValueError:
+        raise ValueError("Invalid value in BOT_DB_SLOW_QUERY_MS var.")
+    return MetricsSQLDatabase(_ensure_sqldb(), slow_query_seconds)
+
+
+def redis_is_enabled():
+    """Whether the configuration and the friends are kept in Redis."""
+    return bool(environ.get("BOT_REDIS_URL"))
+
+
+def _ensure_redis():
+    return Redis.from_url(environ["BOT_REDIS_URL"], decode_responses=True)
+
+
+def _ensure_config():
+    if redis_is_enabled():
+        logger.debug("Using Redis configuration from BOT_REDIS_URL var.")
+        return RedisConfiguration(unwrap(redis))
+    return CachedConfiguration(SQLConfiguration(unwrap(sqldb), unwrap(async_sqldb)))
+
+
+# Nothing is opened at import time, only when first used or on start_backends()
+sqldb = LazyBackend(_ensure_metrics_sqldb)
+
+async_sqldb = LazyBackend(lambda: AsyncSQLDatabase(unwrap(sqldb)))
+
+redis = LazyBackend(_ensure_redis)
+
+config = LazyBackend(_ensure_config)
+
+
+def start_backends():
+    """Open the backends of this process.
+
+    Call it once the process is ready to do I/O (after forking, for the
+    Celery workers), so errors in the configuration show up early.
+    """
+    logger.debug("Starting backends.")
+    for backend in (sqldb, async_sqldb, config):
+        unwrap(backend)
+    if redis_is_enabled():
+        unwrap(redis)
+
 
-config = SQLConfiguration(sqldb)
+def stop_backends():
+    """Close the backends. Using them again opens new ones."""
+    logger.debug("Stopping backends.")
+    config.reset()
+    redis_backend = redis.reset()
+    if redis_backend is not None:
+        redis_backend.close()
+    async_backend = async_sqldb.reset()
+    if async_backend is not None:
+        async_backend.close()
+    backend = sqldb.reset()
+    if backend is not None:
+        backend.close()
@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from time import monotonic
+
+from fjfnaranjobot.backends.config.interface import Configuration
+from fjfnaranjobot.logging import getLogger
+
+logger = getLogger(__name__)
+
+CONFIG_CACHE_MAX_SIZE = 256
+CONFIG_CACHE_CHECK_SECONDS = 5
+
+# Not in the cache / cached as not existing in the wrapped configuration
+_NOT_CACHED = object()
+_NOT_FOUND = object()
+
+
+class CachedConfiguration(Configuration):
+    """Read-through LRU cache in front of another configuration.
+
+    Values (and missing keys) are kept for at most CONFIG_CACHE_MAX_SIZE keys.
+    Every CONFIG_CACHE_CHECK_SECONDS the version of the wrapped configuration
+    is compared with the one the cache was filled with, and the cache is
+    dropped if another process changed it. Configurations without version
+    are dropped on every check instead.
+    """
+
+    def __init__(self, config: Configuration):
+        self.config = config
+        self._entries = OrderedDict()
+        self._version = None
+        self._checked_at = None
+
+    def _must_check(self):
+        return (
+            self._checked_at is None
+            or monotonic() - self._checked_at >= CONFIG_CACHE_CHECK_SECONDS
+        )
+
+    def _apply_version(self, version):
+        if version is None or version != self._version:
+            if self._entries:
+                logger.debug("Dropping cached configuration values.")
+            self._entries.clear()
+            self._version = version
+        self._checked_at = monotonic()
+
+    def _lookup(self, key):
+        value = self._entries.get(key, _NOT_CACHED)
+        if value is _NOT_FOUND:
+            raise KeyError(f"The key '{key}' don't exists.")
+        if value is not _NOT_CACHED:
+            self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > CONFIG_CACHE_MAX_SIZE:
+            self._entries.popitem(last=False)
+
+    def __getitem__(self, key):
+        if self._must_check():
+            self._apply_version(self.config.version)
+        value = self._lookup(key)
+        if value is _NOT_CACHED:
+            try:
+                value = self.config[key]
+            except KeyError:
+                self._store(key, _NOT_FOUND)
+                raise
+            self._store(key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        self._entries.pop(key, None)
+        self.config[key] = value
+
+    def __delitem__(self, key):
+        self._entries.pop(key, None)
+        del self.config[key]
+
+    def update(self, *args, **kwargs):
+        self._entries.clear()
+        self.config.update(*args, **kwargs)
+
+    def __len__(self):
+        return len(self.config)
+
+    def __iter__(self):
+        return iter(self.config)
+
+    @property
+    def version(self):
+        return self.config.version
+
+    async def aversion(self):
+        return await self.config.aversion()
+
+    async def aget(self, key):
+        if self._must_check():
+            self._apply_version(await self.config.aversion())
+        value = self._lookup(key)
+        if value is _NOT_CACHED:
+            try:
+                value = await self.config.aget(key)
+            except KeyError:
+                self._store(key, _NOT_FOUND)
+                raise
+            self._store(key, value)
+        return value
+
+    async def aset(self, key, value):
+        self._entries.pop(key, None)
+        await self.config.aset(key, value)
+
+    async def adelete(self, key):
+        self._entries.pop(key, None)
+        await self.config.adelete(key)
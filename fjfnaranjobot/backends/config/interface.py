@@ -1,5 +1,30 @@
 from collections.abc import MutableMapping
+from re import compile
+
+MAX_KEY_LENGHT = 16
+
+_KEY_VALIDATOR = compile(r"^([a-zA-Z]+\.)*([a-zA-Z]+)+$")
+
+
+def validate_key(key):
+    if len(key) > MAX_KEY_LENGHT or _KEY_VALIDATOR.fullmatch(key) is None:
+        raise ValueError(f"No valid value for key {key}.")
 
 
 class Configuration(MutableMapping):
-    pass
+    @property
+    def version(self):
+        """Shared version of the stored values, or None if not tracked."""
+        return None
+
+    async def aversion(self):
+        return self.version
+
+    async def aget(self, key):
+        return self[key]
+
+    async def aset(self, key, value):
+        self[key] = value
+
+    async def adelete(self, key):
+        del self[key]
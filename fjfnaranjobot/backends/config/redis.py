@@ -0,0 +1,105 @@
+from asyncio import to_thread
+
+from fjfnaranjobot.backends.config.interface import Configuration, validate_key
+from fjfnaranjobot.logging import getLogger
+
+logger = getLogger(__name__)
+
+CONFIG_HASH_NAME = "config"
+CONFIG_VERSION_NAME = "config:version"
+# Keys whose value is None, stored as "" in the hash
+CONFIG_NONE_KEYS_NAME = "config:none"
+
+
+class RedisConfiguration(Configuration):
+    """Configuration stored in a Redis hash, shared by every process using it.
+
+    The client must decode the responses. Every change increments a version
+    counter in the same MULTI block, so a CachedConfiguration can still be
+    put in front of it. The async methods run the blocking client in a
+    worker thread.
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    @property
+    def version(self):
+        version = self.redis.get(CONFIG_VERSION_NAME)
+        return int(version) if version is not None else 0
+
+    async def aversion(self):
+        return await to_thread(lambda: self.version)
+
+    def __getitem__(self, key):
+        validate_key(key)
+        logger.debug(f"Getting configuration value for key '{key}'.")
+        value = self.redis.hget(CONFIG_HASH_NAME, key)
+        if value is None:
+            raise KeyError(f"The key '{key}' don't exists.")
+        if value == "" and self.redis.sismember(CONFIG_NONE_KEYS_NAME, key):
+            return None
+        return value
+
+    @staticmethod
+    def _set_items(pipeline, items):
+        none_keys = [key for key, value in items.items() if value is None]
+        other_keys = [key for key, value in items.items() if value is not None]
+        pipeline.hset(
+            CONFIG_HASH_NAME,
+            mapping={
+                key: value if value is not None else "" for key, value in items.items()
+            },
+        )
+        if none_keys:
+            pipeline.sadd(CONFIG_NONE_KEYS_NAME, *none_keys)
+        if other_keys:
+            pipeline.srem(CONFIG_NONE_KEYS_NAME, *other_keys)
+        pipeline.incr(CONFIG_VERSION_NAME)
+
+    def __setitem__(self, key, value):
+        validate_key(key)
+        shown_value = value[:10] if value is not None else "None"
+        logger.debug(
+            f"Setting configuration key '{key}' to value '{shown_value}' (cropped to 10 chars)."
+        )
+        with self.redis.pipeline() as pipeline:
+            self._set_items(pipeline, {key: value})
+            pipeline.execute()
+
+    def __delitem__(self, key):
+        validate_key(key)
+        logger.debug(f"Deleting configuration key '{key}'.")
+        with self.redis.pipeline() as pipeline:
+            pipeline.hdel(CONFIG_HASH_NAME, key)
+            pipeline.srem(CONFIG_NONE_KEYS_NAME, key)
+            pipeline.incr(CONFIG_VERSION_NAME)
+            deleted, _, _ = pipeline.execute()
+        if not deleted:
+            raise KeyError(f"The key '{key}' don't exists.")
+
+    def update(self, *args, **kwargs):
+        items = dict(*args, **kwargs)
+        for key in items:
+            validate_key(key)
+        logger.debug(f"Setting {len(items)} configuration keys.")
+        if not items:
+            return
+        with self.redis.pipeline() as pipeline:
+            self._set_items(pipeline, items)
+            pipeline.execute()
+
+    def __len__(self):
+        return self.redis.hlen(CONFIG_HASH_NAME)
+
+    def __iter__(self):
+        return iter(self.redis.hkeys(CONFIG_HASH_NAME))
+
+    async def aget(self, key):
+        return await to_thread(self.__getitem__, key)
+
+    async def aset(self, key, value):
+        await to_thread(self.__setitem__, key, value)
+
+    async def adelete(self, key):
+        await to_thread(self.__delitem__, key)
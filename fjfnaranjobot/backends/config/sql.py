@@ -1,28 +1,49 @@
-from re import compile
-
-from fjfnaranjobot.backends.config.interface import Configuration
+from fjfnaranjobot.backends.config.interface import Configuration, validate_key
+from fjfnaranjobot.backends.sqldb.asynchronous import AsyncSQLDatabase
 from fjfnaranjobot.backends.sqldb.interface import SQLDatabase
+from fjfnaranjobot.backends.sqldb.versions import (
+    bump_version,
+    get_version,
+    init_versions,
+)
 from fjfnaranjobot.logging import getLogger
 
 logger = getLogger(__name__)
 
-MAX_KEY_LENGHT = 16
+_CONFIG_VERSION_NAME = "config"
+
+_CONFIG_COLUMNS = ("key", "value")
+_CONFIG_KEYS = ("key",)
 
 
 class SQLConfiguration(Configuration):
-    def __init__(self, sqldb: SQLDatabase):
+    def __init__(self, sqldb: SQLDatabase, async_sqldb: AsyncSQLDatabase = None):
         self.sqldb = sqldb
-        self.sqldb.execute("CREATE TABLE IF NOT EXISTS config (key PRIMARY KEY, value)")
+        self.async_sqldb = (
+            async_sqldb if async_sqldb is not None else AsyncSQLDatabase(sqldb)
+        )
+        self._initialized = False
+
+    def _init_table(self):
+        if not self._initialized:
+            self.sqldb.execute(
+                "CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            init_versions(self.sqldb)
+            self._initialized = not self.sqldb.in_transaction
+
+    @property
+    def version(self):
+        self._init_table()
+        return get_version(self.sqldb, _CONFIG_VERSION_NAME)
 
-    @staticmethod
-    def _validate_key(key):
-        validator = compile(r"^([a-zA-Z]+\.)*([a-zA-Z]+)+$")
-        if validator.fullmatch(key) is None or len(key) > MAX_KEY_LENGHT:
-            raise ValueError(f"No valid value for key {key}.")
+    async def aversion(self):
+        return await self.async_sqldb.run(lambda: self.version)
 
     def __getitem__(self, key):
-        self._validate_key(key)
+        validate_key(key)
         logger.debug(f"Getting configuration value for key '{key}'.")
+        self._init_table()
         result = self.sqldb.execute_and_fetch_one(
             "SELECT value FROM config WHERE key=?", (key,)
         )
@@ -32,36 +53,52 @@ class SQLConfiguration(Configuration):
             return result[0]
 
     def __setitem__(self, key, value):
-        self._validate_key(key)
+        validate_key(key)
         shown_value = value[:10] if value is not None else "None"
         logger.debug(
             f"Setting configuration key '{key}' to value '{shown_value}' (cropped to 10 chars)."
         )
-        exists = self.sqldb.execute_and_fetch_one(
-            "SELECT value FROM config WHERE key=?", (key,)
-        )
-        if exists is None:
-            self.sqldb.execute(
-                "INSERT INTO config VALUES (?, ?) ",
-                (key, value),
-            )
-        else:
-            self.sqldb.execute(
-                "UPDATE config SET key=?, value=? WHERE key=?",
-                (key, value, key),
-            )
+        self._init_table()
+        with self.sqldb.transaction():
+            bump_version(self.sqldb, _CONFIG_VERSION_NAME)
+            self.sqldb.upsert("config", _CONFIG_COLUMNS, _CONFIG_KEYS, (key, value))
 
     def __delitem__(self, key):
-        self._validate_key(key)
+        validate_key(key)
         if key not in self:
             raise KeyError(f"The key '{key}' don't exists.")
         logger.debug(f"Deleting configuration key '{key}'.")
-        self.sqldb.execute("DELETE FROM config WHERE key=?", (key,))
+        with self.sqldb.transaction():
+            bump_version(self.sqldb, _CONFIG_VERSION_NAME)
+            self.sqldb.execute("DELETE FROM config WHERE key=?", (key,))
+
+    def update(self, *args, **kwargs):
+        items = dict(*args, **kwargs)
+        for key in items:
+            validate_key(key)
+        logger.debug(f"Setting {len(items)} configuration keys.")
+        self._init_table()
+        with self.sqldb.transaction():
+            bump_version(self.sqldb, _CONFIG_VERSION_NAME)
+            self.sqldb.upsert_many(
+                "config", _CONFIG_COLUMNS, _CONFIG_KEYS, list(items.items())
+            )
 
     def __len__(self):
+        self._init_table()
         return self.sqldb.execute_and_fetch_one("SELECT count(*) FROM config")[0]
 
     def __iter__(self):
+        self._init_table()
         all_keys = self.sqldb.execute_and_fetch_all("SELECT key FROM config")
         for key in all_keys:
             yield key[0]
+
+    async def aget(self, key):
+        return await self.async_sqldb.run(self.__getitem__, key)
+
+    async def aset(self, key, value):
+        await self.async_sqldb.run_in_transaction(self.__setitem__, key, value)
+
+    async def adelete(self, key):
+        await self.async_sqldb.run_in_transaction(self.__delitem__, key)
@@ -0,0 +1,60 @@
+from threading import Lock
+
+
+class LazyBackend:
+    """Stand-in for a backend that is only created when first used.
+
+    Attributes (and the mapping operations, for configurations) are looked up
+    in the backend, which is built calling 'factory' the first time (or by
+    unwrap()). reset() drops it, so the next use builds a new one.
+    """
+
+    __slots__ = ("_factory", "_backend", "_lock")
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._backend = None
+        self._lock = Lock()
+
+    def _get(self):
+        backend = self._backend
+        if backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._factory()
+                backend = self._backend
+        return backend
+
+    def reset(self):
+        with self._lock:
+            backend, self._backend = self._backend, None
+        return backend
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __getitem__(self, key):
+        return self._get()[key]
+
+    def __setitem__(self, key, value):
+        self._get()[key] = value
+
+    def __delitem__(self, key):
+        del self._get()[key]
+
+    def __contains__(self, key):
+        return key in self._get()
+
+    def __iter__(self):
+        return iter(self._get())
+
+    def __len__(self):
+        return len(self._get())
+
+    def __repr__(self):
+        return f"<LazyBackend of {self._backend!r}>"
+
+
+def unwrap(backend):
+    """The backend behind a LazyBackend, building it if needed."""
+    return backend._get() if isinstance(backend, LazyBackend) else backend
@@ -0,0 +1,61 @@
+from asyncio import get_running_loop
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import partial
+
+from fjfnaranjobot.backends.sqldb.interface import SQLDatabase
+
+
+class AsyncSQLDatabase:
+    """Awaitable version of a SQLDatabase.
+
+    Each call is delegated to the wrapped database inside a dedicated worker
+    thread, so a slow disk doesn't stall the event loop.
+    """
+
+    def __init__(self, sqldb: SQLDatabase):
+        self.sqldb = sqldb
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqldb")
+
+    async def _run(self, method, *args):
+        # The context goes along, for the unit of work and the query scope
+        loop = get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, partial(copy_context().run, method, *args)
+        )
+
+    async def run(self, function, *args):
+        """Run a blocking function using the database in the worker thread."""
+        return await self._run(function, *args)
+
+    def _in_transaction(self, function, *args):
+        with self.sqldb.transaction():
+            return function(*args)
+
+    async def run_in_transaction(self, function, *args):
+        """Run a blocking unit of work in the worker thread as one transaction."""
+        return await self._run(self._in_transaction, function, *args)
+
+    async def execute(self, sentence, *params):
+        await self._run(self.sqldb.execute, sentence, *params)
+
+    async def execute_many(self, sentence, params_list):
+        await self._run(self.sqldb.execute_many, sentence, params_list)
+
+    async def upsert(self, table, columns, keys, values):
+        await self._run(self.sqldb.upsert, table, columns, keys, values)
+
+    async def upsert_many(self, table, columns, keys, values_list):
+        await self._run(self.sqldb.upsert_many, table, columns, keys, values_list)
+
+    async def execute_and_fetch_index(self, sentence, *params):
+        return await self._run(self.sqldb.execute_and_fetch_index, sentence, *params)
+
+    async def execute_and_fetch_one(self, sentence, *params):
+        return await self._run(self.sqldb.execute_and_fetch_one, sentence, *params)
+
+    async def execute_and_fetch_all(self, sentence, *params):
+        return await self._run(self.sqldb.execute_and_fetch_all, sentence, *params)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -1,4 +1,28 @@
 from abc import ABC, abstractmethod
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def upsert_statement(table, columns, keys):
+    """INSERT of 'columns' updating the non 'keys' ones on a conflict."""
+    updates = [column for column in columns if column not in keys]
+    action = (
+        "UPDATE SET " + ", ".join(f"{column}=excluded.{column}" for column in updates)
+        if updates
+        else "NOTHING"
+    )
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)})"
+        f" VALUES ({', '.join('?' for _ in columns)})"
+        f" ON CONFLICT ({', '.join(keys)}) DO {action}"
+    )
+
+
+@lru_cache(maxsize=None)
+def update_statement(table, columns):
+    """UPDATE of 'columns' of the row with an id."""
+    assignments = ", ".join(f"{column}=?" for column in columns)
+    return f"UPDATE {table} SET {assignments} WHERE id=?"
 
 
 class SQLDatabase(ABC):
@@ -17,3 +41,47 @@ class SQLDatabase(ABC):
     @abstractmethod
     def execute_and_fetch_all(self, sentence, *params):
         pass
+
+    @abstractmethod
+    def execute_and_iterate(self, sentence, *params, batch_size):
+        pass
+
+    @abstractmethod
+    def execute_many(self, sentence, params_list):
+        pass
+
+    @abstractmethod
+    def table_columns(self, table):
+        """Names of the columns of 'table', empty if it doesn't exist."""
+        pass
+
+    @abstractmethod
+    def explain(self, sentence, *params):
+        """Query plan of the sentence, one line per step."""
+        pass
+
+    @abstractmethod
+    def transaction(self):
+        pass
+
+    @property
+    @abstractmethod
+    def in_transaction(self):
+        pass
+
+    def sync_ids(self, table):
+        """Make the next ids picked for 'table' follow the ones already in it.
+
+        Needed after writing rows with their own id. SQLite always picks the
+        next id from the rows in the table, so nothing is done.
+        """
+        pass
+
+    def upsert(self, table, columns, keys, values):
+        """Insert a row, or update the one with the same 'keys' if it exists."""
+        self.execute(upsert_statement(table, tuple(columns), tuple(keys)), values)
+
+    def upsert_many(self, table, columns, keys, values_list):
+        self.execute_many(
+            upsert_statement(table, tuple(columns), tuple(keys)), values_list
+        )
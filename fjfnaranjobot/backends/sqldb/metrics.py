@@ -0,0 +1,194 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+from time import monotonic, perf_counter
+
+from fjfnaranjobot.backends.sqldb.interface import SQLDatabase
+from fjfnaranjobot.logging import getLogger
+
+logger = getLogger(__name__)
+
+SLOW_QUERY_SECONDS = 0.1
+SUMMARY_LOG_SECONDS = 300
+SUMMARY_TOP_STATEMENTS = 5
+
+# Upper bounds of the latency histogram buckets (the last one is unbounded)
+LATENCY_BUCKETS_SECONDS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+# Who is running the queries (a command or a task), to group them by
+query_scope = ContextVar("query_scope", default=None)
+
+
+class StatementMetrics:
+    __slots__ = ("count", "seconds", "max_seconds", "rows", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_SECONDS) + 1)
+
+    def add(self, seconds, rows):
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.rows += rows
+        self.histogram[bisect_left(LATENCY_BUCKETS_SECONDS, seconds)] += 1
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "seconds": self.seconds,
+            "max_seconds": self.max_seconds,
+            "rows": self.rows,
+            "histogram": list(self.histogram),
+        }
+
+
+class QueryMetrics:
+    """Counters of the queries run, by statement and by scope."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.statements = {}
+            self.scopes = {}
+
+    def record(self, sentence, seconds, rows):
+        scope = query_scope.get()
+        with self._lock:
+            for metrics, key in ((self.statements, sentence), (self.scopes, scope)):
+                if key not in metrics:
+                    metrics[key] = StatementMetrics()
+                metrics[key].add(seconds, rows)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "statements": {
+                    sentence: metrics.as_dict()
+                    for sentence, metrics in self.statements.items()
+                },
+                "scopes": {
+                    scope: metrics.as_dict() for scope, metrics in self.scopes.items()
+                },
+            }
+
+    def summary(self, top=SUMMARY_TOP_STATEMENTS):
+        with self._lock:
+            lines = [
+                f"{metrics.count} queries in {metrics.seconds * 1000:.1f} ms"
+                f" from {scope or '<no scope>'}"
+                for scope, metrics in sorted(
+                    self.scopes.items(), key=lambda item: -item[1].seconds
+                )
+            ]
+            lines += [
+                f"{metrics.count} runs in {metrics.seconds * 1000:.1f} ms"
+                f" (max {metrics.max_seconds * 1000:.1f} ms): {sentence[:80]}"
+                for sentence, metrics in sorted(
+                    self.statements.items(), key=lambda item: -item[1].seconds
+                )[:top]
+            ]
+        return "\n".join(lines)
+
+
+class MetricsSQLDatabase(SQLDatabase):
+    """SQLDatabase recording metrics of every sentence run in another one.
+
+    Sentences slower than 'slow_query_seconds' are logged as warnings, and a
+    summary of the metrics is logged every SUMMARY_LOG_SECONDS.
+    """
+
+    def __init__(self, sqldb: SQLDatabase, slow_query_seconds=SLOW_QUERY_SECONDS):
+        self.sqldb = sqldb
+        self.slow_query_seconds = slow_query_seconds
+        self.metrics = QueryMetrics()
+        self._logged_at = monotonic()
+
+    def _record(self, sentence, seconds, rows):
+        self.metrics.record(sentence, seconds, rows)
+        if seconds >= self.slow_query_seconds:
+            logger.warning(
+                f"Slow query ({seconds * 1000:.1f} ms, {rows} rows)"
+                f" from {query_scope.get() or '<no scope>'}: {sentence}"
+            )
+        if monotonic() - self._logged_at >= SUMMARY_LOG_SECONDS:
+            self._logged_at = monotonic()
+            logger.info(f"Database queries so far:\n{self.metrics.summary()}")
+
+    def _timed(self, method, sentence, *params, count_rows=None):
+        started_at = perf_counter()
+        result = method(sentence, *params)
+        seconds = perf_counter() - started_at
+        rows = count_rows(result) if count_rows is not None else 0
+        self._record(sentence, seconds, rows)
+        return result
+
+    def execute(self, sentence, *params):
+        self._timed(self.sqldb.execute, sentence, *params)
+
+    def execute_many(self, sentence, params_list):
+        self._timed(self.sqldb.execute_many, sentence, params_list)
+
+    def execute_and_fetch_index(self, sentence, *params):
+        return self._timed(self.sqldb.execute_and_fetch_index, sentence, *params)
+
+    def execute_and_fetch_one(self, sentence, *params):
+        return self._timed(
+            self.sqldb.execute_and_fetch_one,
+            sentence,
+            *params,
+            count_rows=lambda row: 0 if row is None else 1,
+        )
+
+    def execute_and_fetch_all(self, sentence, *params):
+        return self._timed(
+            self.sqldb.execute_and_fetch_all, sentence, *params, count_rows=len
+        )
+
+    def execute_and_iterate(self, sentence, *params, batch_size):
+        # Only the time reading the rows is measured, not the time the caller
+        # spends with each one. Recorded once exhausted (or dropped).
+        rows = self.sqldb.execute_and_iterate(sentence, *params, batch_size=batch_size)
+        seconds = 0.0
+        count = 0
+        try:
+            while True:
+                started_at = perf_counter()
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += perf_counter() - started_at
+                count += 1
+                yield row
+        finally:
+            started_at = perf_counter()
+            rows.close()
+            seconds += perf_counter() - started_at
+            self._record(sentence, seconds, count)
+
+    def table_columns(self, table):
+        return self.sqldb.table_columns(table)
+
+    def sync_ids(self, table):
+        self.sqldb.sync_ids(table)
+
+    def explain(self, sentence, *params):
+        return self.sqldb.explain(sentence, *params)
+
+    def transaction(self):
+        return self.sqldb.transaction()
+
+    @property
+    def in_transaction(self):
+        return self.sqldb.in_transaction
+
+    def close(self):
+        self.sqldb.close()
@@ -0,0 +1,301 @@
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import count
+from os import getpid
+from re import IGNORECASE, compile
+from threading import BoundedSemaphore, Lock, local
+
+from fjfnaranjobot.backends.sqldb.interface import SQLDatabase
+from fjfnaranjobot.logging import getLogger
+
+try:
+    from psycopg import connect
+    from psycopg.types.numeric import NumericLoader
+except ImportError:
+    connect = None
+else:
+
+    class _SQLiteNumericLoader(NumericLoader):
+        """Load numerics (like sum() of integers) as SQLite returns them."""
+
+        def load(self, data):
+            value = super().load(data)
+            if value.is_finite() and value == value.to_integral_value():
+                return int(value)
+            return float(value)
+
+
+logger = getLogger(__name__)
+
+POOL_SIZE = 5
+POOL_TIMEOUT = 30
+
+# Names of the server side cursors, unique in every connection
+_cursor_ids = count()
+
+_CREATE_TABLE = compile(
+    r"^(CREATE TABLE (?:IF NOT EXISTS )?\w+ ?\()(.*)\)$", IGNORECASE
+)
+_ADD_COLUMN = compile(r"^(ALTER TABLE \w+ ADD COLUMN )(.*)$", IGNORECASE)
+_ROWID_PRIMARY_KEY = compile(r"^INTEGER PRIMARY KEY\b", IGNORECASE)
+_INTEGER = compile(r"\bINTEGER\b", IGNORECASE)
+_CONSTRAINT = compile(r"^(PRIMARY KEY|UNIQUE|NOT NULL|DEFAULT)\b", IGNORECASE)
+
+
+def _split_definitions(definitions):
+    depth = 0
+    current = ""
+    for char in definitions:
+        if char == "," and depth == 0:
+            yield current.strip()
+            current = ""
+            continue
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        current += char
+    yield current.strip()
+
+
+def _translate_column(definition):
+    name, _, column_type = definition.partition(" ")
+    column_type = column_type.strip()
+    if not column_type or _CONSTRAINT.match(column_type):
+        # SQLite keeps any value in them, no PostgreSQL type does the same
+        raise ValueError(f"Column '{name}' needs a type to be used in PostgreSQL.")
+    if _ROWID_PRIMARY_KEY.match(column_type):
+        # SQLite gives a new id to rows inserted without one
+        column_type = _ROWID_PRIMARY_KEY.sub(
+            "BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY", column_type
+        )
+    else:
+        # SQLite integers have 64 bits
+        column_type = _INTEGER.sub("BIGINT", column_type)
+    return f"{name} {column_type}"
+
+
+def _translate_placeholders(sentence):
+    translated = ""
+    quoted = False
+    for char in sentence:
+        if char == "'":
+            quoted = not quoted
+        elif char == "?" and not quoted:
+            char = "%s"
+        elif char == "%":
+            # psycopg reads a single one as a placeholder, even when quoted
+            char = "%%"
+        translated += char
+    return translated
+
+
+@lru_cache(maxsize=1024)
+def translate(sentence):
+    """Adapt a sentence written for SQLite to PostgreSQL.
+
+    Placeholders ('?') become '%s', literal '%' become '%%', the column types of CREATE TABLE and
+    ALTER TABLE become PostgreSQL ones, and a -1 LIMIT (no limit in SQLite)
+    becomes a NULL one. Columns without a type raise ValueError.
+    """
+    match = _CREATE_TABLE.match(sentence)
+    if match is not None:
+        sentence = (
+            match.group(1)
+            + ", ".join(
+                _translate_column(definition)
+                for definition in _split_definitions(match.group(2))
+            )
+            + ")"
+        )
+    match = _ADD_COLUMN.match(sentence)
+    if match is not None:
+        sentence = match.group(1) + _translate_column(match.group(2))
+    sentence = sentence.replace("LIMIT ?", "LIMIT NULLIF(?, -1)")
+    return _translate_placeholders(sentence)
+
+
+def _query(sentence, params):
+    # Without parameters psycopg would leave the '%%' as they are
+    return translate(sentence), params[0] if params else ()
+
+
+class PostgreSQLSQLDatabase(SQLDatabase):
+    """PostgreSQL database handing out connections from a bounded pool.
+
+    Sentences are written for SQLite and translated. A thread keeps the same
+    connection for a whole transaction. Otherwise it borrows one from the
+    pool for each sentence, waiting up to 'pool_timeout' seconds if
+    'pool_size' are already in use. Connections are never shared across a
+    fork.
+    """
+
+    def __init__(
+        self, dsn: str, pool_size: int = POOL_SIZE, pool_timeout: float = POOL_TIMEOUT
+    ):
+        if connect is None:
+            raise RuntimeError("The psycopg package is needed to use PostgreSQL.")
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self._reset_pool()
+
+    def _reset_pool(self):
+        self._pid = getpid()
+        self._lock = Lock()
+        self._slots = BoundedSemaphore(self.pool_size)
+        self._idle = []
+        self._local = local()
+
+    @contextmanager
+    def _connection(self):
+        if self._pid != getpid():
+            # The inherited connections are left alone for the parent
+            logger.debug("Process fork detected. Dropping inherited connections.")
+            self._reset_pool()
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            yield connection
+            return
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            raise TimeoutError(
+                f"No free PostgreSQL connection after {self.pool_timeout} seconds."
+            )
+        try:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None or connection.closed:
+                connection = connect(self.dsn, autocommit=True)
+                connection.adapters.register_loader("numeric", _SQLiteNumericLoader)
+            try:
+                yield connection
+            finally:
+                if not connection.closed:
+                    with self._lock:
+                        self._idle.append(connection)
+        finally:
+            self._slots.release()
+
+    def _can_stream(self):
+        # Whether at least another connection would be left free
+        if getattr(self._local, "connection", None) is not None:
+            return True
+        acquired = 0
+        while acquired < 2 and self._slots.acquire(blocking=False):
+            acquired += 1
+        for _ in range(acquired):
+            self._slots.release()
+        return acquired == 2
+
+    def close(self):
+        with self._lock:
+            for connection in self._idle:
+                connection.close()
+            self._idle = []
+
+    @property
+    def _transaction_depth(self):
+        return getattr(self._local, "transaction_depth", 0)
+
+    @_transaction_depth.setter
+    def _transaction_depth(self, depth):
+        self._local.transaction_depth = depth
+
+    @property
+    def in_transaction(self):
+        return self._transaction_depth > 0
+
+    @contextmanager
+    def transaction(self):
+        """Group the statements inside in a single transaction.
+
+        Nested transactions join the outermost one. Any exception rolls back
+        the whole unit of work.
+        """
+        depth = self._transaction_depth
+        if depth > 0:
+            self._transaction_depth = depth + 1
+            try:
+                yield
+            finally:
+                self._transaction_depth = depth
+            return
+        with self._connection() as connection:
+            self._local.connection = connection
+            self._transaction_depth = 1
+            try:
+                with connection.transaction():
+                    yield
+            finally:
+                self._local.connection = None
+                self._transaction_depth = 0
+
+    @contextmanager
+    def _cursor(self):
+        with self._connection() as connection:
+            with connection.cursor() as cursor:
+                yield cursor
+
+    def execute(self, sentence, *params):
+        with self._cursor() as cursor:
+            cursor.execute(*_query(sentence, params))
+
+    def execute_many(self, sentence, params_list):
+        # Outside a transaction each row would be committed on its own
+        with self.transaction():
+            with self._cursor() as cursor:
+                cursor.executemany(translate(sentence), params_list)
+
+    def execute_and_fetch_index(self, sentence, *params):
+        """Run an INSERT and return the id of the new row."""
+        with self._cursor() as cursor:
+            cursor.execute(*_query(sentence + " RETURNING id", params))
+            return cursor.fetchone()[0]
+
+    def execute_and_fetch_one(self, sentence, *params):
+        with self._cursor() as cursor:
+            return cursor.execute(*_query(sentence, params)).fetchone()
+
+    def execute_and_fetch_all(self, sentence, *params):
+        with self._cursor() as cursor:
+            return cursor.execute(*_query(sentence, params)).fetchall()
+
+    def execute_and_iterate(self, sentence, *params, batch_size):
+        """Stream the rows from a server side cursor, 'batch_size' at a time.
+
+        The connection is kept out of the pool until the rows are exhausted.
+        Streams never take the last free connection, all the rows are read at
+        once instead, so other sentences don't wait for streams to be closed.
+        """
+        if not self._can_stream():
+            yield from self.execute_and_fetch_all(sentence, *params)
+            return
+        # Named cursors only live inside a transaction
+        with self._connection() as connection:
+            with connection.transaction():
+                with connection.cursor(name=f"iterate_{next(_cursor_ids)}") as cursor:
+                    cursor.execute(*_query(sentence, params))
+                    rows = cursor.fetchmany(batch_size)
+                    while rows:
+                        yield from rows
+                        rows = cursor.fetchmany(batch_size)
+
+    def sync_ids(self, table):
+        # Identity columns only advance when they pick the id themselves. The
+        # sequence never goes back, or ids of deleted rows would be reused.
+        sequence = f"pg_get_serial_sequence('{table}', 'id')"
+        self.execute(
+            f"SELECT setval({sequence},"
+            f" GREATEST(max(id), pg_sequence_last_value({sequence})))"
+            f" FROM {table} HAVING max(id) IS NOT NULL"
+        )
+
+    def table_columns(self, table):
+        rows = self.execute_and_fetch_all(
+            "SELECT column_name FROM information_schema.columns"
+            " WHERE table_schema=current_schema() AND table_name=?"
+            " ORDER BY ordinal_position",
+            (table,),
+        )
+        return [row[0] for row in rows]
+
+    def explain(self, sentence, *params):
+        rows = self.execute_and_fetch_all("EXPLAIN " + sentence, *params)
+        return [row[0] for row in rows]
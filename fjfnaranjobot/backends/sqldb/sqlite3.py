@@ -1,24 +1,161 @@
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
+from os import getpid
 from sqlite3 import connect
+from threading import RLock
+from threading import enumerate as enumerate_threads
+from threading import get_ident, local
 
 from fjfnaranjobot.backends.sqldb.interface import SQLDatabase
+from fjfnaranjobot.logging import getLogger
+
+logger = getLogger(__name__)
+
+BUSY_TIMEOUT_SECONDS = 30
+
+# Prepared statements kept by each connection (128 by default). The relations
+# and their queries use more distinct sentences than that.
+CACHED_STATEMENTS = 512
+
+_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+)
 
 
 class SQLite3SQLDatabase(SQLDatabase):
+    """SQLite database handing out a connection per thread and process.
+
+    File databases are opened in WAL mode, so the bot, the Celery worker and
+    the Celery beat can read while another process writes. Connections are
+    never shared across a fork: a child process opens its own ones on first
+    use. In-memory databases only live inside a connection, so they are
+    shared by all the threads instead.
+    """
+
     def __init__(self, path: str):
-        self.connection = connect(path)
+        self.path = path
+        self._is_memory = path == ":memory:"
+        self._reset_pool()
+
+    def _reset_pool(self):
+        self._pid = getpid()
+        self._lock = RLock()
+        self._local = local()
+        self._connections = {}
+        self._shared_connection = None
+
+    def _connect(self):
+        # Pooled connections are only used by their own thread, but they can
+        # be closed from any thread by close() or when their thread is dead.
+        connection = connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_SECONDS,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+        )
+        if not self._is_memory:
+            for pragma in _CONNECTION_PRAGMAS:
+                connection.execute(pragma)
+        return connection
+
+    def _prune_dead_threads(self):
+        alive = {thread.ident for thread in enumerate_threads()}
+        for ident in list(self._connections):
+            if ident not in alive:
+                self._connections.pop(ident).close()
+
+    @property
+    def connection(self):
+        if self._pid != getpid():
+            logger.debug("Process fork detected. Dropping inherited connections.")
+            self._reset_pool()
+        if self._is_memory:
+            with self._lock:
+                if self._shared_connection is None:
+                    self._shared_connection = self._connect()
+            return self._shared_connection
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            with self._lock:
+                self._prune_dead_threads()
+                connection = self._connect()
+                self._connections[get_ident()] = connection
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        with self._lock:
+            for connection in self._connections.values():
+                connection.close()
+            self._connections = {}
+            self._local = local()
+            if self._shared_connection is not None:
+                self._shared_connection.close()
+                self._shared_connection = None
+
+    @property
+    def _transaction_depth(self):
+        return getattr(self._local, "transaction_depth", 0)
+
+    @_transaction_depth.setter
+    def _transaction_depth(self, depth):
+        self._local.transaction_depth = depth
+
+    @property
+    def in_transaction(self):
+        return self._transaction_depth > 0
+
+    @contextmanager
+    def transaction(self):
+        """Group the statements inside in a single transaction (and fsync).
+
+        Nested transactions join the outermost one. Any exception rolls back
+        the whole unit of work.
+        """
+        connection = self.connection
+        with self._lock if self._is_memory else nullcontext():
+            depth = self._transaction_depth
+            if depth == 0:
+                connection.execute("BEGIN IMMEDIATE")
+            self._transaction_depth = depth + 1
+            try:
+                yield
+            except BaseException:
+                if depth == 0:
+                    connection.rollback()
+                raise
+            else:
+                if depth == 0:
+                    connection.commit()
+            finally:
+                self._transaction_depth = depth
 
     @contextmanager
     def _sqlite3_cursor(self):
-        cursor = self.connection.cursor()
-        yield cursor
-        self.connection.commit()
-        cursor.close()
+        connection = self.connection
+        with self._lock if self._is_memory else nullcontext():
+            cursor = connection.cursor()
+            try:
+                yield cursor
+            except BaseException:
+                if self._transaction_depth == 0:
+                    connection.rollback()
+                raise
+            else:
+                if self._transaction_depth == 0:
+                    connection.commit()
+            finally:
+                cursor.close()
 
     def execute(self, sentence, *params):
         with self._sqlite3_cursor() as cursor:
             cursor.execute(sentence, *params)
 
+    def execute_many(self, sentence, params_list):
+        with self._sqlite3_cursor() as cursor:
+            cursor.executemany(sentence, params_list)
+
     def execute_and_fetch_index(self, sentence, *params):
         with self._sqlite3_cursor() as cursor:
             cursor.execute(sentence, *params)
@@ -32,3 +169,31 @@ class SQLite3SQLDatabase(SQLDatabase):
     def execute_and_fetch_all(self, sentence, *params):
         with self._sqlite3_cursor() as cursor:
             return cursor.execute(sentence, *params).fetchall()
+
+    def execute_and_iterate(self, sentence, *params, batch_size):
+        """Yield the resulting rows fetching them in batches.
+
+        In-memory databases share a connection between threads, so their
+        rows are fetched at once to avoid holding the lock between batches.
+        """
+        if self._is_memory:
+            yield from self.execute_and_fetch_all(sentence, *params)
+            return
+        with self._sqlite3_cursor() as cursor:
+            cursor.arraysize = batch_size
+            cursor.execute(sentence, *params)
+            rows = cursor.fetchmany()
+            while rows:
+                yield from rows
+                rows = cursor.fetchmany()
+
+    def table_columns(self, table):
+        # PRAGMA arguments can't be bound as parameters
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name {table}.")
+        rows = self.execute_and_fetch_all(f"PRAGMA table_info({table})")
+        return [row[1] for row in rows]
+
+    def explain(self, sentence, *params):
+        rows = self.execute_and_fetch_all("EXPLAIN QUERY PLAN " + sentence, *params)
+        return [row[-1] for row in rows]
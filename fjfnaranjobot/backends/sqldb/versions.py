@@ -0,0 +1,32 @@
+"""Named version counters stored in the database.
+
+Processes sharing the database (the bot, the Celery worker and beat) bump a
+counter in the same transaction that changes some data, so any in-memory
+cache of that data can notice it's stale by reading a single row.
+"""
+
+from fjfnaranjobot.backends.sqldb.interface import SQLDatabase
+
+
+def init_versions(sqldb: SQLDatabase):
+    sqldb.execute(
+        "CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, version INTEGER)"
+    )
+
+
+def get_version(sqldb: SQLDatabase, name):
+    row = sqldb.execute_and_fetch_one(
+        "SELECT version FROM versions WHERE name=?", (name,)
+    )
+    return row[0] if row is not None else 0
+
+
+def bump_version(sqldb: SQLDatabase, name):
+    """Increment the counter and return the value it had before."""
+    row = sqldb.execute_and_fetch_one(
+        "INSERT INTO versions VALUES (?, 1)"
+        " ON CONFLICT (name) DO UPDATE SET version=versions.version+1"
+        " RETURNING version",
+        (name,),
+    )
+    return row[0] - 1
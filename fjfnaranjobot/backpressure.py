@@ -0,0 +1,106 @@
+"""Admission of the webhook updates into the bounded update queue.
+
+When the handlers fall behind the queue fills up. Past SHED_RATIO of its
+size the low priority updates are acknowledged but dropped, and once it's
+full every update is rejected so Telegram retries it later.
+"""
+
+from time import monotonic
+
+from fjfnaranjobot.logging import getLogger
+
+logger = getLogger(__name__)
+
+SHED_RATIO = 0.8
+SUMMARY_LOG_SECONDS = 300
+
+# Updates nobody is waiting for, the first ones to go under load
+LOW_PRIORITY_UPDATE_TYPES = frozenset(
+    (
+        "edited_message",
+        "channel_post",
+        "edited_channel_post",
+        "message_reaction",
+        "message_reaction_count",
+        "poll",
+        "poll_answer",
+        "my_chat_member",
+        "chat_member",
+        "chat_boost",
+        "removed_chat_boost",
+    )
+)
+
+ACCEPT = "accept"
+SHED = "shed"
+REJECT = "reject"
+
+
+def update_type(update_json):
+    for key in update_json:
+        if key != "update_id":
+            return key
+    return None
+
+
+class UpdateQueueLoad:
+    """Decides if updates fit in an asyncio.Queue, counting the outcomes.
+
+    A queue without maxsize accepts everything. A summary of the counters is
+    logged every SUMMARY_LOG_SECONDS.
+    """
+
+    def __init__(self, queue, shed_ratio=SHED_RATIO):
+        self.queue = queue
+        self.shed_depth = (
+            max(1, int(queue.maxsize * shed_ratio)) if queue.maxsize > 0 else None
+        )
+        self.queued = 0
+        self.shed = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self._overloaded = False
+        self._logged_at = monotonic()
+
+    def admit(self, update_json):
+        """Return ACCEPT, SHED or REJECT for a decoded update."""
+        self._log_summary()
+        if self.shed_depth is None:
+            return ACCEPT
+        depth = self.queue.qsize()
+        if self.queue.full():
+            if not self._overloaded:
+                logger.warning(f"Update queue full ({depth}), rejecting updates.")
+                self._overloaded = True
+            self.rejected += 1
+            return REJECT
+        if depth >= self.shed_depth:
+            if update_type(update_json) in LOW_PRIORITY_UPDATE_TYPES:
+                self.shed += 1
+                return SHED
+        elif self._overloaded:
+            logger.info(f"Update queue back to {depth}, accepting updates.")
+            self._overloaded = False
+        return ACCEPT
+
+    def record_queued(self):
+        self.queued += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def _log_summary(self):
+        if monotonic() - self._logged_at >= SUMMARY_LOG_SECONDS:
+            self._logged_at = monotonic()
+            logger.info(f"Update queue so far: {self.summary()}")
+
+    def summary(self):
+        return ", ".join(f"{name} {value}" for name, value in self.snapshot().items())
+
+    def snapshot(self):
+        return {
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "maxsize": self.queue.maxsize,
+            "queued": self.queued,
+            "shed": self.shed,
+            "rejected": self.rejected,
+        }
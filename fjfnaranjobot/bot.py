@@ -1,13 +1,18 @@
+from asyncio import Queue, QueueFull
+from hmac import compare_digest
 from importlib import import_module
 from inspect import getmembers, isclass
-from json import JSONDecodeError, loads
 from os import environ
 
 from telegram import Update
 from telegram.ext import Application
 
+from fjfnaranjobot.backends import redis, redis_is_enabled
+from fjfnaranjobot.backpressure import REJECT, SHED, UpdateQueueLoad
+from fjfnaranjobot.codec import loads
 from fjfnaranjobot.command import BotCommandError, Command
 from fjfnaranjobot.common import command_list, get_bot_components
+from fjfnaranjobot.dedup import RedisUpdateDeduplicator, UpdateDeduplicator
 from fjfnaranjobot.logging import getLogger
 
 logger = getLogger(__name__)
@@ -16,10 +21,19 @@ BOT_TOKEN = environ.get("BOT_TOKEN")
 BOT_WEBHOOK_URL = environ.get("BOT_WEBHOOK_URL", "")
 BOT_WEBHOOK_TOKEN = environ.get("BOT_WEBHOOK_TOKEN", "")
 BOT_WEBHOOK_CERT = environ.get("BOT_WEBHOOK_CERT", "")
+# Updates waiting for the handlers, 0 for no limit
+BOT_UPDATE_QUEUE_SIZE = int(environ.get("BOT_UPDATE_QUEUE_SIZE", 1000))
 
 
 _BOT_COMPONENTS_TEMPLATE = "fjfnaranjobot.components.{}.info"
 
+# Root and health check URLs, answered without the bot by the server too
+STATIC_REPLIES = {
+    "": ("salute", "I'm fjfnaranjo's bot."),
+    "/": ("salute", "I'm fjfnaranjo's bot."),
+    "/ping": ("pong", "pong"),
+}
+
 _state = {"bot": None}
 
 
@@ -31,15 +45,35 @@ class BotTokenError(Exception):
     pass
 
 
+class BotBusyError(Exception):
+    pass
+
+
 # TODO: Check and test BOT_TOKEN not defined
 class Bot:
     def __init__(self):
         builder = Application.builder()
         builder.token(BOT_TOKEN)
         builder.updater(None)
+        self.update_queue = Queue(maxsize=BOT_UPDATE_QUEUE_SIZE)
+        builder.update_queue(self.update_queue)
+        self.update_queue_load = UpdateQueueLoad(self.update_queue)
         self.application = builder.build()
         self.bot = self.application.bot
         self.webhook_url = "/".join((BOT_WEBHOOK_URL, BOT_WEBHOOK_TOKEN))
+        self._webhook_token = BOT_WEBHOOK_TOKEN.encode()
+        # Handlers of the URLs preceded by the token, by the rest of the path
+        self._token_routes = {
+            None: self._dispatch_update,
+            "register_webhook": self._register_webhook,
+            "register_webhook_self": self._register_webhook_self,
+        }
+        # Shared by the replicas if they share Redis
+        self.deduplicator = (
+            RedisUpdateDeduplicator(redis)
+            if redis_is_enabled()
+            else UpdateDeduplicator()
+        )
         logger.debug("Bot init done.")
         self.application.add_error_handler(self._log_error_from_context)
         for component in get_bot_components().split(","):
@@ -88,55 +122,98 @@ class Bot:
                         f"'{component}' component handlers."
                     )
 
-    async def process_request(self, url_path, update):
-        # Root URL
-        if url_path == "" or url_path == "/":
-            logger.info("Reply with salute.")
-            return "I'm fjfnaranjo's bot."
-
-        # Healt check URL
-        elif url_path == "/ping":
-            logger.info("Reply with pong.")
-            return "pong"
-
-        # Register webhook request URL
-        elif url_path == ("/" + "/".join((BOT_WEBHOOK_TOKEN, "register_webhook"))):
-            await self.bot.set_webhook(url=self.webhook_url, drop_pending_updates=True)
-            logger.info("Reply with ok to register_webhook.")
-            return "ok"
-
-        # Register webhook request URL (using self signed cert)
-        elif url_path == ("/" + "/".join((BOT_WEBHOOK_TOKEN, "register_webhook_self"))):
-            await self.bot.set_webhook(
-                url=self.webhook_url,
-                certificate=open(BOT_WEBHOOK_CERT, "rb"),
-                drop_pending_updates=True,
-            )
-            logger.info("Reply with ok to register_webhook_self.")
-            return "ok (self)"
+    async def _register_webhook(self, _update):
+        await self.bot.set_webhook(url=self.webhook_url, drop_pending_updates=True)
+        logger.info("Reply with ok to register_webhook.")
+        return "ok"
 
-        # Don't allow other URLs unless preceded by token
-        elif url_path != "/" + BOT_WEBHOOK_TOKEN:
-            shown_url = url_path[:10]
-            logger.info(
-                f"Path '{shown_url}' (cropped to 10 chars) not preceded by token and not handled by bot."
-            )
-            raise BotTokenError(
-                f"Path '{shown_url}' (cropped to 10 chars) not preceded by token and not handled by bot."
-            )
+    async def _register_webhook_self(self, _update):
+        # Using a self signed cert
+        await self.bot.set_webhook(
+            url=self.webhook_url,
+            certificate=open(BOT_WEBHOOK_CERT, "rb"),
+            drop_pending_updates=True,
+        )
+        logger.info("Reply with ok to register_webhook_self.")
+        return "ok (self)"
 
-        # Parse response to bot library
+    async def _dispatch_update(self, update):
+        # Parse response to bot library (bytes are decoded by loads itself)
         try:
             update_json = loads(update)
-        except JSONDecodeError as e:
+        except ValueError as e:
+            # JSONDecodeError, or UnicodeDecodeError for non UTF-8 bytes
             logger.info("Received non-JSON request.")
             raise BotJSONError("Sent content isn't JSON.") from e
+        if not isinstance(update_json, dict):
+            logger.info("Received non-object JSON request.")
+            raise BotJSONError("Sent content isn't a JSON object.")
+
+        # Checked first, so the update isn't seen as repeated when retried
+        admission = self.update_queue_load.admit(update_json)
+        if admission == REJECT:
+            logger.info("Rejecting update, the update queue is full.")
+            raise BotBusyError("Too many updates waiting, retry later.")
+        if admission == SHED:
+            logger.info("Dropping low priority update, the update queue is busy.")
+            return "ok"
+
+        # Retried deliveries are acknowledged but not handled again
+        update_id = update_json.get("update_id")
+        if update_id is not None and not await self.deduplicator.afirst_seen(update_id):
+            logger.info(f"Dropping repeated update with id {update_id}.")
+            return "ok"
+
+        # Only built for the updates that are handled
+        try:
+            update_object = Update.de_json(update_json, self.bot)
+        except Exception:
+            # The update_id isn't kept, so a retry isn't seen as repeated
+            if update_id is not None:
+                await self.deduplicator.aforget(update_id)
+            raise
 
         # Delegate response to bot library
         logger.debug("Dispatch update to library.")
-        await self.application.update_queue.put(Update.de_json(update_json, self.bot))
+        try:
+            self.update_queue.put_nowait(update_object)
+        except QueueFull as e:
+            # Filled while the update_id was checked, so it's retried later
+            if update_id is not None:
+                await self.deduplicator.aforget(update_id)
+            logger.info("Rejecting update, the update queue is full.")
+            raise BotBusyError("Too many updates waiting, retry later.") from e
+        self.update_queue_load.record_queued()
         return "ok"
 
+    def _token_route(self, url_path):
+        # URLs handled by the bot are /<token> and /<token>/<action>
+        if not url_path.startswith("/"):
+            return None
+        token, *action = url_path[1:].split("/", 1)
+        if not compare_digest(token.encode(), self._webhook_token):
+            return None
+        return self._token_routes.get(action[0] if action else None)
+
+    async def process_request(self, url_path, update):
+        static_reply = STATIC_REPLIES.get(url_path)
+        if static_reply is not None:
+            name, reply = static_reply
+            logger.info(f"Reply with {name}.")
+            return reply
+
+        route = self._token_route(url_path)
+        if route is None:
+            # Don't allow other URLs unless preceded by token
+            shown_url = url_path[:10]
+            logger.info(
+                f"Path '{shown_url}' (cropped to 10 chars) not preceded by token and not handled by bot."
+            )
+            raise BotTokenError(
+                f"Path '{shown_url}' (cropped to 10 chars) not preceded by token and not handled by bot."
+            )
+        return await route(update)
+
 
 # TODO: Test
 def ensure_bot():
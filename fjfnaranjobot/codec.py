@@ -0,0 +1,136 @@
+"""JSON encoding used for the webhook updates and the Celery messages.
+
+orjson is used when it's installed, as it's several times faster than the
+json module. Otherwise the json module is used, with the same results.
+
+The Celery messages keep the values kombu's json serializer supports: a
+datetime, date, time, Decimal or bytes goes in the same {"__type__": ...,
+"__value__": ...} envelope kombu uses, and it's decoded back. A UUID is
+sent as a plain string, as orjson always does. Like in kombu, non string
+keys become strings and integers can have any size.
+"""
+
+from base64 import b64decode, b64encode
+from datetime import date, datetime, time
+from decimal import Decimal
+from json import dumps as _json_dumps
+from json import loads as _json_loads
+from re import compile
+from uuid import UUID
+
+try:
+    from orjson import OPT_NON_STR_KEYS, OPT_PASSTHROUGH_DATETIME
+    from orjson import dumps as _orjson_dumps
+    from orjson import loads as _orjson_loads
+except ImportError:
+    _orjson_dumps = _orjson_loads = None
+
+CODEC_NAME = "orjson" if _orjson_loads is not None else "json"
+
+# Celery serializer using this codec, registered in fjfnaranjobot.tasks
+CELERY_SERIALIZER = "botjson"
+CELERY_CONTENT_TYPE = "application/x-botjson"
+
+_TYPE_KEYS = {"__type__", "__value__"}
+
+# Digits of integers orjson may read as floats, beyond 64 bits
+_LONG_NUMBER = compile(r"\d{19}")
+_LONG_NUMBER_BYTES = compile(rb"\d{19}")
+
+# Envelopes of kombu, by type (datetime before date, as it's a subclass)
+_ENCODERS = (
+    (datetime, "datetime", datetime.isoformat),
+    (date, "date", date.isoformat),
+    (time, "time", time.isoformat),
+    (Decimal, "decimal", str),
+)
+
+_DECODERS = {
+    "datetime": datetime.fromisoformat,
+    "date": lambda value: datetime.fromisoformat(value).date(),
+    "time": time.fromisoformat,
+    "decimal": Decimal,
+    "uuid": UUID,
+    "bytes": str.encode,
+    "base64": lambda value: b64decode(value.encode()),
+}
+
+
+def loads(data):
+    """Decode JSON from bytes or str. Raises ValueError if it isn't valid."""
+    if _orjson_loads is not None:
+        return _orjson_loads(data)
+    return _json_loads(data)
+
+
+def dumps(value):
+    """Encode a value as compact JSON text."""
+    if _orjson_dumps is not None:
+        return _orjson_dumps(value).decode()
+    return _json_dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _default(value):
+    reducer = getattr(value, "__json__", None)
+    if reducer is not None:
+        return reducer()
+    for type_, marker, encoder in _ENCODERS:
+        if isinstance(value, type_):
+            return {"__type__": marker, "__value__": encoder(value)}
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, bytes):
+        try:
+            return {"__type__": "bytes", "__value__": value.decode()}
+        except UnicodeDecodeError:
+            return {"__type__": "base64", "__value__": b64encode(value).decode()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _object_hook(value):
+    if value.keys() != _TYPE_KEYS:
+        return value
+    decoder = _DECODERS.get(value["__type__"])
+    if decoder is None:
+        raise ValueError(f"Unsupported type {value['__type__']} in message.")
+    return decoder(value["__value__"])
+
+
+def _decode_types(value):
+    if isinstance(value, dict):
+        value = {key: _decode_types(item) for key, item in value.items()}
+        return _object_hook(value)
+    if isinstance(value, list):
+        return [_decode_types(item) for item in value]
+    return value
+
+
+def dumps_message(value):
+    """Encode a Celery message body, as kombu's json serializer would."""
+    if _orjson_dumps is not None:
+        try:
+            return _orjson_dumps(
+                value,
+                default=_default,
+                option=OPT_PASSTHROUGH_DATETIME | OPT_NON_STR_KEYS,
+            ).decode()
+        except TypeError:
+            # Integers beyond 64 bits, that only the json module encodes
+            pass
+    return _json_dumps(
+        value, default=_default, ensure_ascii=False, separators=(",", ":")
+    )
+
+
+def loads_message(data):
+    """Decode a Celery message body, with the types in envelopes."""
+    if isinstance(data, (bytes, bytearray)):
+        long_number = _LONG_NUMBER_BYTES.search(data)
+    else:
+        long_number = _LONG_NUMBER.search(data)
+    if _orjson_loads is None or long_number is not None:
+        return _json_loads(data, object_hook=_object_hook)
+    value = _orjson_loads(data)
+    # Most messages don't have any, so they aren't walked
+    marker = b"__type__" if isinstance(data, (bytes, bytearray)) else "__type__"
+    return _decode_types(value) if marker in data else value
@@ -33,13 +33,16 @@ from telegram.ext._application import DEFAULT_GROUP
 from telegram.ext.filters import COMMAND, CONTACT, TEXT, ChatType, Entity
 
 from fjfnaranjobot.auth import User, friends, get_owner_id
+from fjfnaranjobot.backends.sqldb.metrics import query_scope
 from fjfnaranjobot.common import (
     CANCEL_CAPTION,
     DEFAULT_PAGE_SIZE,
     NEXT_PAGE_CAPTION,
     RESTART_PAGINATOR_CAPTION,
+    PaginatorSource,
     quote_value_for_log,
 )
+from fjfnaranjobot.db import unit_of_work
 from fjfnaranjobot.logging import getLogger
 
 logger = getLogger(__name__)
@@ -107,6 +110,22 @@ class Command:
     def __str__(self):
         return f"{self.__class__.__name__}"
 
+    @contextmanager
+    def handling_update(self, update, context):
+        """Unpack the update and scope the rows and query metrics to it.
+
+        PTB runs the handlers inside a long lived task, so the identity map
+        and the query scope are reset when the handler is done instead of
+        being left for the next update.
+        """
+        scope_token = query_scope.set(str(self))
+        try:
+            with unit_of_work():
+                self.unpack_update_context(update, context)
+                yield
+        finally:
+            query_scope.reset(scope_token)
+
     def unpack_update_context(self, update, context):
         self.update = update
         self.context = context
@@ -202,12 +221,14 @@ class Command:
             return False
         return True
 
-    def user_is_friend(self):
+    async def user_is_friend(self):
         owner_id = get_owner_id()
         user = self.update.effective_user
         update_text = self.crop_update_text()
         friend = User(user.id, user.username)
-        if (owner_id is not None and user.id == owner_id) or friend not in friends:
+        if (owner_id is not None and user.id == owner_id) or not (
+            await friends.acontains(friend)
+        ):
             logger.warning(
                 "Message received from"
                 f" user {user.username} with id {user.id}"
@@ -247,7 +268,7 @@ class Command:
         return False
 
     # TODO: Log security warnings
-    def filter_command(self):
+    async def filter_command(self):
         bot_mentioned = self._check_and_remove_bot_mention()
 
         return (
@@ -269,7 +290,7 @@ class Command:
                 )
                 or (
                     self.permissions == Command.PermissionsEnum.ONLY_FRIENDS
-                    and (not self.user_is_real() or not self.user_is_friend())
+                    and (not self.user_is_real() or not await self.user_is_friend())
                 )
             )
             else True
@@ -279,12 +300,12 @@ class Command:
         raise NotImplementedError(f"Command {self} doesn't have an entrypoint.")
 
     async def command_handler(self, update, context):
-        self.unpack_update_context(update, context)
-        if not self.filter_command():
-            return
-        logger.info(f"Calling command entrypoint in {self}...")
-        await self.handle()
-        raise ApplicationHandlerStop()
+        with self.handling_update(update, context):
+            if not await self.filter_command():
+                return
+            logger.info(f"Calling command entrypoint in {self}...")
+            await self.handle()
+            raise ApplicationHandlerStop()
 
     async def reply(self, *args, **kwargs):
         if hasattr(self.update, "message") and self.update.message is not None:
@@ -480,33 +501,33 @@ class ConversationHandlerMixin(BotCommand):
         return states_handlers
 
     async def start_conversation(self, update, context):
-        self.unpack_update_context(update, context)
-        if not self.filter_command():
-            return
-        logger.info(f"Starting conversation {self}...")
-        conversation_message = await self.reply(
-            (
-                self.states[self.START].message
-                if self.states[self.START].message is not None
-                else f"Starting conversation '{self.command_name}'."
-            ),
-            reply_markup=self.markup_from_state(self.START),
-        )
-        self.chat_data["chat_id"] = conversation_message.chat.id
-        self.chat_data["message_id"] = conversation_message.message_id
-        raise ApplicationHandlerStop(self.START)
+        with self.handling_update(update, context):
+            if not await self.filter_command():
+                return
+            logger.info(f"Starting conversation {self}...")
+            conversation_message = await self.reply(
+                (
+                    self.states[self.START].message
+                    if self.states[self.START].message is not None
+                    else f"Starting conversation '{self.command_name}'."
+                ),
+                reply_markup=self.markup_from_state(self.START),
+            )
+            self.chat_data["chat_id"] = conversation_message.chat.id
+            self.chat_data["message_id"] = conversation_message.message_id
+            raise ApplicationHandlerStop(self.START)
 
     async def fallback(self, update, context):
-        self.unpack_update_context(update, context)
-        warning_text = f"Conversation {self} fallback handler reached."
-        try:
-            query_data = self.update.callback_query.data
-            quoted = quote_value_for_log(query_data)
-            warning_text += f" Callback query data was {quoted}."
-        except AttributeError:
-            pass
-        logger.warning(warning_text)
-        await self.end("Ups!")
+        with self.handling_update(update, context):
+            warning_text = f"Conversation {self} fallback handler reached."
+            try:
+                query_data = self.update.callback_query.data
+                quoted = quote_value_for_log(query_data)
+                warning_text += f" Callback query data was {quoted}."
+            except AttributeError:
+                pass
+            logger.warning(warning_text)
+            await self.end("Ups!")
 
     async def edit_message(self, text, reply_markup=None):
         await self.context.bot.edit_message_text(
@@ -592,102 +613,104 @@ class ConversationHandlerMixin(BotCommand):
         raise ApplicationHandlerStop(next_state_id)
 
     async def cancel_handler(self, update, context):
-        self.unpack_update_context(update, context)
-        logger.info(f"Cancelling conversation {self}...")
-        await self.end("Ok.")
+        with self.handling_update(update, context):
+            logger.info(f"Cancelling conversation {self}...")
+            await self.end("Ok.")
 
     def text_handler(self, handler):
         async def _text_handler_function(update, context):
-            self.unpack_update_context(update, context)
-            return await handler(self.update.message.text)
+            with self.handling_update(update, context):
+                return await handler(self.update.message.text)
 
         return _text_handler_function
 
     def contact_handler(self, handler):
         async def _contact_handler_function(update, context):
-            self.unpack_update_context(update, context)
-            contact = self.update.message.contact
-            if contact.user_id is None:
-                logger.debug("Received a contact without a Telegram ID.")
-            else:
-                return await handler(self.update.message.contact)
+            with self.handling_update(update, context):
+                contact = self.update.message.contact
+                if contact.user_id is None:
+                    logger.debug("Received a contact without a Telegram ID.")
+                else:
+                    return await handler(self.update.message.contact)
 
         return _contact_handler_function
 
     def inline_handler(self, handler):
         async def _inline_handler_function(update, context):
-            self.unpack_update_context(update, context)
-            query = self.update.callback_query.data
-            if query != "cancel":
-                logger.info(
-                    f"Continuing conversation {self} after receiving inline selection '{query}'..."
-                )
-            return await handler()
+            with self.handling_update(update, context):
+                query = self.update.callback_query.data
+                if query != "cancel":
+                    logger.info(
+                        f"Continuing conversation {self} after receiving inline selection '{query}'..."
+                    )
+                return await handler()
 
         return _inline_handler_function
 
     async def jump_handler(self, update, context):
-        self.unpack_update_context(update, context)
-        query = self.update.callback_query.data
-        # 'jump-0' => 0
-        state_id = int(query[5:])
-        logger.info(f"Continuing conversation {self} jumping to state {state_id}...")
-        await self.next(state_id)
+        with self.handling_update(update, context):
+            query = self.update.callback_query.data
+            # 'jump-0' => 0
+            state_id = int(query[5:])
+            logger.info(
+                f"Continuing conversation {self} jumping to state {state_id}..."
+            )
+            await self.next(state_id)
 
     async def paginator_handler(self, update, context):
-        self.unpack_update_context(update, context)
-        query = self.update.callback_query.data
-        # 'pag-0-4' => (0, "4")
-        # 'pag-0-next' => (0, "next")
-        state_id, selection = (
-            int(query[4 : query.find("-", 4)]),
-            query[query.find("-", 4) + 1 :],
-        )
+        with self.handling_update(update, context):
+            query = self.update.callback_query.data
+            # 'pag-0-4' => (0, "4")
+            # 'pag-0-next' => (0, "next")
+            state_id, selection = (
+                int(query[4 : query.find("-", 4)]),
+                query[query.find("-", 4) + 1 :],
+            )
 
-        paginator = self.states[state_id].paginator
-        if paginator.count == 0:
-            await self.end(self.empty_message)
+            paginator = self.states[state_id].paginator
+            if paginator.is_empty:
+                await self.end(paginator.empty_message)
 
-        current_page = self.chat_data.pop(f"pag-{state_id}-current-page", 0)
+            current_page = self.chat_data.pop(f"pag-{state_id}-current-page", 0)
 
-        if selection == "next":
-            logger.info(
-                f"Handling next page requested for paginator {state_id}"
-                f" in conversation {self} with last page {current_page}..."
-            )
+            if selection == "next":
+                logger.info(
+                    f"Handling next page requested for paginator {state_id}"
+                    f" in conversation {self} with last page {current_page}..."
+                )
 
-            if paginator.has_next_page(current_page):
-                current_page += 1
-            else:
-                current_page = 0
-            self.chat_data[f"pag-{state_id}-current-page"] = current_page
+                if paginator.has_next_page(current_page):
+                    current_page += 1
+                else:
+                    current_page = 0
+                self.chat_data[f"pag-{state_id}-current-page"] = current_page
 
-            await self.next(state_id)
-
-        else:
-            logger.info(
-                f"Handling selection {selection}"
-                f" received for paginator {state_id}"
-                f" in conversation {self}..."
-            )
+                await self.next(state_id)
 
-            last_ids = self.chat_data.pop(f"pag-{state_id}-last-ids")
-            current_ids = ",".join(
-                str(paginator.id_func(item))
-                for item in paginator.items_in_page(current_page)
-            )
-            if not last_ids == current_ids:
+            else:
                 logger.info(
-                    f"Resetting paginator {state_id}" f" in conversation {self}..."
+                    f"Handling selection {selection}"
+                    f" received for paginator {state_id}"
+                    f" in conversation {self}..."
                 )
-                paginator.reset_items()
-                self.chat_data[f"pag-{state_id}-current-page"] = 0
-                await self.next(state_id)
 
-            item = paginator.get_by_id(int(selection))
-            paginator.reset_items()
-            # TODO: Don't impose _handler sufix to the framework user
-            await getattr(self, paginator.handler + "_handler")(item)
+                last_ids = self.chat_data.pop(f"pag-{state_id}-last-ids")
+                current_ids = ",".join(
+                    str(paginator.id_func(item))
+                    for item in paginator.items_in_page(current_page)
+                )
+                if not last_ids == current_ids:
+                    logger.info(
+                        f"Resetting paginator {state_id}" f" in conversation {self}..."
+                    )
+                    paginator.reset_items()
+                    self.chat_data[f"pag-{state_id}-current-page"] = 0
+                    await self.next(state_id)
+
+                item = paginator.get_by_id(int(selection))
+                paginator.reset_items()
+                # TODO: Don't impose _handler sufix to the framework user
+                await getattr(self, paginator.handler + "_handler")(item)
 
     def markup_from_state(self, state_id):
         state = self.states[state_id]
@@ -764,19 +787,29 @@ class ConversationHandlerMixin(BotCommand):
 # TODO: NamedTuples or classes for members with dicts
 # TODO: Don't impose _handler sufix to the framework user
 class Inline:
+    __slots__ = ("caption", "handler")
+
     def __init__(self, caption, handler):
         self.caption = caption
         self.handler = handler
 
 
 class Jump:
+    __slots__ = ("caption", "state_id")
+
     def __init__(self, caption, state_id):
         self.caption = caption
         self.state_id = state_id
 
 
-# TODO: Forcing the iterable into a list looks wasteful
 class Paginator:
+    """Pages of items shown as inline buttons.
+
+    If 'iterable' is a PaginatorSource only the shown pages are queried
+    (page_size + 1 items each, to know if there is a next page). Any other
+    iterable is loaded into a list.
+    """
+
     def __init__(
         self,
         iterable,
@@ -794,26 +827,57 @@ class Paginator:
         self.page_size = page_size
 
         self.items = []
+        self._pages = {}
+        self._count = None
         self.reset_items()
 
         if page_size is None or not self.page_size > 0:
             raise BotCommandError("Paginator page_size must be greater than 0.")
 
+    @property
+    def is_query(self):
+        return isinstance(self.iterable, PaginatorSource)
+
     def reset_items(self):
-        self.items = list(self.iterable)
+        if self.is_query:
+            self._pages = {}
+            self._count = None
+        else:
+            self.items = list(self.iterable)
+
+    def _query_page(self, page):
+        if page not in self._pages:
+            self._pages[page] = list(
+                self.iterable.page(page * self.page_size, self.page_size + 1)
+            )
+        return self._pages[page]
 
     @property
     def count(self):
+        if self.is_query:
+            if self._count is None:
+                self._count = self.iterable.count()
+            return self._count
         return len(self.items)
 
+    @property
+    def is_empty(self):
+        if self.is_query:
+            return len(self._query_page(0)) == 0
+        return self.count == 0
+
     @property
     def has_pages(self):
-        return self.count > self.page_size
+        return self.has_next_page(0)
 
     def has_next_page(self, page):
+        if self.is_query:
+            return len(self._query_page(page)) > self.page_size
         return (page + 2) <= ceil(self.count / self.page_size)
 
     def items_in_page(self, page):
+        if self.is_query:
+            return self._query_page(page)[: self.page_size]
         page_start = page * self.page_size
         item_count_in_page = (
             self.page_size if self.has_next_page(page) else self.count - page_start
@@ -821,6 +885,8 @@ class Paginator:
         return self.items[page_start : page_start + item_count_in_page]
 
     def get_by_id(self, selection):
+        if self.is_query:
+            return self.iterable.get_by_id(selection)
         for item in self.items:
             if self.id_func(item) == selection:
                 return item
@@ -828,6 +894,17 @@ class Paginator:
 
 
 class State:
+    __slots__ = (
+        "id",
+        "cancelable",
+        "message",
+        "text_handler",
+        "contact_handler",
+        "inlines",
+        "jumps",
+        "paginator",
+    )
+
     def __init__(self):
         self.id = None
         self.cancelable = None
@@ -1,3 +1,4 @@
+from abc import ABC, abstractmethod
 from os import environ
 
 _BOT_OWNER_NAME_DEFAULT = "fjfnaranjo"
@@ -25,11 +26,33 @@ def get_bot_components():
 
 
 class User:
+    __slots__ = ("id", "username")
+
     def __init__(self, id_, username):
         self.id = int(id_)
         self.username = username
 
 
+class PaginatorSource(ABC):
+    """Collection able to return single pages of its items.
+
+    Paginators use it to query only the items they show instead of loading
+    the whole collection. Pages must be sorted in a stable order.
+    """
+
+    @abstractmethod
+    def count(self):
+        pass
+
+    @abstractmethod
+    def page(self, offset, limit):
+        pass
+
+    @abstractmethod
+    def get_by_id(self, id_):
+        pass
+
+
 class ScheduleEntry:
     def __init__(self, name, schedule, signature, **kwargs):
         self.name = name
@@ -49,7 +49,7 @@ class Config(ConversationHandlerMixin, BotCommand):
         log_key = quote_value_for_log(key)
         logger.debug(f"Received key name {log_key}.")
         try:
-            result = config[key]
+            result = await config.aget(key)
         except (ValueError, KeyError) as e:
             if isinstance(e, ValueError):
                 logger.debug("Key was invalid.")
@@ -66,7 +66,7 @@ class Config(ConversationHandlerMixin, BotCommand):
         log_key = quote_value_for_log(key)
         logger.debug(f"Received key name {log_key}.")
         try:
-            config[key]
+            await config.aget(key)
         except ValueError:
             logger.debug("Can't set invalid config key 'invalid-key'.")
             await self.end(f"The key '{key}' is not a valid key.")
@@ -84,7 +84,7 @@ class Config(ConversationHandlerMixin, BotCommand):
         logger.debug(f"Received value {log_value}.")
         key = self.chat_data["config_del_key"]
         log_key = quote_value_for_log(key)
-        config[key] = value
+        await config.aset(key, value)
         logger.debug(f"Stored {log_value} in key {log_key}.")
         await self.end("I'll remember that.")
 
@@ -92,7 +92,7 @@ class Config(ConversationHandlerMixin, BotCommand):
         log_key = quote_value_for_log(key)
         logger.debug(f"Received key name {log_key}.")
         try:
-            del config[key]
+            await config.adelete(key)
         except (ValueError, KeyError) as e:
             if isinstance(e, ValueError):
                 logger.debug("Key was invalid.")
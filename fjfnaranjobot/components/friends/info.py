@@ -90,7 +90,7 @@ class Friends(ConversationHandlerMixin, BotCommand):
         logger.debug("Received confirmation for deletion.")
 
         delete_user = User(*self.chat_data["friends_delete_user"])
-        friends.discard(delete_user)
+        await friends.adiscard(delete_user)
 
         await self.end()
 
@@ -103,7 +103,7 @@ class Friends(ConversationHandlerMixin, BotCommand):
         user = User(contact.user_id, username)
 
         logger.debug(f"Received a contact. Adding {user.username} as a friend.")
-        friends.add(user)
+        await friends.aadd(user)
         await self.end(f"Added {user.username} as a friend.")
 
     async def add_friend_id_handler(self, text):
@@ -145,7 +145,7 @@ class Friends(ConversationHandlerMixin, BotCommand):
         user_id_int = self.chat_data["friends_add_user_id"]
         user = User(user_id_int, username)
         logger.debug(f"Adding {user.username} as a friend.")
-        friends.add(user)
+        await friends.aadd(user)
         await self.end(f"Added {user.username} as a friend.")
 
     async def del_friend_handler(self, contact):
@@ -156,15 +156,13 @@ class Friends(ConversationHandlerMixin, BotCommand):
         username = " ".join([first_name, last_name]).strip()
         user = User(contact.user_id, username)
 
-        if user in friends:
-            for friend in friends:
-                if friend.id == user.id:
-                    friend_username = friend.username
-            logger.debug(f"Removing {friend_username} as a friend.")
+        friend = await friends.aget_by_id(user.id)
+        if friend is not None:
+            logger.debug(f"Removing {friend.username} as a friend.")
 
-            friends.discard(user)
+            await friends.adiscard(user)
 
-            await self.end(f"Removed {friend_username} as a friend.")
+            await self.end(f"Removed {friend.username} as a friend.")
 
         else:
             logger.debug(f"Not removing {user.username} because its not a friend.")
@@ -195,15 +193,13 @@ class Friends(ConversationHandlerMixin, BotCommand):
 
             else:
                 user = User(user_id_int, f"ID {user_id_int}")
-                if user in friends:
-                    for friend in friends:
-                        if friend.id == user.id:
-                            friend_username = friend.username
-                    logger.debug(f"Removing {friend_username} as a friend.")
+                friend = await friends.aget_by_id(user.id)
+                if friend is not None:
+                    logger.debug(f"Removing {friend.username} as a friend.")
 
-                    friends.discard(user)
+                    await friends.adiscard(user)
 
-                    await self.end(f"Removed {friend_username} as a friend.")
+                    await self.end(f"Removed {friend.username} as a friend.")
 
                 else:
                     logger.debug(
@@ -91,7 +91,7 @@ class TerrariaAdmin(ConversationHandlerMixin, BotCommand):
                 "next page (if apply)"
             )
             state.add_paginator(
-                IterableDbRelation(TerrariaProfile),
+                IterableDbRelation(TerrariaProfile, only=("id", "name", "status")),
                 lambda item: item.id,
                 lambda item: item.name,
                 "You don't have any profiles yet.",
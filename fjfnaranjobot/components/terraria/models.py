@@ -1,37 +1,39 @@
-from fjfnaranjobot.db import DbField, DbRelation
+from fjfnaranjobot.db import DbField, DbIndex, DbRelation
 
 
 class TerrariaProfile(DbRelation):
     fields = [
         DbField("id", "INTEGER PRIMARY KEY"),
-        DbField("name", "UNIQUE"),
-        DbField("aws_default_region"),
-        DbField("aws_access_key_id"),
-        DbField("aws_secret_access_key"),
-        DbField("instance_id"),
-        DbField("microapi_token"),
-        DbField("tshock_token"),
-        DbField("dns_name"),
-        DbField("status", "BOOLEAN DEFAULT(0)", False),
-        DbField("chat_id"),
+        DbField("name", "TEXT UNIQUE"),
+        DbField("aws_default_region", "TEXT"),
+        DbField("aws_access_key_id", "TEXT"),
+        DbField("aws_secret_access_key", "TEXT"),
+        DbField("instance_id", "TEXT"),
+        DbField("microapi_token", "TEXT"),
+        DbField("tshock_token", "TEXT"),
+        DbField("dns_name", "TEXT"),
+        DbField("status", "BOOLEAN DEFAULT FALSE", False),
+        DbField("chat_id", "INTEGER"),
     ]
 
 
 class TerrariaActivityLogPortions(DbRelation):
     fields = [
         DbField("id", "INTEGER PRIMARY KEY"),
-        DbField("nickname"),
-        DbField("username"),
-        DbField("date", "date"),
-        DbField("portion"),
+        DbField("nickname", "TEXT"),
+        DbField("username", "TEXT"),
+        DbField("date", "date", index=True),
+        DbField("portion", "INTEGER"),
     ]
+    indexes = [DbIndex("username", "date")]
 
 
 class TerrariaActivityLogDaily(DbRelation):
     fields = [
         DbField("id", "INTEGER PRIMARY KEY"),
-        DbField("nickname"),
-        DbField("username"),
-        DbField("date", "date"),
-        DbField("portions"),
+        DbField("nickname", "TEXT"),
+        DbField("username", "TEXT"),
+        DbField("date", "date", index=True),
+        DbField("portions", "INTEGER"),
     ]
+    indexes = [DbIndex("username", "date")]
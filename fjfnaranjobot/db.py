@@ -1,38 +1,467 @@
 # TODO: The ORM has to make a distinction between "relations" and "objects"
-from fjfnaranjobot.backends import sqldb
+from contextlib import contextmanager
+from contextvars import ContextVar
+from weakref import WeakKeyDictionary
+
+from fjfnaranjobot.backends import async_sqldb, sqldb
+from fjfnaranjobot.backends.lazy import unwrap
+from fjfnaranjobot.backends.sqldb.interface import update_statement, upsert_statement
+from fjfnaranjobot.backends.sqldb.versions import (
+    bump_version,
+    get_version,
+    init_versions,
+)
+from fjfnaranjobot.common import PaginatorSource
 from fjfnaranjobot.logging import getLogger
 
 logger = getLogger(__name__)
 
+STREAM_BATCH_SIZE = 100
+
+# Names of the relations with its table already created, by database (not by
+# the lazy stand-in, that outlives the databases it opens)
+_initialized_relations = WeakKeyDictionary()
+
+# All the relations defined, in definition order
+_relations = []
+
+
+# Rows already read in the current unit of work, by relation and id
+_identity_map = ContextVar("identity_map", default=None)
+
+# Value of the fields not read in partial rows
+_NOT_LOADED = object()
+
+
+def _initialized():
+    return _initialized_relations.setdefault(unwrap(sqldb), set())
+
+
+def transaction():
+    return sqldb.transaction()
+
+
+def start_unit_of_work():
+    """Start a new identity map in the current context.
+
+    Until it ends, the rows read by primary key or committed are remembered:
+    reading them again returns the same object, without querying the database
+    again. Streamed rows aren't remembered, so the map stays small. Returns
+    the token to pass to end_unit_of_work().
+    """
+    return _identity_map.set({})
+
+
+def end_unit_of_work(token):
+    _identity_map.reset(token)
+
+
+@contextmanager
+def unit_of_work():
+    token = start_unit_of_work()
+    try:
+        yield
+    finally:
+        end_unit_of_work(token)
+
+
+def _mapped(relation_cls, pk):
+    identity_map = _identity_map.get()
+    if identity_map is None:
+        return None
+    return identity_map.get((relation_cls, pk))
+
+
+def migrate():
+    """Bring the tables of all the defined relations up to date.
+
+    Every migration runs in a single transaction, so a failed one leaves the
+    schema untouched.
+    """
+    with sqldb.transaction():
+        for relation in _relations:
+            relation._migrate()
+    initialized = _initialized()
+    if not sqldb.in_transaction:
+        initialized.update(relation.relation_name for relation in _relations)
+
 
 # TODO: Test default
 class DbField:
-    def __init__(self, name, definition=None, default=None):
+    __slots__ = ("name", "definition", "default", "index")
+
+    def __init__(self, name, definition=None, default=None, index=False):
         self.name = name
         self.definition = definition
         self.default = default
+        self.index = index
 
 
-class DbRelation:
-    @staticmethod
-    def _init_table(relation_name, fields):
-        sqldb.execute(
-            f"CREATE TABLE IF NOT EXISTS {relation_name} ("
-            + (
-                ",".join(
-                    [
-                        field.name
-                        + (
-                            f" {field.definition}"
-                            if field.definition is not None
-                            else ""
-                        )
-                        for field in fields
-                    ]
-                )
+class DbIndex:
+    """Index over one or more fields of a relation, declared in 'indexes'."""
+
+    __slots__ = ("fields", "unique")
+
+    def __init__(self, *fields, unique=False):
+        if not fields:
+            raise ValueError("An index needs at least one field.")
+        self.fields = fields
+        self.unique = unique
+
+    def create_statement(self, relation_name):
+        name = "_".join((relation_name,) + self.fields + ("idx",))
+        unique = "UNIQUE " if self.unique else ""
+        return (
+            f"CREATE {unique}INDEX IF NOT EXISTS {name}"
+            f" ON {relation_name} ({', '.join(self.fields)})"
+        )
+
+
+class Aggregate:
+    """SQL aggregate function over a field, for Query.aggregate()."""
+
+    __slots__ = ("field",)
+
+    function = None
+
+    def __init__(self, field):
+        self.field = field
+
+    def sql(self, relation_cls):
+        relation_cls._check_columns([self.field])
+        return f"{self.function}({self.field})"
+
+
+class Count(Aggregate):
+    """Number of rows, or of non NULL values of 'field' if given."""
+
+    function = "count"
+
+    def __init__(self, field=None):
+        super().__init__(field)
+
+    def sql(self, relation_cls):
+        return "count(*)" if self.field is None else super().sql(relation_cls)
+
+
+class Sum(Aggregate):
+    function = "sum"
+
+
+# Operators of the lookups in Query.filter(), by lookup suffix
+_LOOKUP_OPERATORS = {
+    "": "=",
+    "ne": "!=",
+    "lt": "<",
+    "lte": "<=",
+    "gt": ">",
+    "gte": ">=",
+}
+
+
+class Query:
+    """Composable SELECT over a relation, compiled to parameterized SQL.
+
+    Every method returns a new query, so partial queries can be reused.
+    Filters are keyword arguments 'field' (equality) or 'field__lookup' with
+    a lookup in 'ne', 'lt', 'lte', 'gt', 'gte' or 'in', and they are all
+    AND-ed. Iterating the query lazily yields the rows, in batches.
+    """
+
+    __slots__ = (
+        "relation_cls",
+        "_conditions",
+        "_params",
+        "_order_by",
+        "_group_by",
+        "_limit",
+        "_offset",
+        "_only",
+        "_batch_size",
+    )
+
+    def __init__(self, relation_cls):
+        self.relation_cls = relation_cls
+        self._conditions = ()
+        self._params = ()
+        self._order_by = ()
+        self._group_by = ()
+        self._limit = None
+        self._offset = None
+        self._only = None
+        self._batch_size = STREAM_BATCH_SIZE
+
+    def _copy(self, **changes):
+        query = object.__new__(Query)
+        for name in Query.__slots__:
+            setattr(query, name, changes.get(name, getattr(self, name)))
+        return query
+
+    def filter(self, **lookups):
+        conditions = []
+        params = []
+        for key, value in lookups.items():
+            name, _, lookup = key.partition("__")
+            self.relation_cls._check_columns([name])
+            if lookup == "in":
+                values = list(value)
+                if values:
+                    placeholders = ", ".join("?" for _ in values)
+                    conditions.append(f"{name} IN ({placeholders})")
+                    params += values
+                else:
+                    conditions.append("1=0")
+            elif lookup in _LOOKUP_OPERATORS:
+                conditions.append(f"{name}{_LOOKUP_OPERATORS[lookup]}?")
+                params.append(value)
+            else:
+                raise ValueError(f"Unknown lookup '{lookup}' for field '{name}'.")
+        return self._copy(
+            _conditions=self._conditions + tuple(conditions),
+            _params=self._params + tuple(params),
+        )
+
+    def order_by(self, *fields):
+        """Sort by the 'fields', descending for the ones starting with '-'."""
+        self.relation_cls._check_columns(field.lstrip("-") for field in fields)
+        return self._copy(_order_by=self._order_by + fields)
+
+    def group_by(self, *fields):
+        self.relation_cls._check_columns(fields)
+        return self._copy(_group_by=self._group_by + fields)
+
+    def limit(self, limit):
+        return self._copy(_limit=limit)
+
+    def offset(self, offset):
+        return self._copy(_offset=offset)
+
+    def only(self, *names):
+        """Read just the 'names' fields, yielding partial rows."""
+        self.relation_cls._check_columns(names)
+        return self._copy(_only=names)
+
+    def batch_size(self, batch_size):
+        return self._copy(_batch_size=batch_size)
+
+    def _compile(self, columns):
+        sentence = f"SELECT {columns} FROM {self.relation_cls.relation_name}"
+        params = list(self._params)
+        if self._conditions:
+            sentence += " WHERE " + " AND ".join(self._conditions)
+        if self._group_by:
+            sentence += " GROUP BY " + ", ".join(self._group_by)
+        if self._order_by:
+            sentence += " ORDER BY " + ", ".join(
+                f"{field[1:]} DESC" if field.startswith("-") else field
+                for field in self._order_by
             )
+        if self._limit is not None or self._offset is not None:
+            sentence += " LIMIT ? OFFSET ?"
+            params += [self._limit if self._limit is not None else -1]
+            params += [self._offset or 0]
+        return sentence, params
+
+    def _compile_rows(self):
+        names = self._only or self.relation_cls._field_names
+        return self._compile(", ".join(names))
+
+    def _compile_scalar(self, aggregate):
+        if self._group_by:
+            raise ValueError("Use aggregate() to compute values by group.")
+        aggregate_sql = aggregate.sql(self.relation_cls)
+        if self._limit is None and self._offset is None:
+            return self._compile(aggregate_sql)
+        sentence, params = self._compile_rows()
+        return f"SELECT {aggregate_sql} FROM ({sentence}) AS query", params
+
+    def _iterate(self, sentence, params):
+        self.relation_cls._init_table()
+        return sqldb.execute_and_iterate(sentence, params, batch_size=self._batch_size)
+
+    def _fetch_one(self, sentence, params):
+        self.relation_cls._init_table()
+        return sqldb.execute_and_fetch_one(sentence, params)
+
+    def __iter__(self):
+        for row in self._iterate(*self._compile_rows()):
+            yield self.relation_cls._from_row(row, self._only)
+
+    def first(self):
+        """First row of the query, or None if there is none."""
+        row = self._fetch_one(*self.limit(1)._compile_rows())
+        if row is None:
+            return None
+        return self.relation_cls._from_row(row, self._only)
+
+    def values(self, *names):
+        """Yield tuples with the values of the 'names' fields."""
+        self.relation_cls._check_columns(names)
+        yield from self._iterate(*self._compile(", ".join(names)))
+
+    def aggregate(self, *aggregates):
+        """Yield a tuple per group with the group_by fields and 'aggregates'.
+
+        Without group_by() there is a single group with all the rows.
+        """
+        columns = list(self._group_by)
+        columns += [aggregate.sql(self.relation_cls) for aggregate in aggregates]
+        yield from self._iterate(*self._compile(", ".join(columns)))
+
+    def count(self):
+        return self._fetch_one(*self._compile_scalar(Count()))[0]
+
+    def sum(self, field):
+        return self._fetch_one(*self._compile_scalar(Sum(field)))[0]
+
+    def delete(self):
+        """Delete the rows matching the filters, in a single statement."""
+        if self._group_by or self._limit is not None or self._offset is not None:
+            raise ValueError("Only filtered queries can be deleted.")
+        self.relation_cls._init_table()
+        sentence = f"DELETE FROM {self.relation_cls.relation_name}"
+        if self._conditions:
+            sentence += " WHERE " + " AND ".join(self._conditions)
+        sqldb.execute(sentence, list(self._params))
+        identity_map = _identity_map.get()
+        if identity_map is not None:
+            for key in [key for key in identity_map if key[0] is self.relation_cls]:
+                del identity_map[key]
+
+    def explain(self):
+        """Query plan of the query, one line per step."""
+        self.relation_cls._init_table()
+        return sqldb.explain(*self._compile_rows())
+
+
+class _DbRelationMeta(type):
+    """Declare the 'fields' of each relation as its __slots__.
+
+    Rows hold their values in slots instead of a __dict__, so big result sets
+    take about a quarter less memory. Building them is a bit slower, as they
+    also keep the loaded values to detect changes.
+    """
+
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        if "__slots__" not in namespace:
+            inherited = {
+                slot
+                for base in bases
+                for klass in base.__mro__
+                for slot in getattr(klass, "__slots__", ())
+            }
+            namespace["__slots__"] = tuple(
+                field.name
+                for field in namespace.get("fields", ())
+                if field.name not in inherited
+            )
+        return super().__new__(mcs, name, bases, namespace, **kwargs)
+
+
+class DbRelation(metaclass=_DbRelationMeta):
+    """Base for the relations (tables) of the micro ORM.
+
+    Subclasses define a 'fields' list. The table name, the column list and the
+    SQL statements are computed once, when the subclass is defined, and the
+    table is created the first time the relation is used with a database.
+    Instances only have an attribute (a slot) for each field, plus the
+    values read from the database to find out which fields changed.
+    """
+
+    __slots__ = ("_loaded",)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = getattr(cls, "fields", None)
+        if fields is None:
+            return
+        relation_name = DbRelation._insert_under_before_upper(cls.__name__)
+        columns = ", ".join(field.name for field in fields)
+        placeholders = ", ".join("?" for _ in fields)
+        cls.relation_name = relation_name
+        cls._field_names = tuple(field.name for field in fields)
+        cls._id_index = cls._field_names.index("id")
+        cls._column_names = frozenset(cls._field_names)
+        cls._create_statement = (
+            f"CREATE TABLE IF NOT EXISTS {relation_name} ("
+            + ",".join(DbRelation._column_definition(field) for field in fields)
             + ")"
         )
+        cls._schema_version_name = f"schema.{relation_name}"
+        cls._select_statement = f"SELECT {columns} FROM {relation_name}"
+        cls._select_by_id_statement = f"{cls._select_statement} WHERE id=?"
+        cls._insert_statement = (
+            f"INSERT INTO {relation_name} ({columns}) VALUES ({placeholders})"
+        )
+        new_fields = [field.name for field in fields if field.name != "id"]
+        cls._insert_new_statement = (
+            f"INSERT INTO {relation_name} ({', '.join(new_fields)})"
+            f" VALUES ({', '.join('?' for _ in new_fields)})"
+        )
+        indexes = [DbIndex(field.name) for field in fields if field.index]
+        indexes += getattr(cls, "indexes", [])
+        for index in indexes:
+            cls._check_columns(index.fields)
+        cls._index_statements = [
+            index.create_statement(relation_name) for index in indexes
+        ]
+        cls._upsert_statement = upsert_statement(
+            relation_name, tuple(field.name for field in fields), ("id",)
+        )
+        cls._delete_statement = f"DELETE FROM {relation_name} WHERE id=?"
+        _relations.append(cls)
+
+    @classmethod
+    def _migrate(cls):
+        """Create the table, or add the columns of the fields it lacks.
+
+        Only additive changes are made: columns without a field are left
+        alone, as rows are always read by column name. The schema version of
+        the relation is bumped if anything changed.
+        """
+        init_versions(sqldb)
+        columns = sqldb.table_columns(cls.relation_name)
+        if not columns:
+            logger.info(f"Creating relation '{cls.relation_name}'.")
+            sqldb.execute(cls._create_statement)
+            changed = True
+        else:
+            missing = [field for field in cls.fields if field.name not in columns]
+            for field in missing:
+                logger.info(
+                    f"Adding field '{field.name}' to relation '{cls.relation_name}'."
+                )
+                sqldb.execute(
+                    f"ALTER TABLE {cls.relation_name}"
+                    f" ADD COLUMN {DbRelation._column_definition(field)}"
+                )
+            changed = len(missing) > 0
+        for statement in cls._index_statements:
+            sqldb.execute(statement)
+        if changed:
+            bump_version(sqldb, cls._schema_version_name)
+
+    @classmethod
+    def _init_table(cls):
+        initialized = _initialized()
+        if cls.relation_name not in initialized:
+            with sqldb.transaction():
+                cls._migrate()
+            # The creation is lost if an enclosing transaction is rolled back
+            if not sqldb.in_transaction:
+                initialized.add(cls.relation_name)
+
+    @classmethod
+    def schema_version(cls):
+        """Number of times the table of the relation has been changed."""
+        cls._init_table()
+        return get_version(sqldb, cls._schema_version_name)
+
+    @staticmethod
+    def _column_definition(field):
+        if field.definition is None:
+            return field.name
+        return f"{field.name} {field.definition}"
 
     @staticmethod
     def _insert_under_before_upper(class_name):
@@ -54,105 +483,369 @@ class DbRelation:
         return first_lower
 
     def __new__(cls, pk=None):
+        cls._init_table()
+        if pk is not None:
+            relation = _mapped(cls, pk)
+            if relation is not None:
+                return relation
+            row = sqldb.execute_and_fetch_one(cls._select_by_id_statement, (pk,))
+            if row is None:
+                raise cls._missing(pk)
+            relation = cls._from_row(row)
+            relation._remember()
+            return relation
         new_relation = super().__new__(cls)
-        relation_name = DbRelation._insert_under_before_upper(cls.__name__)
-        DbRelation._init_table(relation_name, cls.fields)
-        new_relation.relation_name = relation_name
         for field in cls.fields:
             # TODO: Check default value
             setattr(new_relation, field.name, field.default)
-        if pk is not None:
-            DbRelation._from_db(
-                new_relation, pk, new_relation.relation_name, cls.fields
-            )
+        new_relation._loaded = None
         return new_relation
 
-    @staticmethod
-    def _from_db(instance, pk, relation_name, fields):
-        values = sqldb.execute_and_fetch_one(
-            f"SELECT * FROM {relation_name} WHERE id=?", (pk,)
+    @classmethod
+    def _missing(cls, pk):
+        return RuntimeError(
+            f"Row with id {pk} doesn't exists in relation '{cls.relation_name}'."
         )
-        if values is None:
-            raise RuntimeError(
-                f"Row with id {pk} doesn't exists in relation '{relation_name}'."
+
+    @classmethod
+    def _from_row(cls, row, names=None):
+        if names is None:
+            # Only the rows read by primary key are remembered, so streaming
+            # in a unit of work doesn't keep every row alive
+            identity_map = _identity_map.get()
+            if identity_map is not None:
+                relation = identity_map.get((cls, row[cls._id_index]))
+                if relation is not None:
+                    return relation
+            relation = object.__new__(cls)
+            for name, value in zip(cls._field_names, row):
+                setattr(relation, name, value)
+            relation._loaded = tuple(row)
+            return relation
+        relation = object.__new__(cls)
+        for name, value in zip(names, row):
+            setattr(relation, name, value)
+        relation._mark_loaded()
+        return relation
+
+    def _remember(self):
+        identity_map = _identity_map.get()
+        if identity_map is not None:
+            identity_map[(type(self), self.id)] = self
+
+    def _mark_loaded(self, names=None):
+        # Partial rows have _NOT_LOADED in place of the fields they lack
+        if names is None or self._loaded is None:
+            self._loaded = tuple(
+                getattr(self, name, _NOT_LOADED) for name in self._field_names
             )
-        for field in zip(fields, values):
-            setattr(instance, field[0].name, field[1])
+        else:
+            self._loaded = tuple(
+                getattr(self, name, _NOT_LOADED) if name in names else loaded
+                for name, loaded in zip(self._field_names, self._loaded)
+            )
+
+    def _values(self):
+        return [getattr(self, field.name) for field in self.fields]
+
+    def _changes(self):
+        """Names and values of the fields changed since the row was read."""
+        changes = []
+        for name, loaded in zip(self._field_names, self._loaded):
+            value = getattr(self, name, _NOT_LOADED)
+            if value is not loaded and value != loaded:
+                changes.append((name, value))
+        return changes
+
+    def _new_values(self):
+        return [getattr(self, name) for name in self._field_names if name != "id"]
 
     def _commit_new(self):
+        # The id is left out for the database to pick it
         return sqldb.execute_and_fetch_index(
-            f"INSERT INTO {self.relation_name} VALUES ("
-            + ", ".join(["?" for _ in self.fields])
-            + ")",
-            [getattr(self, field.name) for field in self.fields],
+            self._insert_new_statement, self._new_values()
         )
 
-    def _commit_replace(self):
-        sqldb.execute(
-            f"UPDATE {self.relation_name} SET "
-            + ", ".join([f"{field.name}=?" for field in self.fields][1:])
-            + " WHERE id=?",
-            [getattr(self, field.name) for field in self.fields[1:]] + [self.id],
+    def upsert(self):
+        """Insert the row, or replace the row with the same id if it exists."""
+        sqldb.execute(self._upsert_statement, self._values())
+        sqldb.sync_ids(self.relation_name)
+        self._mark_loaded()
+        self._remember()
+
+    def _update(self, changes):
+        names = tuple(name for name, _ in changes)
+        loaded_id = self._loaded[self._id_index]
+        return sqldb.execute_and_fetch_one(
+            update_statement(self.relation_name, names) + " RETURNING id",
+            [value for _, value in changes] + [loaded_id],
         )
 
     def commit(self):
-        if self.id is not None:
-            values = sqldb.execute_and_fetch_one(
-                f"SELECT * FROM {self.relation_name} WHERE id=?", (self.id,)
-            )
-            if values is None:
-                self.id = self._commit_new()
-            else:
-                self._commit_replace()
-        else:
+        """Write the row, updating only the fields changed since it was read.
+
+        Rows read from the database and not changed since then aren't written
+        at all. If the row was deleted meanwhile, it's inserted again.
+        """
+        if self.id is None:
             self.id = self._commit_new()
+            self._mark_loaded()
+            self._remember()
+        elif self._loaded is None:
+            self.upsert()
+        else:
+            changes = self._changes()
+            if not changes:
+                return
+            if self._update(changes) is None:
+                self.upsert()
+            else:
+                self._mark_loaded()
+
+    @classmethod
+    def upsert_many(cls, relations):
+        """Commit all the rows in a single transaction.
+
+        Rows with an id are written with one batched upsert. Rows without it
+        are inserted one by one to read back their new id.
+        """
+        relations = list(relations)
+        with_id = [
+            relation._values() for relation in relations if relation.id is not None
+        ]
+        with sqldb.transaction():
+            if with_id:
+                sqldb.execute_many(cls._upsert_statement, with_id)
+                sqldb.sync_ids(cls.relation_name)
+            for relation in relations:
+                if relation.id is None:
+                    relation.id = relation._commit_new()
+        for relation in relations:
+            relation._mark_loaded()
+            relation._remember()
+
+    @classmethod
+    def bulk_create(cls, relations):
+        """Insert all the rows with batched statements in one transaction.
+
+        The ids given to the rows without one aren't read back, so those
+        rows keep None as id. Use upsert_many() if they are needed.
+        """
+        relations = list(relations)
+        with_id = [
+            relation._values() for relation in relations if relation.id is not None
+        ]
+        without_id = [
+            relation._new_values() for relation in relations if relation.id is None
+        ]
+        with sqldb.transaction():
+            if with_id:
+                sqldb.execute_many(cls._insert_statement, with_id)
+                sqldb.sync_ids(cls.relation_name)
+            if without_id:
+                sqldb.execute_many(cls._insert_new_statement, without_id)
+        for relation in relations:
+            if relation.id is not None:
+                relation._mark_loaded()
+                relation._remember()
+
+    @classmethod
+    def bulk_update(cls, relations, fields=None):
+        """Update 'fields' (all but id by default) of rows with a single batch.
+
+        All the rows must have an id. Rows that don't exist are skipped.
+        """
+        relations = list(relations)
+        if fields is None:
+            fields = [name for name in cls._field_names if name != "id"]
+        names = tuple(fields)
+        cls._check_columns(names)
+        if any(relation.id is None for relation in relations):
+            raise ValueError("The db objects to update must have id.")
+        with sqldb.transaction():
+            sqldb.execute_many(
+                update_statement(cls.relation_name, names),
+                [
+                    [getattr(relation, name) for name in names] + [relation.id]
+                    for relation in relations
+                ],
+            )
+        for relation in relations:
+            if relation._loaded is not None:
+                relation._mark_loaded(names)
+
+    @classmethod
+    def delete_where(cls, **filters):
+        """Delete all the rows matching the Query.filter() 'filters'."""
+        cls.query().filter(**filters).delete()
 
     # TODO: Test
     def delete(self):
         if self.id is not None:
-            sqldb.execute(f"DELETE FROM {self.relation_name} WHERE id=?", (self.id,))
+            sqldb.execute(self._delete_statement, (self.id,))
+            self._forget()
         else:
             raise ValueError("The db object doesn't have id.")
 
+    def _forget(self):
+        identity_map = _identity_map.get()
+        if identity_map is not None:
+            identity_map.pop((type(self), self.id), None)
+        self._loaded = None
+
+    @classmethod
+    async def aget(cls, pk):
+        relation = _mapped(cls, pk)
+        if relation is not None:
+            return relation
+        cls._init_table()
+        row = await async_sqldb.execute_and_fetch_one(
+            cls._select_by_id_statement, (pk,)
+        )
+        if row is None:
+            raise cls._missing(pk)
+        relation = cls._from_row(row)
+        relation._remember()
+        return relation
+
+    async def acommit(self):
+        await async_sqldb.run(self.commit)
+
+    async def adelete(self):
+        if self.id is not None:
+            await async_sqldb.execute(self._delete_statement, (self.id,))
+            self._forget()
+        else:
+            raise ValueError("The db object doesn't have id.")
+
+    @classmethod
+    def _check_columns(cls, names):
+        for name in names:
+            if name not in cls._column_names:
+                raise ValueError(
+                    f"Field '{name}' doesn't exists in relation '{cls.relation_name}'."
+                )
+
+    @classmethod
+    def query(cls):
+        """Query over all the rows, to refine with the Query methods."""
+        return Query(cls)
+
+    @classmethod
+    def _query(cls, where, order_by, limit, offset, only):
+        query = Query(cls)
+        if where:
+            query = query.filter(**where)
+        if order_by:
+            query = query.order_by(*order_by)
+        if limit is not None:
+            query = query.limit(limit)
+        if offset is not None:
+            query = query.offset(offset)
+        if only is not None:
+            query = query.only(*only)
+        return query
+
+    @classmethod
+    def stream(
+        cls,
+        where=None,
+        order_by=None,
+        limit=None,
+        offset=None,
+        batch_size=STREAM_BATCH_SIZE,
+        only=None,
+    ):
+        """Lazily yield the rows matching all the 'where' equalities.
+
+        Rows are read from the database in batches of 'batch_size', so memory
+        use doesn't depend on the size of the table. Each 'order_by' field
+        sorts ascending unless it starts with '-'. If 'only' lists some
+        fields, just those are read and set in the yielded (partial) rows.
+        """
+        query = cls._query(where, order_by, limit, offset, only)
+        yield from query.batch_size(batch_size)
+
+    @classmethod
+    def only(cls, *names, **kwargs):
+        """stream() of partial rows with just the 'names' fields set.
+
+        Reading any other field of those rows raises AttributeError.
+        Committing them writes just the fields changed, so 'id' must be one
+        of the 'names'.
+        """
+        return cls.stream(only=names, **kwargs)
+
+    @classmethod
+    def values(
+        cls,
+        *names,
+        where=None,
+        order_by=None,
+        limit=None,
+        offset=None,
+        batch_size=STREAM_BATCH_SIZE,
+    ):
+        """Like stream(), but yielding tuples with the 'names' fields values."""
+        query = cls._query(where, order_by, limit, offset, None)
+        yield from query.batch_size(batch_size).values(*names)
+
+    @classmethod
+    def explain(cls, where=None, order_by=None, limit=None, offset=None, only=None):
+        """Query plan of the stream() with the same arguments, one line per step.
+
+        Useful to check that a query uses an index (SEARCH ... USING INDEX)
+        instead of reading the whole table (SCAN).
+        """
+        return cls._query(where, order_by, limit, offset, only).explain()
+
+    @classmethod
+    def count(cls, where=None):
+        """Number of rows matching all the 'where' equalities."""
+        return cls._query(where, None, None, None, None).count()
+
+    @classmethod
+    def get(cls, pk, only=None):
+        """Row with the primary key 'pk', or None if there is none."""
+        if only is not None:
+            return cls._query({"id": pk}, None, None, None, only).first()
+        relation = _mapped(cls, pk)
+        if relation is None:
+            relation = cls._query({"id": pk}, None, None, None, None).first()
+            if relation is not None:
+                relation._remember()
+        return relation
+
     @classmethod
     def all(cls):
-        all_values = []
-        dummy = cls()
-        rows = sqldb.execute_and_fetch_all(f"SELECT * FROM {dummy.relation_name}")
-        for row in rows:
-            new_relation = cls()
-            for field in zip(cls.fields, row):
-                setattr(new_relation, field[0].name, field[1])
-            all_values.append(new_relation)
-        for value in all_values:
-            yield value
+        return cls.stream()
 
     @classmethod
     def select(cls, **kwargs):
-        all_values = []
-        dummy = cls()
-        where_keys = []
-        where_values = []
-        for key in kwargs:
-            where_keys.append(key)
-            where_values.append(kwargs[key])
-        where_conditions = [f"{key}=?" for key in where_keys]
-        where_body = " AND ".join(where_conditions)
-        rows = sqldb.execute_and_fetch_all(
-            f"SELECT * FROM {dummy.relation_name} WHERE {where_body}", where_values
-        )
-        for row in rows:
-            relation = cls()
-            for field in zip(cls.fields, row):
-                setattr(relation, field[0].name, field[1])
-            all_values.append(relation)
-        return all_values
+        return cls.stream(where=kwargs)
 
 
-class IterableDbRelation:
-    def __init__(self, relation_cls):
+class IterableDbRelation(PaginatorSource):
+    """All the rows of a relation, sorted by id when paginated.
+
+    If 'only' lists some fields, the rows are partial (see DbRelation.only).
+    """
+
+    def __init__(self, relation_cls, only=None):
         self.relation_cls = relation_cls
+        self.only = only
 
     def __iter__(self):
-        for row in self.relation_cls.all():
+        for row in self.relation_cls.stream(only=self.only):
             yield row
+
+    def count(self):
+        return self.relation_cls.count()
+
+    def page(self, offset, limit):
+        return self.relation_cls.stream(
+            order_by=["id"], limit=limit, offset=offset, only=self.only
+        )
+
+    def get_by_id(self, id_):
+        return self.relation_cls.get(id_, only=self.only)
@@ -0,0 +1,89 @@
+"""Detection of the updates Telegram delivers more than once.
+
+Telegram retries a webhook delivery when the reply is slow, so the same
+update_id can arrive again while (or after) its first delivery is handled.
+"""
+
+from asyncio import to_thread
+from collections import OrderedDict
+from time import monotonic
+
+DEDUP_WINDOW_SECONDS = 600
+DEDUP_MAX_SIZE = 10_000
+
+_REDIS_KEY_TEMPLATE = "update:{}"
+
+
+class _Deduplicator:
+    async def afirst_seen(self, update_id):
+        return self.first_seen(update_id)
+
+    async def aforget(self, update_id):
+        self.forget(update_id)
+
+
+class UpdateDeduplicator(_Deduplicator):
+    """update_ids seen in the last 'window_seconds', in this process.
+
+    At most 'max_size' ids are kept, dropping the oldest ones first.
+    """
+
+    def __init__(self, window_seconds=DEDUP_WINDOW_SECONDS, max_size=DEDUP_MAX_SIZE):
+        self.window_seconds = window_seconds
+        self.max_size = max_size
+        # Seen at time, in the order they were seen
+        self._seen = OrderedDict()
+
+    def _expire(self, now):
+        while self._seen:
+            update_id, seen_at = next(iter(self._seen.items()))
+            if now - seen_at < self.window_seconds:
+                break
+            del self._seen[update_id]
+
+    def first_seen(self, update_id):
+        """Remember the update_id, returning if it wasn't seen before."""
+        now = monotonic()
+        self._expire(now)
+        if update_id in self._seen:
+            return False
+        self._seen[update_id] = now
+        if len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+        return True
+
+    def forget(self, update_id):
+        """Let the update_id be seen again, if it couldn't be handled."""
+        self._seen.pop(update_id, None)
+
+
+class RedisUpdateDeduplicator(_Deduplicator):
+    """update_ids seen in the last 'window_seconds' by any bot replica.
+
+    The async methods run the blocking client in a worker thread.
+    """
+
+    def __init__(self, redis, window_seconds=DEDUP_WINDOW_SECONDS):
+        self.redis = redis
+        self.window_seconds = window_seconds
+
+    def first_seen(self, update_id):
+        """Remember the update_id, returning if it wasn't seen before."""
+        return bool(
+            self.redis.set(
+                _REDIS_KEY_TEMPLATE.format(update_id),
+                1,
+                nx=True,
+                ex=self.window_seconds,
+            )
+        )
+
+    def forget(self, update_id):
+        """Let the update_id be seen again, if it couldn't be handled."""
+        self.redis.delete(_REDIS_KEY_TEMPLATE.format(update_id))
+
+    async def afirst_seen(self, update_id):
+        return await to_thread(self.first_seen, update_id)
+
+    async def aforget(self, update_id):
+        await to_thread(self.forget, update_id)
@@ -1,10 +1,19 @@
 from asyncio import run
+from os import environ
 from warnings import filterwarnings
 
 from telegram.warnings import PTBUserWarning
 from uvicorn import Config, Server
 
-from fjfnaranjobot.bot import BotJSONError, BotTokenError, ensure_bot
+from fjfnaranjobot.backends import start_backends, stop_backends
+from fjfnaranjobot.bot import (
+    STATIC_REPLIES,
+    BotBusyError,
+    BotJSONError,
+    BotTokenError,
+    ensure_bot,
+)
+from fjfnaranjobot.db import migrate
 from fjfnaranjobot.logging import getLogger
 
 filterwarnings(
@@ -13,19 +22,47 @@ filterwarnings(
 
 logger = getLogger(__name__)
 
+# Telegram updates are a few KiB, anything much bigger isn't one
+BOT_MAX_BODY_BYTES = int(environ.get("BOT_MAX_BODY_BYTES", 1024 * 1024))
+
+# Sent with the 429 replies when the bot falls behind
+BUSY_RETRY_AFTER_SECONDS = 5
+
 bot = ensure_bot()
 
 
+class BodyTooLargeError(Exception):
+    pass
+
+
+class BodyLengthError(Exception):
+    pass
+
+
+def _content_length(scope):
+    for name, value in scope.get("headers", []):
+        if name.lower() == b"content-length":
+            try:
+                length = int(value)
+            except ValueError:
+                length = -1
+            if length < 0:
+                raise BodyLengthError("Invalid Content-Length header.")
+            return length
+    return None
+
+
 async def application(scope, receive, send):
     assert scope["type"] == "http"
 
-    async def send_text_response(text, status=200):
+    async def send_text_response(text, status=200, headers=()):
         await send(
             {
                 "type": "http.response.start",
                 "status": status,
                 "headers": [
                     [b"content-type", b"text/plain"],
+                    *headers,
                 ],
             }
         )
@@ -37,24 +74,53 @@ async def application(scope, receive, send):
         )
 
     async def read_body():
-        body = b""
+        # Rejected before reading anything if the client announces it's big
+        content_length = _content_length(scope)
+        if content_length is not None and content_length > BOT_MAX_BODY_BYTES:
+            raise BodyTooLargeError(f"Content-Length {content_length} too large.")
+
+        chunks = []
+        size = 0
         more_body = True
 
         while more_body:
             message = await receive()
-            body += message.get("body", b"")
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > BOT_MAX_BODY_BYTES:
+                raise BodyTooLargeError(f"Body larger than {BOT_MAX_BODY_BYTES}.")
+            chunks.append(chunk)
             more_body = message.get("more_body", False)
 
-        return body
+        return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+
+    static_reply = STATIC_REPLIES.get(scope["path"])
+    if static_reply is not None:
+        # Liveness probes and the like never reach the bot
+        await send_text_response(static_reply[1])
+        return
 
     try:
         logger.debug("Defer request to bot for processing.")
         request_body = await read_body()
         bot_reply = await bot.process_request(scope["path"], request_body)
         await send_text_response(bot_reply)
+    except BodyTooLargeError as e:
+        logger.info("Request body too large.", exc_info=e)
+        await send_text_response("413 Content Too Large", status=413)
+    except BodyLengthError as e:
+        logger.info("Request with invalid length.", exc_info=e)
+        await send_text_response(str(e), status=400)
     except BotJSONError as e:
         logger.info("Error from bot framework (json).", exc_info=e)
         await send_text_response(str(e), status=400)
+    except BotBusyError as e:
+        logger.info("Bot too busy for the update.", exc_info=e)
+        await send_text_response(
+            "429 Too Many Requests",
+            status=429,
+            headers=[[b"retry-after", str(BUSY_RETRY_AFTER_SECONDS).encode()]],
+        )
     except BotTokenError as e:
         logger.info("Error from bot framework (token).", exc_info=e)
         await send_text_response("404 Not Found", status=404)
@@ -71,10 +137,17 @@ async def main():
     config = Config(**uvicorn_config)
     server = Server(config)
 
-    async with bot.application:
-        await bot.application.start()
-        await server.serve()
-        await bot.application.stop()
+    start_backends()
+    try:
+        migrate()
+        logger.debug("Database schema migrated.")
+        async with bot.application:
+            await bot.application.start()
+            await server.serve()
+            await bot.application.stop()
+        logger.info(f"Update queue at shutdown: {bot.update_queue_load.summary()}")
+    finally:
+        stop_backends()
 
 
 if __name__ == "__main__":
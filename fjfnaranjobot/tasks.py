@@ -2,8 +2,24 @@ from importlib import import_module
 from warnings import filterwarnings
 
 from celery import Celery
+from celery.signals import (
+    task_postrun,
+    task_prerun,
+    worker_process_init,
+    worker_process_shutdown,
+)
+from kombu.serialization import register
 
+from fjfnaranjobot.backends import start_backends, stop_backends
+from fjfnaranjobot.backends.sqldb.metrics import query_scope
+from fjfnaranjobot.codec import (
+    CELERY_CONTENT_TYPE,
+    CELERY_SERIALIZER,
+    dumps_message,
+    loads_message,
+)
 from fjfnaranjobot.common import ScheduleEntry, get_bot_components
+from fjfnaranjobot.db import end_unit_of_work, start_unit_of_work
 from fjfnaranjobot.logging import getLogger
 
 filterwarnings("ignore", ".*per_message=False.*CallbackQueryHandler.*", UserWarning)
@@ -14,7 +30,55 @@ _COMPONENTS_TEMPLATE = "fjfnaranjobot.components.{}"
 _TASKS_COMPONENTS_TEMPLATE = "fjfnaranjobot.components.{}.tasks"
 
 
+register(
+    CELERY_SERIALIZER,
+    dumps_message,
+    loads_message,
+    content_type=CELERY_CONTENT_TYPE,
+    content_encoding="utf-8",
+)
+
 app = Celery("tasks")
+app.conf.update(
+    task_serializer=CELERY_SERIALIZER,
+    # Results can be anything a task returns, so kombu's json keeps them
+    result_serializer="json",
+    # Plain JSON is still accepted from messages sent by older deployments
+    accept_content=[CELERY_SERIALIZER, "json"],
+    result_accept_content=[CELERY_SERIALIZER, "json"],
+)
+
+
+@worker_process_init.connect
+def start_worker_backends(**_kwargs):
+    # Each worker child opens its own connections after the fork
+    start_backends()
+
+
+@worker_process_shutdown.connect
+def stop_worker_backends(**_kwargs):
+    stop_backends()
+
+
+# Tokens of the units of work and query scopes of the running tasks, by task id
+_units_of_work = {}
+
+
+@task_prerun.connect
+def start_task_unit_of_work(task_id, task=None, **_kwargs):
+    _units_of_work[task_id] = (
+        start_unit_of_work(),
+        query_scope.set(task.name if task is not None else None),
+    )
+
+
+@task_postrun.connect
+def end_task_unit_of_work(task_id, **_kwargs):
+    tokens = _units_of_work.pop(task_id, None)
+    if tokens is not None:
+        unit_of_work_token, scope_token = tokens
+        query_scope.reset(scope_token)
+        end_unit_of_work(unit_of_work_token)
 
 
 @app.on_after_configure.connect
@@ -0,0 +1,96 @@
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+from fjfnaranjobot.backends.config.cached import CachedConfiguration
+from fjfnaranjobot.backends.config.sql import SQLConfiguration
+from fjfnaranjobot.backends.sqldb.sqlite3 import SQLite3SQLDatabase
+
+MODULE_PATH = "fjfnaranjobot.backends.config.cached"
+
+
+class CachedConfigTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.sqldb = SQLite3SQLDatabase(":memory:")
+        self.sql_config = SQLConfiguration(self.sqldb)
+        self.other_sql_config = SQLConfiguration(self.sqldb)
+        self.cached_config = CachedConfiguration(self.sql_config)
+
+    def test_get_cached_without_queries(self):
+        self.cached_config["key"] = "val"
+        assert "val" == self.cached_config["key"]
+        with patch.object(
+            self.sqldb, "execute_and_fetch_one", side_effect=AssertionError
+        ):
+            assert "val" == self.cached_config["key"]
+
+    def test_get_missing_cached(self):
+        with self.assertRaises(KeyError):
+            self.cached_config["key"]
+        with patch.object(
+            self.sqldb, "execute_and_fetch_one", side_effect=AssertionError
+        ):
+            with self.assertRaises(KeyError) as e:
+                self.cached_config["key"]
+        assert f"The key 'key' don't exists." == e.exception.args[0]
+
+    def test_get_invalid(self):
+        with self.assertRaises(ValueError) as e:
+            self.cached_config["key."]
+        assert f"No valid value for key key.." == e.exception.args[0]
+
+    def test_set_and_del_invalidate_key(self):
+        self.cached_config["key"] = "val"
+        assert "val" == self.cached_config["key"]
+        self.cached_config["key"] = "newval"
+        assert "newval" == self.cached_config["key"]
+        del self.cached_config["key"]
+        with self.assertRaises(KeyError):
+            self.cached_config["key"]
+
+    def test_other_process_changes_seen_after_check(self):
+        self.other_sql_config["key"] = "val"
+        assert "val" == self.cached_config["key"]
+        self.other_sql_config["key"] = "newval"
+        assert "val" == self.cached_config["key"]
+        with patch(f"{MODULE_PATH}.CONFIG_CACHE_CHECK_SECONDS", 0):
+            assert "newval" == self.cached_config["key"]
+
+    @patch(f"{MODULE_PATH}.CONFIG_CACHE_MAX_SIZE", 2)
+    def test_lru_eviction(self):
+        self.cached_config.update({"a": "1", "b": "2", "c": "3"})
+        self.cached_config["a"]
+        self.cached_config["b"]
+        self.cached_config["a"]
+        self.cached_config["c"]
+        assert ["a", "c"] == list(self.cached_config._entries)
+
+    def test_len_and_iter(self):
+        self.cached_config.update({"a": "1", "b": "2"})
+        assert 2 == len(self.cached_config)
+        assert {"a", "b"} == set(self.cached_config)
+
+
+class CachedConfigAsyncTests(IsolatedAsyncioTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sqldb = SQLite3SQLDatabase(":memory:")
+        self.sql_config = SQLConfiguration(self.sqldb)
+        self.addCleanup(self.sql_config.async_sqldb.close)
+        self.cached_config = CachedConfiguration(self.sql_config)
+
+    async def test_aset_aget_adelete(self):
+        await self.cached_config.aset("key", "val")
+        assert "val" == await self.cached_config.aget("key")
+        assert "val" == self.cached_config["key"]
+        await self.cached_config.adelete("key")
+        with self.assertRaises(KeyError):
+            await self.cached_config.aget("key")
+
+    async def test_aget_cached_without_queries(self):
+        await self.cached_config.aset("key", "val")
+        await self.cached_config.aget("key")
+        with patch.object(
+            self.sqldb, "execute_and_fetch_one", side_effect=AssertionError
+        ):
+            assert "val" == await self.cached_config.aget("key")
@@ -0,0 +1,85 @@
+from threading import current_thread, main_thread
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from fjfnaranjobot.backends.config.cached import CachedConfiguration
+from fjfnaranjobot.backends.config.redis import RedisConfiguration
+
+from ...fake_redis import FakeRedis
+
+
+class RedisConfigTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.redis = FakeRedis()
+        self.redis_config = RedisConfiguration(self.redis)
+
+    def test_get_missing(self):
+        with self.assertRaises(KeyError) as e:
+            self.redis_config["key"]
+        assert "The key 'key' don't exists." == e.exception.args[0]
+
+    def test_invalid_key(self):
+        for key in ["1", "key.", "a" * 17]:
+            with self.subTest(key=key):
+                with self.assertRaises(ValueError):
+                    self.redis_config[key] = "value"
+
+    def test_set_get(self):
+        self.redis_config["key.key"] = "value"
+        assert "value" == self.redis_config["key.key"]
+        assert {"key.key": "value"} == self.redis.hgetall("config")
+
+    def test_del(self):
+        self.redis_config["key"] = "value"
+        del self.redis_config["key"]
+        assert "key" not in self.redis_config
+        with self.assertRaises(KeyError):
+            del self.redis_config["key"]
+
+    def test_update_len_iter(self):
+        self.redis_config.update({"keya": "a", "keyb": "b"})
+        assert 2 == len(self.redis_config)
+        assert ["keya", "keyb"] == sorted(self.redis_config)
+
+    def test_version_bumped_by_changes(self):
+        assert 0 == self.redis_config.version
+        self.redis_config["key"] = "value"
+        self.redis_config.update(keya="a", keyb="b")
+        del self.redis_config["key"]
+        assert 3 == self.redis_config.version
+
+    def test_none_value(self):
+        self.redis_config["key"] = None
+        self.redis_config["keyb"] = ""
+        assert self.redis_config["key"] is None
+        assert "" == self.redis_config["keyb"]
+        self.redis_config["key"] = "value"
+        assert "value" == self.redis_config["key"]
+        self.redis_config.update(key=None, keyb="b")
+        assert self.redis_config["key"] is None
+        del self.redis_config["key"]
+        assert not self.redis.sismember("config:none", "key")
+
+    def test_cached_sees_other_process_changes(self):
+        cached = CachedConfiguration(self.redis_config)
+        other = RedisConfiguration(self.redis)
+        other["key"] = "value"
+        assert "value" == cached["key"]
+
+
+class RedisConfigAsyncTests(IsolatedAsyncioTestCase):
+    async def test_aset_aget(self):
+        redis_config = RedisConfiguration(FakeRedis())
+        await redis_config.aset("key", "value")
+        assert "value" == await redis_config.aget("key")
+        await redis_config.adelete("key")
+        with self.assertRaises(KeyError):
+            await redis_config.aget("key")
+
+    async def test_async_off_event_loop(self):
+        redis = FakeRedis()
+        threads = []
+        redis.hget = lambda *args: threads.append(current_thread())
+        with self.assertRaises(KeyError):
+            await RedisConfiguration(redis).aget("key")
+        assert [main_thread()] != threads
@@ -1,14 +1,16 @@
 from logging import DEBUG
-from unittest import TestCase
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import MagicMock
 
 from fjfnaranjobot.backends.config.sql import SQLConfiguration, logger
-from fjfnaranjobot.backends.sqldb.sqlite3 import SQLite3SQLDatabase
 
+from ...base import MemoryDbTestCase
 
-class SQLConfigTests(TestCase):
+
+class SQLConfigTests(MemoryDbTestCase):
     def setUp(self):
         super().setUp()
-        sqldb = SQLite3SQLDatabase(":memory:")
+        sqldb = self.new_sqldb()
         self.sql_config = SQLConfiguration(sqldb)
 
     def tearDown(self):
@@ -17,6 +19,16 @@ class SQLConfigTests(TestCase):
             del self.sql_config[key]
         super().tearDown()
 
+    def test_table_created_on_first_use(self):
+        sqldb = MagicMock()
+        sqldb.in_transaction = False
+        sql_config = SQLConfiguration(sqldb)
+        sqldb.execute.assert_not_called()
+        sqldb.execute_and_fetch_one.return_value = (0,)
+        len(sql_config)
+        len(sql_config)
+        assert 2 == sqldb.execute.call_count
+
     def test_get_config_valid(self):
         for key in ["key", "key.key"]:
             with self.subTest(key=key):
@@ -83,6 +95,29 @@ class SQLConfigTests(TestCase):
         self.sql_config["other.key"] = "other_val"
         assert 2 == len(self.sql_config)
 
+    def test_update_config(self):
+        self.sql_config["key"] = "val"
+        self.sql_config.update({"key": "newval", "other.key": "other_val"})
+        assert 2 == len(self.sql_config)
+        assert "newval" == self.sql_config["key"]
+
+    def test_update_config_invalid_rolls_back(self):
+        with self.assertRaises(ValueError):
+            self.sql_config.update({"key": "val", "key.": "val"})
+        assert 0 == len(self.sql_config)
+
+    def test_update_config_bumps_version_once(self):
+        first_version = self.sql_config.version
+        self.sql_config.update(key="val", other="val")
+        assert first_version + 1 == self.sql_config.version
+
+    def test_version_changes_on_writes(self):
+        first_version = self.sql_config.version
+        self.sql_config["key"] = "val"
+        second_version = self.sql_config.version
+        del self.sql_config["key"]
+        assert first_version < second_version < self.sql_config.version
+
     def test_del_config_exists(self):
         self.sql_config["key"] = "val"
         del self.sql_config["key"]
@@ -92,3 +127,42 @@ class SQLConfigTests(TestCase):
         with self.assertRaises(KeyError) as e:
             del self.sql_config["key"]
         assert f"The key 'key' don't exists." == e.exception.args[0]
+
+
+class SQLConfigAsyncTests(MemoryDbTestCase, IsolatedAsyncioTestCase):
+    def setUp(self):
+        super().setUp()
+        sqldb = self.new_sqldb()
+        self.sql_config = SQLConfiguration(sqldb)
+        self.addCleanup(self.sql_config.async_sqldb.close)
+
+    async def test_aset_aget(self):
+        await self.sql_config.aset("key", "val")
+        assert "val" == await self.sql_config.aget("key")
+        assert "val" == self.sql_config["key"]
+
+    async def test_aset_replaces_old_value(self):
+        await self.sql_config.aset("key", "val")
+        await self.sql_config.aset("key", "newval")
+        assert "newval" == await self.sql_config.aget("key")
+        assert 1 == len(self.sql_config)
+
+    async def test_aget_dont_exists(self):
+        with self.assertRaises(KeyError) as e:
+            await self.sql_config.aget("key")
+        assert f"The key 'key' don't exists." == e.exception.args[0]
+
+    async def test_aget_invalid(self):
+        with self.assertRaises(ValueError) as e:
+            await self.sql_config.aget("key.")
+        assert f"No valid value for key key.." == e.exception.args[0]
+
+    async def test_adelete(self):
+        self.sql_config["key"] = "val"
+        await self.sql_config.adelete("key")
+        assert 0 == len(self.sql_config)
+
+    async def test_adelete_dont_exists(self):
+        with self.assertRaises(KeyError) as e:
+            await self.sql_config.adelete("key")
+        assert f"The key 'key' don't exists." == e.exception.args[0]
@@ -0,0 +1,53 @@
+from contextvars import ContextVar
+from threading import get_ident
+from unittest import IsolatedAsyncioTestCase
+
+from fjfnaranjobot.backends.sqldb.asynchronous import AsyncSQLDatabase
+from fjfnaranjobot.backends.sqldb.sqlite3 import SQLite3SQLDatabase
+
+
+class AsyncSQLDatabaseTests(IsolatedAsyncioTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sqldb = SQLite3SQLDatabase(":memory:")
+        self.async_sqldb = AsyncSQLDatabase(self.sqldb)
+        self.addCleanup(self.async_sqldb.close)
+
+    async def test_execute_and_fetch(self):
+        await self.async_sqldb.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v)")
+        first_id = await self.async_sqldb.execute_and_fetch_index(
+            "INSERT INTO t (v) VALUES (?)", ("a",)
+        )
+        await self.async_sqldb.execute("INSERT INTO t (v) VALUES (?)", ("b",))
+        assert (first_id, "a") == await self.async_sqldb.execute_and_fetch_one(
+            "SELECT id, v FROM t WHERE id=?", (first_id,)
+        )
+        assert [("a",), ("b",)] == await self.async_sqldb.execute_and_fetch_all(
+            "SELECT v FROM t ORDER BY id"
+        )
+
+    async def test_context_reaches_worker_thread(self):
+        variable = ContextVar("variable", default=None)
+        variable.set("value")
+        assert "value" == await self.async_sqldb.run(variable.get)
+
+    async def test_sync_and_async_share_data(self):
+        self.sqldb.execute("CREATE TABLE t (v)")
+        await self.async_sqldb.execute("INSERT INTO t VALUES (?)", ("a",))
+        assert ("a",) == self.sqldb.execute_and_fetch_one("SELECT v FROM t")
+
+    async def test_runs_outside_event_loop_thread(self):
+        loop_thread = get_ident()
+        worker_threads = set()
+
+        class SpySQLDatabase(SQLite3SQLDatabase):
+            def execute(self, sentence, *params):
+                worker_threads.add(get_ident())
+                super().execute(sentence, *params)
+
+        async_sqldb = AsyncSQLDatabase(SpySQLDatabase(":memory:"))
+        self.addCleanup(async_sqldb.close)
+        await async_sqldb.execute("CREATE TABLE t (v)")
+        await async_sqldb.execute("INSERT INTO t VALUES (1)")
+        assert 1 == len(worker_threads)
+        assert loop_thread not in worker_threads
@@ -0,0 +1,90 @@
+from logging import WARNING
+from time import sleep
+from unittest import TestCase
+from unittest.mock import patch
+
+from fjfnaranjobot.backends.sqldb.metrics import (
+    LATENCY_BUCKETS_SECONDS,
+    MetricsSQLDatabase,
+    logger,
+    query_scope,
+)
+from fjfnaranjobot.backends.sqldb.sqlite3 import SQLite3SQLDatabase
+
+MODULE_PATH = "fjfnaranjobot.backends.sqldb.metrics"
+
+
+class MetricsSQLDatabaseTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.sqldb = MetricsSQLDatabase(SQLite3SQLDatabase(":memory:"))
+        self.addCleanup(self.sqldb.close)
+        self.sqldb.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v)")
+        self.sqldb.execute_many("INSERT INTO t (v) VALUES (?)", [("a",), ("b",)])
+        self.sqldb.metrics.reset()
+
+    def statement(self, sentence):
+        return self.sqldb.metrics.snapshot()["statements"][sentence]
+
+    def test_counts_queries_and_rows(self):
+        sentence = "SELECT v FROM t"
+        self.sqldb.execute_and_fetch_all(sentence)
+        self.sqldb.execute_and_fetch_all(sentence)
+        metrics = self.statement(sentence)
+        assert 2 == metrics["count"]
+        assert 4 == metrics["rows"]
+        assert 2 == sum(metrics["histogram"])
+        assert len(LATENCY_BUCKETS_SECONDS) + 1 == len(metrics["histogram"])
+
+    def test_fetch_one_rows(self):
+        sentence = "SELECT v FROM t WHERE id=?"
+        assert ("a",) == self.sqldb.execute_and_fetch_one(sentence, (1,))
+        assert self.sqldb.execute_and_fetch_one(sentence, (3,)) is None
+        assert 1 == self.statement(sentence)["rows"]
+
+    def test_iterate_rows(self):
+        sentence = "SELECT v FROM t"
+        assert [("a",), ("b",)] == list(
+            self.sqldb.execute_and_iterate(sentence, batch_size=1)
+        )
+        assert 2 == self.statement(sentence)["rows"]
+
+    def test_iterate_caller_time_not_measured(self):
+        sentence = "SELECT v FROM t"
+        for _ in self.sqldb.execute_and_iterate(sentence, batch_size=1):
+            sleep(0.1)
+        assert self.statement(sentence)["seconds"] < 0.1
+
+    def test_upsert_recorded(self):
+        self.sqldb.upsert("t", ("id", "v"), ("id",), (1, "c"))
+        assert 1 == len(self.sqldb.metrics.snapshot()["statements"])
+
+    def test_grouped_by_scope(self):
+        token = query_scope.set("Handler")
+        try:
+            self.sqldb.execute_and_fetch_all("SELECT v FROM t")
+        finally:
+            query_scope.reset(token)
+        self.sqldb.execute_and_fetch_all("SELECT v FROM t")
+        scopes = self.sqldb.metrics.snapshot()["scopes"]
+        assert 1 == scopes["Handler"]["count"]
+        assert 1 == scopes[None]["count"]
+        assert "1 queries" in self.sqldb.metrics.summary()
+
+    def test_slow_query_logged(self):
+        self.sqldb.slow_query_seconds = 0
+        with self.assertLogs(logger, WARNING) as logs:
+            self.sqldb.execute_and_fetch_all("SELECT v FROM t")
+        assert "Slow query" in logs.output[0]
+        assert "SELECT v FROM t" in logs.output[0]
+
+    def test_summary_logged(self):
+        with patch(f"{MODULE_PATH}.SUMMARY_LOG_SECONDS", 0):
+            with self.assertLogs(logger) as logs:
+                self.sqldb.execute_and_fetch_all("SELECT v FROM t")
+        assert "Database queries so far:" in logs.output[0]
+
+    def test_transaction_delegated(self):
+        with self.sqldb.transaction():
+            assert self.sqldb.in_transaction
+        assert ["id", "v"] == self.sqldb.table_columns("t")
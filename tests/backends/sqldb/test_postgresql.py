@@ -0,0 +1,294 @@
+from threading import Thread
+from unittest import TestCase
+from unittest.mock import patch
+
+try:
+    from psycopg import IntegrityError
+except ImportError:
+    IntegrityError = None
+
+import tests.backends.config.test_sql as test_sql_config
+import tests.test_auth as test_auth
+import tests.test_db as test_db
+from fjfnaranjobot.backends.sqldb.postgresql import PostgreSQLSQLDatabase, translate
+from tests.test_db import DbRelationIndexedMock, DbRelationMock
+
+from ...base import TEST_DB_DSN, MemoryDbTestCase, PostgreSQLDbTestMixin
+
+MODULE_PATH = "fjfnaranjobot.backends.sqldb.postgresql"
+
+
+class TranslateTests(TestCase):
+    def test_placeholders(self):
+        assert "SELECT a FROM t WHERE a=%s AND b=%s" == translate(
+            "SELECT a FROM t WHERE a=? AND b=?"
+        )
+
+    def test_quoted_placeholders_are_kept(self):
+        assert "SELECT a FROM t WHERE a='?' AND b=%s" == translate(
+            "SELECT a FROM t WHERE a='?' AND b=?"
+        )
+
+    def test_percent_escaped(self):
+        assert "SELECT a FROM t WHERE a LIKE 'a%%' AND b=%s" == translate(
+            "SELECT a FROM t WHERE a LIKE 'a%' AND b=?"
+        )
+
+    def test_create_table_untyped_columns(self):
+        for sentence in [
+            "CREATE TABLE IF NOT EXISTS t (key PRIMARY KEY, value TEXT)",
+            "CREATE TABLE t (key TEXT, value)",
+            "ALTER TABLE t ADD COLUMN c",
+        ]:
+            with self.subTest(sentence=sentence):
+                with self.assertRaises(ValueError):
+                    translate(sentence)
+
+    def test_create_table_integer_columns(self):
+        assert (
+            "CREATE TABLE t (id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,"
+            " count BIGINT, name varchar(10))"
+        ) == translate(
+            "CREATE TABLE t (id INTEGER PRIMARY KEY, count INTEGER, name varchar(10))"
+        )
+
+    def test_add_column(self):
+        assert "ALTER TABLE t ADD COLUMN c TEXT" == translate(
+            "ALTER TABLE t ADD COLUMN c TEXT"
+        )
+        assert "ALTER TABLE t ADD COLUMN c BIGINT DEFAULT 0" == translate(
+            "ALTER TABLE t ADD COLUMN c INTEGER DEFAULT 0"
+        )
+
+    def test_no_limit(self):
+        assert "SELECT a FROM t LIMIT NULLIF(%s, -1) OFFSET %s" == translate(
+            "SELECT a FROM t LIMIT ? OFFSET ?"
+        )
+
+
+class PostgreSQLSQLDatabaseWithoutPsycopgTests(TestCase):
+    def test_psycopg_needed(self):
+        with patch(f"{MODULE_PATH}.connect", None):
+            with self.assertRaises(RuntimeError):
+                PostgreSQLSQLDatabase("dsn")
+
+
+class PostgreSQLSQLDatabaseTests(PostgreSQLDbTestMixin, MemoryDbTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sqldb = self.new_sqldb()
+        self.sqldb.execute(
+            "CREATE TABLE t (id INTEGER PRIMARY KEY, name varchar(10), value TEXT)"
+        )
+
+    def test_fetch_index(self):
+        first = self.sqldb.execute_and_fetch_index(
+            "INSERT INTO t (name) VALUES (?)", ("a",)
+        )
+        second = self.sqldb.execute_and_fetch_index(
+            "INSERT INTO t (name) VALUES (?)", ("b",)
+        )
+        assert second == first + 1
+
+    def test_iterate(self):
+        self.sqldb.execute_many(
+            "INSERT INTO t (name) VALUES (?)", [(str(n),) for n in range(5)]
+        )
+        rows = self.sqldb.execute_and_iterate(
+            "SELECT name FROM t ORDER BY id", batch_size=2
+        )
+        assert [str(n) for n in range(5)] == [row[0] for row in rows]
+
+    def test_iterate_server_side(self):
+        self.sqldb.execute_many(
+            "INSERT INTO t (name) VALUES (?)", [(str(n),) for n in range(5)]
+        )
+        with self.sqldb.transaction():
+            rows = self.sqldb.execute_and_iterate(
+                "SELECT name FROM t ORDER BY id", batch_size=2
+            )
+            assert ("0",) == next(rows)
+            assert [(1,)] == self.sqldb.execute_and_fetch_all(
+                "SELECT count(*) FROM pg_cursors WHERE name LIKE 'iterate_%'"
+            )
+            assert 4 == len(list(rows))
+
+    def test_like_percent(self):
+        self.sqldb.execute_many(
+            "INSERT INTO t (name, value) VALUES (?, ?)", [("ab", "x"), ("ba", "x")]
+        )
+        assert [("ab",)] == self.sqldb.execute_and_fetch_all(
+            "SELECT name FROM t WHERE name LIKE 'a%'"
+        )
+        assert [("ab",)] == self.sqldb.execute_and_fetch_all(
+            "SELECT name FROM t WHERE name LIKE 'a%' AND value=?", ("x",)
+        )
+
+    def test_transaction_rollback(self):
+        with self.assertRaises(ValueError):
+            with self.sqldb.transaction():
+                self.sqldb.execute("INSERT INTO t (name) VALUES (?)", ("a",))
+                with self.sqldb.transaction():
+                    assert self.sqldb.in_transaction
+                raise ValueError()
+        assert not self.sqldb.in_transaction
+        assert (0,) == self.sqldb.execute_and_fetch_one("SELECT count(*) FROM t")
+
+    def test_transaction_isolated_from_other_threads(self):
+        seen = []
+
+        def count():
+            seen.append(self.sqldb.execute_and_fetch_one("SELECT count(*) FROM t"))
+
+        with self.sqldb.transaction():
+            self.sqldb.execute("INSERT INTO t (name) VALUES (?)", ("a",))
+            thread = Thread(target=count)
+            thread.start()
+            thread.join()
+        count()
+        assert [(0,), (1,)] == seen
+
+    def test_pool_is_bounded(self):
+        sqldb = PostgreSQLSQLDatabase(TEST_DB_DSN, pool_size=1)
+        self.addCleanup(sqldb.close)
+        for _ in range(3):
+            sqldb.execute_and_fetch_one("SELECT 1")
+        assert 1 == len(sqldb._idle)
+
+    def test_pool_timeout(self):
+        sqldb = PostgreSQLSQLDatabase(TEST_DB_DSN, pool_size=1, pool_timeout=0.1)
+        self.addCleanup(sqldb.close)
+        errors = []
+
+        def fetch():
+            try:
+                sqldb.execute_and_fetch_one("SELECT 1")
+            except TimeoutError as e:
+                errors.append(e)
+
+        with sqldb.transaction():
+            thread = Thread(target=fetch)
+            thread.start()
+            thread.join()
+        assert 1 == len(errors)
+
+    def test_iterate_leaves_a_free_connection(self):
+        sqldb = PostgreSQLSQLDatabase(TEST_DB_DSN, pool_size=2, pool_timeout=0.1)
+        self.addCleanup(sqldb.close)
+        sqldb.execute_many(
+            "INSERT INTO t (name) VALUES (?)", [(str(n),) for n in range(5)]
+        )
+        sentence = "SELECT name FROM t ORDER BY id"
+        first = sqldb.execute_and_iterate(sentence, batch_size=2)
+        second = sqldb.execute_and_iterate(sentence, batch_size=2)
+        assert ("0",) == next(first)
+        assert ("0",) == next(second)
+        assert (5,) == sqldb.execute_and_fetch_one("SELECT count(*) FROM t")
+        assert 4 == len(list(second))
+        assert 4 == len(list(first))
+
+    def test_upsert(self):
+        self.sqldb.upsert("t", ("id", "name"), ("id",), (1, "a"))
+        self.sqldb.upsert("t", ("id", "name"), ("id",), (1, "b"))
+        assert [(1, "b")] == self.sqldb.execute_and_fetch_all("SELECT id, name FROM t")
+
+    def test_sync_ids(self):
+        self.sqldb.execute("INSERT INTO t (id, name) VALUES (?, ?)", (3, "a"))
+        self.sqldb.sync_ids("t")
+        assert 4 == self.sqldb.execute_and_fetch_index(
+            "INSERT INTO t (name) VALUES (?)", ("b",)
+        )
+
+    def test_sync_ids_never_goes_back(self):
+        for name in "abc":
+            self.sqldb.execute("INSERT INTO t (name) VALUES (?)", (name,))
+        self.sqldb.execute("DELETE FROM t WHERE id=?", (3,))
+        self.sqldb.sync_ids("t")
+        assert 4 == self.sqldb.execute_and_fetch_index(
+            "INSERT INTO t (name) VALUES (?)", ("d",)
+        )
+
+    def test_numeric_as_sqlite(self):
+        self.sqldb.execute_many(
+            "INSERT INTO t (id, name) VALUES (?, ?)", [(1, "a"), (2, "b")]
+        )
+        total, average = self.sqldb.execute_and_fetch_one(
+            "SELECT sum(id), avg(id) FROM t"
+        )
+        assert (3, int) == (total, type(total))
+        assert (1.5, float) == (average, type(average))
+
+    def test_table_columns(self):
+        assert ["id", "name", "value"] == self.sqldb.table_columns("t")
+
+    def test_explain(self):
+        self.sqldb.execute("SET enable_seqscan=off")
+        plan = self.sqldb.explain("SELECT name FROM t WHERE id=?", (1,))
+        assert any("t_pkey" in line for line in plan)
+
+
+class DbObjectsPostgreSQLTests(PostgreSQLDbTestMixin, test_db.DbObjectsTests):
+    integrity_error = IntegrityError
+    migrate_error = IntegrityError
+
+    def test_db_indexes_created(self):
+        DbRelationIndexedMock.count()
+        indexes = self.sqldb.execute_and_fetch_all(
+            "SELECT indexname FROM pg_indexes"
+            " WHERE tablename='db_relation_indexed_mock' ORDER BY indexname"
+        )
+        assert [
+            ("db_relation_indexed_mock_field1_idx",),
+            ("db_relation_indexed_mock_field2_field3_idx",),
+            ("db_relation_indexed_mock_pkey",),
+        ] == indexes
+
+    def test_explain_uses_index(self):
+        self.sqldb.execute("SET enable_seqscan=off")
+        plan = DbRelationIndexedMock.explain(where={"field1": 1})
+        assert any("db_relation_indexed_mock_field1_idx" in step for step in plan)
+
+    def test_explain_scan(self):
+        # PostgreSQL can still scan the field2 and field3 index
+        plan = DbRelationIndexedMock.explain(where={"field3": 1})
+        assert not any("db_relation_indexed_mock_field1_idx" in step for step in plan)
+
+    def test_db_object_creates_table(self):
+        DbRelationMock().commit()
+        columns = self.sqldb.execute_and_fetch_all(
+            "SELECT column_name, data_type FROM information_schema.columns"
+            " WHERE table_name='db_relation_mock' ORDER BY ordinal_position"
+        )
+        assert [
+            ("id", "bigint"),
+            ("field1", "bigint"),
+            ("field2", "text"),
+        ] == columns
+
+    def test_db_object_ignores_extra_columns(self):
+        self.sqldb.execute(
+            "CREATE TABLE db_relation_mock"
+            " (extra TEXT, id INTEGER PRIMARY KEY, field1 INTEGER, field2 TEXT)"
+        )
+        self.sqldb.execute("INSERT INTO db_relation_mock VALUES ('x', 1, 2, 3)")
+        assert 0 == DbRelationMock.schema_version()
+        assert 2 == DbRelationMock(1).field1
+
+
+class QueryPostgreSQLTests(PostgreSQLDbTestMixin, test_db.QueryTests):
+    def test_query_explain(self):
+        self.sqldb.execute("SET enable_seqscan=off")
+        plan = DbRelationMock.query().filter(id=1).explain()
+        assert any("db_relation_mock_pkey" in step for step in plan)
+
+
+class FriendsPostgreSQLTests(PostgreSQLDbTestMixin, test_auth.FriendsTests):
+    pass
+
+
+class FriendsCachePostgreSQLTests(PostgreSQLDbTestMixin, test_auth.FriendsCacheTests):
+    pass
+
+
+class SQLConfigPostgreSQLTests(PostgreSQLDbTestMixin, test_sql_config.SQLConfigTests):
+    pass
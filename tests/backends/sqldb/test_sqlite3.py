@@ -0,0 +1,193 @@
+from os import remove
+from os.path import isfile
+from tempfile import mkstemp
+from threading import Thread
+from unittest import TestCase
+from unittest.mock import patch
+
+from fjfnaranjobot.backends.sqldb.sqlite3 import SQLite3SQLDatabase
+
+MODULE_PATH = "fjfnaranjobot.backends.sqldb.sqlite3"
+
+
+def _in_thread(function):
+    result = []
+    thread = Thread(target=lambda: result.append(function()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+class SQLite3SQLDatabaseFileTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.db_path = mkstemp()[1]
+        self.sqldb = SQLite3SQLDatabase(self.db_path)
+
+    def tearDown(self):
+        self.sqldb.close()
+        for suffix in ["", "-wal", "-shm"]:
+            if isfile(self.db_path + suffix):
+                remove(self.db_path + suffix)
+        super().tearDown()
+
+    def test_wal_mode(self):
+        assert ("wal",) == self.sqldb.execute_and_fetch_one("PRAGMA journal_mode")
+
+    def test_busy_timeout(self):
+        with patch(f"{MODULE_PATH}.BUSY_TIMEOUT_SECONDS", 2):
+            sqldb = SQLite3SQLDatabase(self.db_path)
+            assert (2000,) == sqldb.execute_and_fetch_one("PRAGMA busy_timeout")
+            sqldb.close()
+
+    def test_cached_statements(self):
+        with patch(f"{MODULE_PATH}.connect") as connect:
+            self.sqldb.close()
+            self.sqldb.connection
+        assert 512 == connect.call_args.kwargs["cached_statements"]
+
+    def test_same_thread_reuses_connection(self):
+        assert self.sqldb.connection is self.sqldb.connection
+
+    def test_connection_per_thread(self):
+        main_connection = self.sqldb.connection
+        thread_connection = _in_thread(lambda: self.sqldb.connection)
+        assert main_connection is not thread_connection
+
+    def test_threads_share_data(self):
+        self.sqldb.execute("CREATE TABLE t (v)")
+        _in_thread(lambda: self.sqldb.execute("INSERT INTO t VALUES (1)"))
+        assert [(1,)] == self.sqldb.execute_and_fetch_all("SELECT v FROM t")
+
+    def test_dead_thread_connections_are_closed(self):
+        _in_thread(lambda: self.sqldb.connection)
+        self.sqldb.connection
+        assert 1 == len(self.sqldb._connections)
+
+    def test_execute_and_iterate_in_batches(self):
+        self.sqldb.execute("CREATE TABLE t (v)")
+        self.sqldb.execute_many("INSERT INTO t VALUES (?)", [(v,) for v in range(5)])
+        rows = self.sqldb.execute_and_iterate(
+            "SELECT v FROM t ORDER BY v", batch_size=2
+        )
+        assert (0,) == next(rows)
+        assert [(1,), (2,), (3,), (4,)] == list(rows)
+
+    def test_reconnects_after_fork(self):
+        parent_connection = self.sqldb.connection
+        with patch(f"{MODULE_PATH}.getpid", return_value=-1):
+            child_connection = self.sqldb.connection
+        assert parent_connection is not child_connection
+
+
+class SQLite3SQLDatabaseMemoryTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.sqldb = SQLite3SQLDatabase(":memory:")
+
+    def tearDown(self):
+        self.sqldb.close()
+        super().tearDown()
+
+    def test_threads_share_connection(self):
+        main_connection = self.sqldb.connection
+        thread_connection = _in_thread(lambda: self.sqldb.connection)
+        assert main_connection is thread_connection
+
+    def test_threads_share_data(self):
+        self.sqldb.execute("CREATE TABLE t (v)")
+        _in_thread(lambda: self.sqldb.execute("INSERT INTO t VALUES (1)"))
+        assert [(1,)] == self.sqldb.execute_and_fetch_all("SELECT v FROM t")
+
+    def test_execute_and_iterate(self):
+        self.sqldb.execute("CREATE TABLE t (v)")
+        self.sqldb.execute_many("INSERT INTO t VALUES (?)", [(v,) for v in range(3)])
+        assert [(0,), (1,), (2,)] == list(
+            self.sqldb.execute_and_iterate("SELECT v FROM t ORDER BY v", batch_size=2)
+        )
+
+
+class SQLite3SQLDatabaseTransactionTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.sqldb = SQLite3SQLDatabase(":memory:")
+        self.sqldb.execute("CREATE TABLE t (v)")
+
+    def tearDown(self):
+        self.sqldb.close()
+        super().tearDown()
+
+    def test_execute_many(self):
+        self.sqldb.execute_many("INSERT INTO t VALUES (?)", [(1,), (2,), (3,)])
+        assert [(3,)] == self.sqldb.execute_and_fetch_all("SELECT count(*) FROM t")
+
+    def test_transaction_commits_once(self):
+        with self.sqldb.transaction():
+            self.sqldb.execute("INSERT INTO t VALUES (1)")
+            self.sqldb.execute_many("INSERT INTO t VALUES (?)", [(2,), (3,)])
+            assert self.sqldb.connection.in_transaction
+        assert not self.sqldb.connection.in_transaction
+        assert [(3,)] == self.sqldb.execute_and_fetch_all("SELECT count(*) FROM t")
+
+    def test_transaction_rollback(self):
+        with self.assertRaises(ValueError):
+            with self.sqldb.transaction():
+                self.sqldb.execute("INSERT INTO t VALUES (1)")
+                raise ValueError()
+        assert [(0,)] == self.sqldb.execute_and_fetch_all("SELECT count(*) FROM t")
+
+    def test_nested_transaction_joins_outer(self):
+        with self.assertRaises(ValueError):
+            with self.sqldb.transaction():
+                with self.sqldb.transaction():
+                    self.sqldb.execute("INSERT INTO t VALUES (1)")
+                assert self.sqldb.connection.in_transaction
+                raise ValueError()
+        assert [(0,)] == self.sqldb.execute_and_fetch_all("SELECT count(*) FROM t")
+
+    def test_failed_statement_rolls_back(self):
+        with self.assertRaises(Exception):
+            self.sqldb.execute("INSERT INTO missing VALUES (1)")
+        assert not self.sqldb.connection.in_transaction
+
+
+class SQLite3SQLDatabaseUpsertTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.sqldb = SQLite3SQLDatabase(":memory:")
+        self.sqldb.execute("CREATE TABLE t (k PRIMARY KEY, v)")
+
+    def tearDown(self):
+        self.sqldb.close()
+        super().tearDown()
+
+    def test_upsert_inserts(self):
+        self.sqldb.upsert("t", ("k", "v"), ("k",), ("a", 1))
+        assert [("a", 1)] == self.sqldb.execute_and_fetch_all("SELECT k, v FROM t")
+
+    def test_upsert_updates(self):
+        self.sqldb.upsert("t", ("k", "v"), ("k",), ("a", 1))
+        self.sqldb.upsert("t", ("k", "v"), ("k",), ("a", 2))
+        assert [("a", 2)] == self.sqldb.execute_and_fetch_all("SELECT k, v FROM t")
+
+    def test_upsert_only_keys(self):
+        self.sqldb.upsert("t", ("k",), ("k",), ("a",))
+        self.sqldb.upsert("t", ("k",), ("k",), ("a",))
+        assert [("a", None)] == self.sqldb.execute_and_fetch_all("SELECT k, v FROM t")
+
+    def test_upsert_many(self):
+        self.sqldb.upsert("t", ("k", "v"), ("k",), ("a", 1))
+        self.sqldb.upsert_many("t", ("k", "v"), ("k",), [("a", 2), ("b", 3)])
+        assert [("a", 2), ("b", 3)] == self.sqldb.execute_and_fetch_all(
+            "SELECT k, v FROM t ORDER BY k"
+        )
+
+    def test_table_columns(self):
+        assert ["k", "v"] == self.sqldb.table_columns("t")
+
+    def test_table_columns_missing_table(self):
+        assert [] == self.sqldb.table_columns("missing")
+
+    def test_table_columns_invalid_name(self):
+        with self.assertRaises(ValueError):
+            self.sqldb.table_columns("t; DROP")
@@ -0,0 +1,59 @@
+from os import remove
+from os.path import isfile
+from tempfile import mkstemp
+from unittest import TestCase
+
+from fjfnaranjobot.backends.sqldb.sqlite3 import SQLite3SQLDatabase
+from fjfnaranjobot.backends.sqldb.versions import (
+    bump_version,
+    get_version,
+    init_versions,
+)
+
+
+class VersionsTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.sqldb = SQLite3SQLDatabase(":memory:")
+        init_versions(self.sqldb)
+
+    def test_get_version_default(self):
+        assert 0 == get_version(self.sqldb, "name")
+
+    def test_bump_version(self):
+        assert 0 == bump_version(self.sqldb, "name")
+        assert 1 == bump_version(self.sqldb, "name")
+        assert 2 == get_version(self.sqldb, "name")
+
+    def test_versions_are_independent(self):
+        bump_version(self.sqldb, "name")
+        assert 0 == get_version(self.sqldb, "other")
+
+    def test_bump_version_rolls_back(self):
+        with self.assertRaises(ValueError):
+            with self.sqldb.transaction():
+                bump_version(self.sqldb, "name")
+                raise ValueError()
+        assert 0 == get_version(self.sqldb, "name")
+
+
+class VersionsFileTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.db_path = mkstemp()[1]
+        self.sqldb = SQLite3SQLDatabase(self.db_path)
+        init_versions(self.sqldb)
+
+    def tearDown(self):
+        self.sqldb.close()
+        for suffix in ["", "-wal", "-shm"]:
+            if isfile(self.db_path + suffix):
+                remove(self.db_path + suffix)
+        super().tearDown()
+
+    def test_bump_version_is_committed(self):
+        assert 0 == bump_version(self.sqldb, "name")
+        assert 1 == bump_version(self.sqldb, "name")
+        other_sqldb = SQLite3SQLDatabase(self.db_path)
+        assert 2 == get_version(other_sqldb, "name")
+        other_sqldb.close()
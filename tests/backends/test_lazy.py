@@ -0,0 +1,35 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from fjfnaranjobot.backends.lazy import LazyBackend, unwrap
+
+
+class LazyBackendTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = MagicMock(side_effect=lambda: {"key": "value"})
+        self.backend = LazyBackend(self.factory)
+
+    def test_not_built_until_used(self):
+        self.factory.assert_not_called()
+        assert "value" == self.backend["key"]
+        assert "value" == self.backend.get("key")
+        self.factory.assert_called_once_with()
+
+    def test_mapping_operations(self):
+        self.backend["other"] = "x"
+        assert "other" in self.backend
+        assert 2 == len(self.backend)
+        del self.backend["other"]
+        assert ["key"] == list(self.backend)
+
+    def test_reset(self):
+        first = unwrap(self.backend)
+        assert first is self.backend.reset()
+        assert self.backend.reset() is None
+        assert first is not unwrap(self.backend)
+        assert 2 == self.factory.call_count
+
+    def test_unwrap_plain_backend(self):
+        backend = object()
+        assert backend is unwrap(backend)
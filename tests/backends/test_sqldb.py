@@ -3,10 +3,21 @@ from os.path import isdir, isfile, join
 from shutil import rmtree
 from stat import S_IRWXU
 from tempfile import mkdtemp, mkstemp
-from unittest.mock import patch
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
 
-from fjfnaranjobot.backends import _ensure_sqldb
+from fjfnaranjobot.backends import (
+    _ensure_config,
+    _ensure_metrics_sqldb,
+    _ensure_sqldb,
+    start_backends,
+    stop_backends,
+)
+from fjfnaranjobot.backends.config.cached import CachedConfiguration
+from fjfnaranjobot.backends.config.redis import RedisConfiguration
+from fjfnaranjobot.backends.lazy import LazyBackend, unwrap
 from tests.base import MockedEnvironTestCase
+from tests.fake_redis import FakeRedis
 
 MODULE_PATH = "fjfnaranjobot.backends"
 
@@ -62,3 +73,70 @@ class EnsureDbTests(MockedEnvironTestCase):
             with self.assertRaises(ValueError) as e:
                 _ensure_sqldb()
         assert "Invalid file name in BOT_DB_NAME var." == e.exception.args[0]
+
+    def test_dsn_selects_postgresql(self):
+        with self.mocked_environ(
+            f"{MODULE_PATH}.environ", {"BOT_DB_DSN": "dbname=bot"}
+        ), patch(f"{MODULE_PATH}.PostgreSQLSQLDatabase") as postgresql:
+            assert postgresql.return_value == _ensure_sqldb()
+        postgresql.assert_called_once_with("dbname=bot")
+
+
+class BackendsLifecycleTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.sqldb = LazyBackend(MagicMock)
+        self.async_sqldb = LazyBackend(MagicMock)
+        self.config = LazyBackend(MagicMock)
+        for name in ("sqldb", "async_sqldb", "config"):
+            patcher = patch(f"{MODULE_PATH}.{name}", getattr(self, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_start_builds_backends(self):
+        start_backends()
+        for backend in (self.sqldb, self.async_sqldb, self.config):
+            assert backend._backend is not None
+
+    def test_stop_closes_backends(self):
+        sqldb, async_sqldb = unwrap(self.sqldb), unwrap(self.async_sqldb)
+        stop_backends()
+        sqldb.close.assert_called_once_with()
+        async_sqldb.close.assert_called_once_with()
+        assert sqldb is not unwrap(self.sqldb)
+
+    def test_stop_not_started(self):
+        stop_backends()
+        assert self.sqldb._backend is None
+
+
+class EnsureConfigTests(MockedEnvironTestCase):
+    def test_sql_by_default(self):
+        with self.mocked_environ(
+            f"{MODULE_PATH}.environ", delete_keys=["BOT_REDIS_URL"]
+        ), patch(f"{MODULE_PATH}.sqldb", LazyBackend(MagicMock)), patch(
+            f"{MODULE_PATH}.async_sqldb", LazyBackend(MagicMock)
+        ):
+            assert isinstance(_ensure_config(), CachedConfiguration)
+
+    def test_redis_url_selects_redis(self):
+        with self.mocked_environ(
+            f"{MODULE_PATH}.environ", {"BOT_REDIS_URL": "redis://redis"}
+        ), patch(f"{MODULE_PATH}.redis", LazyBackend(FakeRedis)):
+            config = _ensure_config()
+        assert isinstance(config, RedisConfiguration)
+        assert isinstance(config.redis, FakeRedis)
+
+    def test_invalid_slow_query_ms(self):
+        with self.mocked_environ(
+            f"{MODULE_PATH}.environ", {"BOT_DB_SLOW_QUERY_MS": "slow"}
+        ):
+            with self.assertRaises(ValueError) as e:
+                _ensure_metrics_sqldb()
+        assert "Invalid value in BOT_DB_SLOW_QUERY_MS var." == e.exception.args[0]
+
+    def test_slow_query_ms(self):
+        with self.mocked_environ(
+            f"{MODULE_PATH}.environ", {"BOT_DB_SLOW_QUERY_MS": "250"}
+        ), patch(f"{MODULE_PATH}._ensure_sqldb"):
+            assert 0.25 == _ensure_metrics_sqldb().slow_query_seconds
@@ -2,17 +2,23 @@
 from contextlib import contextmanager
 from logging import INFO
 from os import environ
-from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest import IsolatedAsyncioTestCase, TestCase, skipIf
 from unittest.mock import AsyncMock, MagicMock, call, patch, sentinel
 
 from telegram.ext import ApplicationHandlerStop
 
 from fjfnaranjobot.auth import friends
+from fjfnaranjobot.backends.sqldb.asynchronous import AsyncSQLDatabase
+from fjfnaranjobot.backends.sqldb.postgresql import PostgreSQLSQLDatabase, connect
 from fjfnaranjobot.backends.sqldb.sqlite3 import SQLite3SQLDatabase
 from fjfnaranjobot.common import User
 
 BOT_USERNAME = "bu"
 
+# PostgreSQL server to run the database tests against too, wiped by them
+# (tests/conftest.py starts a throwaway one if the var isn't set)
+TEST_DB_DSN = environ.get("BOT_TEST_DB_DSN")
+
 OWNER_USER = User(11, "o")
 FIRST_FRIEND_USER = User(21, "f")
 SECOND_FRIEND_USER = User(22, "s")
@@ -54,13 +60,37 @@ class MockedEnvironTestCase(TestCase):
 
 
 class MemoryDbTestCase(TestCase):
+    def new_sqldb(self):
+        return SQLite3SQLDatabase(":memory:")
+
     def patch_sqldb(self, path):
-        sqldb = SQLite3SQLDatabase(":memory:")
+        sqldb = self.new_sqldb()
         sqldb_patcher = patch(path, sqldb)
         sqldb_patcher.start()
         self.addCleanup(sqldb_patcher.stop)
         return sqldb
 
+    def patch_async_sqldb(self, path, sqldb):
+        async_sqldb = AsyncSQLDatabase(sqldb)
+        async_sqldb_patcher = patch(path, async_sqldb)
+        async_sqldb_patcher.start()
+        self.addCleanup(async_sqldb_patcher.stop)
+        self.addCleanup(async_sqldb.close)
+        return async_sqldb
+
+
+@skipIf(connect is None, "psycopg package not installed.")
+@skipIf(TEST_DB_DSN is None, "No PostgreSQL server (BOT_TEST_DB_DSN var not set).")
+class PostgreSQLDbTestMixin:
+    """Run a MemoryDbTestCase against the BOT_TEST_DB_DSN server instead."""
+
+    def new_sqldb(self):
+        sqldb = PostgreSQLSQLDatabase(TEST_DB_DSN)
+        sqldb.execute("DROP SCHEMA public CASCADE")
+        sqldb.execute("CREATE SCHEMA public")
+        self.addCleanup(sqldb.close)
+        return sqldb
+
 
 class BotHandlerTestCase(MockedEnvironTestCase, IsolatedAsyncioTestCase):
     def setUp(self):
@@ -0,0 +1,72 @@
+"""Throwaway PostgreSQL server for the database tests.
+
+If BOT_TEST_DB_DSN isn't set but the PostgreSQL server programs are found
+(in the BOT_TEST_PG_BIN directory or the PATH), a server listening only on
+a Unix socket is created in a temporary directory for the test session.
+Otherwise the PostgreSQL tests are skipped.
+"""
+
+from os import environ
+from shutil import rmtree, which
+from subprocess import DEVNULL, CalledProcessError, run
+from tempfile import mkdtemp
+from warnings import warn
+
+_state = {"server_dir": None}
+
+
+def _pg_program(name):
+    return which(name, path=environ.get("BOT_TEST_PG_BIN"))
+
+
+def _pg_ctl(server_dir, *args):
+    run(
+        [_pg_program("pg_ctl"), "-D", f"{server_dir}/data", "-w", *args],
+        check=True,
+        stdout=DEVNULL,
+        stderr=DEVNULL,
+    )
+
+
+def pytest_configure(config):
+    if "BOT_TEST_DB_DSN" in environ:
+        return
+    initdb = _pg_program("initdb")
+    if initdb is None or _pg_program("pg_ctl") is None:
+        return
+    server_dir = mkdtemp(prefix="bot-test-pg-")
+    try:
+        run(
+            [initdb, "-D", f"{server_dir}/data", "-U", "postgres", "-E", "UTF8"]
+            + ["--auth=trust", "--no-sync"],
+            check=True,
+            stdout=DEVNULL,
+            stderr=DEVNULL,
+        )
+        _pg_ctl(
+            server_dir,
+            "-o",
+            f"-k {server_dir} -h '' -F",
+            "-l",
+            f"{server_dir}/log",
+            "start",
+        )
+    except (CalledProcessError, OSError) as e:
+        # initdb refuses to run as root, for example
+        warn(f"Throwaway PostgreSQL server not started: {e}")
+        rmtree(server_dir, ignore_errors=True)
+        return
+    _state["server_dir"] = server_dir
+    environ["BOT_TEST_DB_DSN"] = f"host={server_dir} user=postgres dbname=postgres"
+
+
+def pytest_unconfigure(config):
+    server_dir = _state["server_dir"]
+    if server_dir is None:
+        return
+    _state["server_dir"] = None
+    del environ["BOT_TEST_DB_DSN"]
+    try:
+        _pg_ctl(server_dir, "-m", "immediate", "stop")
+    finally:
+        rmtree(server_dir, ignore_errors=True)
@@ -0,0 +1,106 @@
+class FakeRedis:
+    """In-process stand-in for a Redis client decoding the responses.
+
+    Only the commands used by the bot are implemented.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expirations = {}
+
+    def get(self, name):
+        return self.data.get(name)
+
+    def set(self, name, value, nx=False, ex=None):
+        # Expiration isn't simulated, only recorded
+        if nx and name in self.data:
+            return None
+        self.data[name] = str(value)
+        if ex is not None:
+            self.expirations[name] = ex
+        return True
+
+    def incr(self, name):
+        self.data[name] = str(int(self.data.get(name, 0)) + 1)
+        return int(self.data[name])
+
+    def delete(self, *names):
+        return sum(1 for name in names if self.data.pop(name, None) is not None)
+
+    def hget(self, name, key):
+        return self.data.get(name, {}).get(str(key))
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        hash_ = self.data.setdefault(name, {})
+        added = 0
+        for item_key, item_value in items.items():
+            if item_value is None:
+                raise TypeError("Redis can't store None.")
+            added += str(item_key) not in hash_
+            hash_[str(item_key)] = str(item_value)
+        return added
+
+    def hdel(self, name, *keys):
+        hash_ = self.data.get(name, {})
+        deleted = sum(1 for key in keys if hash_.pop(str(key), None) is not None)
+        if name in self.data and not hash_:
+            del self.data[name]
+        return deleted
+
+    def hexists(self, name, key):
+        return str(key) in self.data.get(name, {})
+
+    def hlen(self, name):
+        return len(self.data.get(name, {}))
+
+    def hkeys(self, name):
+        return list(self.data.get(name, {}))
+
+    def hgetall(self, name):
+        return dict(self.data.get(name, {}))
+
+    def sadd(self, name, *values):
+        set_ = self.data.setdefault(name, set())
+        added = sum(1 for value in values if str(value) not in set_)
+        set_.update(str(value) for value in values)
+        return added
+
+    def srem(self, name, *values):
+        set_ = self.data.get(name, set())
+        removed = sum(1 for value in values if str(value) in set_)
+        set_.difference_update(str(value) for value in values)
+        if name in self.data and not set_:
+            del self.data[name]
+        return removed
+
+    def sismember(self, name, value):
+        return str(value) in self.data.get(name, set())
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def close(self):
+        pass
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_args):
+        self.commands = []
+
+    def __getattr__(self, name):
+        command = getattr(self.redis, name)
+        return lambda *args, **kwargs: self.commands.append((command, args, kwargs))
+
+    def execute(self):
+        commands, self.commands = self.commands, []
+        return [command(*args, **kwargs) for command, args, kwargs in commands]
@@ -1,10 +1,13 @@
 from contextlib import contextmanager
-from unittest.mock import sentinel
+from threading import current_thread, main_thread
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch, sentinel
 
 from telegram.ext import ApplicationHandlerStop
 
 from fjfnaranjobot.auth import (
     _FriendsProxy,
+    _RedisFriendsProxy,
     logger,
     only_friends,
     only_owner,
@@ -21,6 +24,7 @@ from .base import (
     BotHandlerTestCase,
     MemoryDbTestCase,
 )
+from .fake_redis import FakeRedis
 
 MODULE_PATH = "fjfnaranjobot.auth"
 
@@ -306,6 +310,43 @@ class FriendsTests(MemoryDbTestCase):
         assert 1 == len(self.friends_proxy)
         assert OWNER_USER in self.friends_proxy
 
+    def test_auth_update_friends(self):
+        with self.friends([FIRST_FRIEND_USER]):
+            self.friends_proxy.update(
+                [User(FIRST_FRIEND_USER.id, "x"), SECOND_FRIEND_USER]
+            )
+            assert 2 == len(self.friends_proxy)
+            assert "x" == self.friends_proxy.get_by_id(FIRST_FRIEND_USER.id).username
+            assert SECOND_FRIEND_USER in self.friends_proxy
+
+    def test_auth_ior_friends(self):
+        self.friends_proxy |= [FIRST_FRIEND_USER, SECOND_FRIEND_USER]
+        assert 2 == len(self.friends_proxy)
+
+    def test_auth_clear_friends(self):
+        with self.friends([FIRST_FRIEND_USER, SECOND_FRIEND_USER]):
+            self.friends_proxy.clear()
+            assert 0 == len(self.friends_proxy)
+
+    def test_auth_update_friends_existing(self):
+        with self.friends([FIRST_FRIEND_USER]):
+            self.friends_proxy.update(
+                [User(FIRST_FRIEND_USER.id, "x"), SECOND_FRIEND_USER]
+            )
+            assert 2 == len(self.friends_proxy)
+            assert "x" == self.friends_proxy.get_by_id(FIRST_FRIEND_USER.id).username
+
+    def test_auth_friends_page(self):
+        with self.friends([SECOND_FRIEND_USER, FIRST_FRIEND_USER]):
+            assert 2 == self.friends_proxy.count()
+            assert [FIRST_FRIEND_USER.id] == [
+                user.id for user in self.friends_proxy.page(0, 1)
+            ]
+            assert [SECOND_FRIEND_USER.id] == [
+                user.id for user in self.friends_proxy.page(1, 5)
+            ]
+            assert [] == self.friends_proxy.page(2, 5)
+
     def test_auth_del_friend_not_friends(self):
         self.friends_proxy.discard(FIRST_FRIEND_USER)
         assert 0 == len(self.friends_proxy)
@@ -326,3 +367,155 @@ class FriendsTests(MemoryDbTestCase):
         with self.friends([FIRST_FRIEND_USER]):
             self.friends_proxy.discard(FIRST_FRIEND_USER)
             assert 0 == len(self.friends_proxy)
+
+
+class RedisFriendsTests(FriendsTests):
+    def setUp(self):
+        super().setUp()
+        self.redis = FakeRedis()
+        redis_patcher = patch(f"{MODULE_PATH}.redis", self.redis)
+        redis_patcher.start()
+        self.addCleanup(redis_patcher.stop)
+        self.friends_proxy = _RedisFriendsProxy()
+
+    def test_stored_in_hash(self):
+        self.friends_proxy.add(FIRST_FRIEND_USER)
+        assert {str(FIRST_FRIEND_USER.id): FIRST_FRIEND_USER.username} == (
+            self.redis.hgetall("friends")
+        )
+
+    def test_friend_without_username(self):
+        self.friends_proxy.add(User(FIRST_FRIEND_USER.id, None))
+        assert self.friends_proxy.get_by_id(FIRST_FRIEND_USER.id).username is None
+
+
+class RedisFriendsAsyncTests(IsolatedAsyncioTestCase):
+    async def test_acontains_off_event_loop(self):
+        redis = FakeRedis()
+        threads = []
+        hexists = redis.hexists
+
+        def recording_hexists(*args):
+            threads.append(current_thread())
+            return hexists(*args)
+
+        redis.hexists = recording_hexists
+        friends_proxy = _RedisFriendsProxy()
+        with patch(f"{MODULE_PATH}.redis", redis):
+            friends_proxy.add(FIRST_FRIEND_USER)
+            assert await friends_proxy.acontains(FIRST_FRIEND_USER)
+            assert not await friends_proxy.acontains(SECOND_FRIEND_USER)
+        assert main_thread() not in threads
+
+    async def test_writes_off_event_loop(self):
+        redis = FakeRedis()
+        threads = []
+        hset = redis.hset
+
+        def recording_hset(*args, **kwargs):
+            threads.append(current_thread())
+            return hset(*args, **kwargs)
+
+        redis.hset = recording_hset
+        friends_proxy = _RedisFriendsProxy()
+        with patch(f"{MODULE_PATH}.redis", redis):
+            await friends_proxy.aadd(FIRST_FRIEND_USER)
+            friend = await friends_proxy.aget_by_id(FIRST_FRIEND_USER.id)
+            assert FIRST_FRIEND_USER.username == friend.username
+            await friends_proxy.adiscard(FIRST_FRIEND_USER)
+            assert await friends_proxy.aget_by_id(FIRST_FRIEND_USER.id) is None
+        assert threads
+        assert main_thread() not in threads
+
+
+class FriendsCacheTests(MemoryDbTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sqldb = self.patch_sqldb(f"{MODULE_PATH}.sqldb")
+        self.friends_proxy = _FriendsProxy()
+
+    def test_table_created_on_first_use(self):
+        with patch.object(self.sqldb, "execute", side_effect=AssertionError):
+            friends_proxy = _FriendsProxy()
+        with patch.object(self.sqldb, "execute", wraps=self.sqldb.execute) as execute:
+            assert 0 == len(friends_proxy)
+            friends_proxy.add(FIRST_FRIEND_USER)
+        created = [
+            args for args in execute.call_args_list if "CREATE TABLE" in args[0][0]
+        ]
+        assert 2 == len(created)
+
+    def test_contains_without_queries(self):
+        self.friends_proxy.add(FIRST_FRIEND_USER)
+        assert FIRST_FRIEND_USER in self.friends_proxy
+        with patch.object(
+            self.sqldb, "execute_and_fetch_one", side_effect=AssertionError
+        ), patch.object(
+            self.sqldb, "execute_and_fetch_all", side_effect=AssertionError
+        ):
+            assert FIRST_FRIEND_USER in self.friends_proxy
+            assert SECOND_FRIEND_USER not in self.friends_proxy
+            assert 1 == len(self.friends_proxy)
+
+    def test_write_through(self):
+        assert FIRST_FRIEND_USER not in self.friends_proxy
+        self.friends_proxy.add(FIRST_FRIEND_USER)
+        assert FIRST_FRIEND_USER in self.friends_proxy
+        self.friends_proxy.discard(FIRST_FRIEND_USER)
+        assert FIRST_FRIEND_USER not in self.friends_proxy
+
+    def test_other_process_changes_seen_after_check(self):
+        other_proxy = _FriendsProxy()
+        assert FIRST_FRIEND_USER not in self.friends_proxy
+        other_proxy.add(FIRST_FRIEND_USER)
+        assert FIRST_FRIEND_USER not in self.friends_proxy
+        with patch(f"{MODULE_PATH}.FRIENDS_CACHE_CHECK_SECONDS", 0):
+            assert FIRST_FRIEND_USER in self.friends_proxy
+            other_proxy.discard(FIRST_FRIEND_USER)
+            assert FIRST_FRIEND_USER not in self.friends_proxy
+
+    def test_write_after_other_process_change_reloads(self):
+        other_proxy = _FriendsProxy()
+        assert FIRST_FRIEND_USER not in self.friends_proxy
+        other_proxy.add(FIRST_FRIEND_USER)
+        self.friends_proxy.add(SECOND_FRIEND_USER)
+        assert FIRST_FRIEND_USER in self.friends_proxy
+        assert SECOND_FRIEND_USER in self.friends_proxy
+
+    def test_rolled_back_write_forgotten(self):
+        assert 0 == len(self.friends_proxy)
+        with self.assertRaises(ValueError):
+            with self.sqldb.transaction():
+                self.friends_proxy.add(FIRST_FRIEND_USER)
+                assert FIRST_FRIEND_USER in self.friends_proxy
+                raise ValueError()
+        assert FIRST_FRIEND_USER not in self.friends_proxy
+        self.friends_proxy.add(SECOND_FRIEND_USER)
+        assert 1 == len(self.friends_proxy)
+
+    def test_failed_write_reloads(self):
+        assert 0 == len(self.friends_proxy)
+        with self.assertRaises(AttributeError):
+            self.friends_proxy.update([FIRST_FRIEND_USER, None])
+        assert 0 == len(self.friends_proxy)
+
+
+class FriendsAsyncTests(MemoryDbTestCase, IsolatedAsyncioTestCase):
+    def setUp(self):
+        super().setUp()
+        sqldb = self.patch_sqldb(f"{MODULE_PATH}.sqldb")
+        self.patch_async_sqldb(f"{MODULE_PATH}.async_sqldb", sqldb)
+        self.friends_proxy = _FriendsProxy()
+
+    async def test_acontains(self):
+        self.friends_proxy.add(FIRST_FRIEND_USER)
+        assert await self.friends_proxy.acontains(FIRST_FRIEND_USER)
+        assert not await self.friends_proxy.acontains(SECOND_FRIEND_USER)
+
+    async def test_add_discard(self):
+        await self.friends_proxy.aadd(FIRST_FRIEND_USER)
+        friend = await self.friends_proxy.aget_by_id(FIRST_FRIEND_USER.id)
+        assert FIRST_FRIEND_USER.username == friend.username
+        await self.friends_proxy.adiscard(FIRST_FRIEND_USER)
+        assert await self.friends_proxy.aget_by_id(FIRST_FRIEND_USER.id) is None
+        assert FIRST_FRIEND_USER not in self.friends_proxy
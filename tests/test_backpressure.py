@@ -0,0 +1,95 @@
+from asyncio import Queue
+from unittest import TestCase
+from unittest.mock import patch
+
+from fjfnaranjobot.backpressure import (
+    ACCEPT,
+    REJECT,
+    SHED,
+    UpdateQueueLoad,
+    logger,
+    update_type,
+)
+
+MODULE_PATH = "fjfnaranjobot.backpressure"
+
+
+class UpdateTypeTests(TestCase):
+    def test_update_type(self):
+        assert "message" == update_type({"update_id": 1, "message": {}})
+        assert "poll" == update_type({"poll": {}, "update_id": 1})
+        assert update_type({"update_id": 1}) is None
+
+
+class UpdateQueueLoadTests(TestCase):
+    def test_unbounded(self):
+        queue = Queue()
+        load = UpdateQueueLoad(queue)
+        for _ in range(10):
+            queue.put_nowait(None)
+            assert ACCEPT == load.admit({"edited_message": {}})
+
+    def test_shed_low_priority(self):
+        queue = Queue(maxsize=10)
+        load = UpdateQueueLoad(queue, shed_ratio=0.5)
+        for _ in range(5):
+            assert ACCEPT == load.admit({"edited_message": {}})
+            queue.put_nowait(None)
+            load.record_queued()
+        assert SHED == load.admit({"edited_message": {}})
+        assert ACCEPT == load.admit({"message": {}})
+        assert 1 == load.shed
+
+    def test_reject_when_full(self):
+        queue = Queue(maxsize=2)
+        load = UpdateQueueLoad(queue)
+        queue.put_nowait(None)
+        queue.put_nowait(None)
+        with self.assertLogs(logger) as logs:
+            assert REJECT == load.admit({"message": {}})
+            assert REJECT == load.admit({"message": {}})
+        assert 1 == len(logs.output)
+        assert "Update queue full (2), rejecting updates." in logs.output[0]
+        queue.get_nowait()
+        queue.get_nowait()
+        with self.assertLogs(logger) as logs:
+            assert ACCEPT == load.admit({"message": {}})
+        assert "Update queue back to 0, accepting updates." in logs.output[0]
+        assert 2 == load.rejected
+
+    def test_snapshot(self):
+        queue = Queue(maxsize=3)
+        load = UpdateQueueLoad(queue)
+        queue.put_nowait(None)
+        load.record_queued()
+        queue.put_nowait(None)
+        load.record_queued()
+        queue.get_nowait()
+        assert {
+            "depth": 1,
+            "max_depth": 2,
+            "maxsize": 3,
+            "queued": 2,
+            "shed": 0,
+            "rejected": 0,
+        } == load.snapshot()
+
+    @patch(f"{MODULE_PATH}.monotonic")
+    def test_summary_logged(self, monotonic):
+        monotonic.return_value = 0
+        queue = Queue(maxsize=3)
+        load = UpdateQueueLoad(queue)
+        queue.put_nowait(None)
+        load.record_queued()
+        monotonic.return_value = 299
+        with self.assertNoLogs(logger):
+            load.admit({"message": {}})
+        monotonic.return_value = 300
+        with self.assertLogs(logger) as logs:
+            load.admit({"message": {}})
+        assert (
+            "Update queue so far: depth 1, max_depth 1, maxsize 3,"
+            " queued 1, shed 0, rejected 0"
+        ) in logs.output[0]
+        with self.assertNoLogs(logger):
+            load.admit({"message": {}})
@@ -2,7 +2,8 @@ from logging import DEBUG
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import AsyncMock, MagicMock, patch, sentinel
 
-from fjfnaranjobot.bot import Bot, BotJSONError, BotTokenError, logger
+from fjfnaranjobot.bot import Bot, BotBusyError, BotJSONError, BotTokenError, logger
+from fjfnaranjobot.dedup import RedisUpdateDeduplicator
 
 MODULE_PATH = "fjfnaranjobot.bot"
 
@@ -14,7 +15,6 @@ class BaseBotTestCase(IsolatedAsyncioTestCase):
         self.patched_application = self.application_patcher.start()
         self.builder = MagicMock()
         self.application = MagicMock()
-        self.application.update_queue.put = AsyncMock()
         self.bot = MagicMock()
         self.bot.process_request = AsyncMock()
         self.bot.set_webhook = AsyncMock()
@@ -112,6 +112,21 @@ class BotTests(BaseBotTestCase):
         assert "Sent content isn't JSON." == e.exception.args[0]
         assert "Received non-JSON request." in logs.output[-1]
 
+    @patch(f"{MODULE_PATH}.BOT_WEBHOOK_TOKEN", "bwt")
+    async def test_process_request_invalid_utf8(self, _get_bot_components):
+        bot = Bot()
+        with self.assertRaises(BotJSONError) as e:
+            await bot.process_request("/bwt", b"\xff{}")
+        assert "Sent content isn't JSON." == e.exception.args[0]
+
+    @patch(f"{MODULE_PATH}.BOT_WEBHOOK_TOKEN", "bwt")
+    async def test_process_request_not_object(self, _get_bot_components):
+        bot = Bot()
+        with self.assertRaises(BotJSONError) as e:
+            await bot.process_request("/bwt", b"[]")
+        assert "Sent content isn't a JSON object." == e.exception.args[0]
+        assert bot.update_queue.empty()
+
     @patch(f"{MODULE_PATH}.Update")
     @patch(f"{MODULE_PATH}.BOT_WEBHOOK_TOKEN", "bwt")
     async def test_process_request_dispatched_ok(self, update, _get_bot_components):
@@ -120,9 +135,100 @@ class BotTests(BaseBotTestCase):
         update.de_json.return_value = parsed_update
         with self.assertLogs(logger, DEBUG) as logs:
             await bot.process_request("/bwt", "{}")
-        self.application.update_queue.put.assert_called_once_with(parsed_update)
+        assert parsed_update == bot.update_queue.get_nowait()
+        assert bot.update_queue.empty()
         assert "Dispatch update to library." in logs.output[-1]
 
+    @patch(f"{MODULE_PATH}.Update")
+    @patch(f"{MODULE_PATH}.BOT_WEBHOOK_TOKEN", "bwt")
+    async def test_process_request_repeated_update(self, update, _get_bot_components):
+        bot = Bot()
+        assert "ok" == await bot.process_request("/bwt", b'{"update_id": 1}')
+        with self.assertLogs(logger) as logs:
+            assert "ok" == await bot.process_request("/bwt", b'{"update_id": 1}')
+        assert "Dropping repeated update with id 1." in logs.output[-1]
+        await bot.process_request("/bwt", b'{"update_id": 2}')
+        assert 2 == bot.update_queue.qsize()
+        assert 2 == update.de_json.call_count
+
+    @patch(f"{MODULE_PATH}.BOT_UPDATE_QUEUE_SIZE", 5)
+    def test_bounded_update_queue(self, _get_bot_components):
+        bot = Bot()
+        self.builder.update_queue.assert_called_once_with(bot.update_queue)
+        assert 5 == bot.update_queue.maxsize
+
+    @patch(f"{MODULE_PATH}.Update")
+    @patch(f"{MODULE_PATH}.BOT_UPDATE_QUEUE_SIZE", 2)
+    @patch(f"{MODULE_PATH}.BOT_WEBHOOK_TOKEN", "bwt")
+    async def test_process_request_queue_full(self, update, _get_bot_components):
+        bot = Bot()
+        await bot.process_request("/bwt", b'{"update_id": 1, "message": {}}')
+        with self.assertLogs(logger) as logs:
+            assert "ok" == await bot.process_request(
+                "/bwt", b'{"update_id": 2, "edited_message": {}}'
+            )
+        assert "Dropping low priority update" in logs.output[-1]
+        await bot.process_request("/bwt", b'{"update_id": 3, "message": {}}')
+        with self.assertRaises(BotBusyError):
+            await bot.process_request("/bwt", b'{"update_id": 4, "message": {}}')
+        bot.update_queue.get_nowait()
+        # Not taken for a repeated update after being rejected
+        await bot.process_request("/bwt", b'{"update_id": 4, "message": {}}')
+        assert 2 == bot.update_queue.qsize()
+        # Only built for the queued updates
+        assert 3 == update.de_json.call_count
+        assert {
+            "depth": 2,
+            "max_depth": 2,
+            "maxsize": 2,
+            "queued": 3,
+            "shed": 1,
+            "rejected": 1,
+        } == bot.update_queue_load.snapshot()
+
+    @patch(f"{MODULE_PATH}.Update")
+    @patch(f"{MODULE_PATH}.BOT_WEBHOOK_TOKEN", "bwt")
+    async def test_process_request_failed_update_not_repeated(
+        self, update, _get_bot_components
+    ):
+        bot = Bot()
+        update.de_json.side_effect = [ValueError(), sentinel.update]
+        with self.assertRaises(ValueError):
+            await bot.process_request("/bwt", b'{"update_id": 1}')
+        await bot.process_request("/bwt", b'{"update_id": 1}')
+        assert sentinel.update == bot.update_queue.get_nowait()
+
+    @patch(f"{MODULE_PATH}.Update")
+    @patch(f"{MODULE_PATH}.BOT_UPDATE_QUEUE_SIZE", 1)
+    @patch(f"{MODULE_PATH}.BOT_WEBHOOK_TOKEN", "bwt")
+    async def test_process_request_queue_filled_meanwhile(
+        self, update, _get_bot_components
+    ):
+        bot = Bot()
+        first_seen = bot.deduplicator.afirst_seen
+
+        async def filling_first_seen(update_id):
+            bot.update_queue.put_nowait(sentinel.other)
+            return await first_seen(update_id)
+
+        bot.deduplicator.afirst_seen = filling_first_seen
+        with self.assertRaises(BotBusyError):
+            await bot.process_request("/bwt", b'{"update_id": 1}')
+        assert bot.deduplicator.first_seen(1)
+
+    @patch(f"{MODULE_PATH}.redis_is_enabled", return_value=True)
+    def test_redis_deduplicator(self, _redis_is_enabled, _get_bot_components):
+        assert isinstance(Bot().deduplicator, RedisUpdateDeduplicator)
+
+    @patch(f"{MODULE_PATH}.BOT_WEBHOOK_TOKEN", "bwt")
+    async def test_token_urls_not_routed(self, _get_bot_components):
+        bot = Bot()
+        for url_path in ["/bwt/", "/bwtx", "/bw", "/bwt/other", "bwt", "/x/bwt"]:
+            with self.subTest(url_path=url_path):
+                with self.assertRaises(BotTokenError):
+                    await bot.process_request(url_path, b"{}")
+        assert bot.update_queue.empty()
+
     async def test_other_urls(self, _get_bot_components):
         bot = Bot()
         with self.assertLogs(logger) as logs:
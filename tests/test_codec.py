@@ -0,0 +1,99 @@
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import patch
+from uuid import UUID
+
+from kombu.utils.json import dumps as kombu_dumps
+from kombu.utils.json import loads as kombu_loads
+
+from fjfnaranjobot import codec
+from fjfnaranjobot.codec import dumps, dumps_message, loads, loads_message
+
+MODULE_PATH = "fjfnaranjobot.codec"
+
+_orjson_dumps = codec._orjson_dumps
+
+_VALUE = {"update_id": 2**62, "text": "¡Hola!", "items": [1, 2.5, None, True]}
+
+_TYPED_VALUE = {
+    "at": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+    "items": [date(2024, 1, 2), time(3, 4), Decimal("1.10")],
+    "raw": [b"bytes", b"\xff"],
+}
+
+
+class CodecTests(TestCase):
+    def test_roundtrip(self):
+        assert _VALUE == loads(dumps(_VALUE))
+
+    def test_loads_bytes(self):
+        assert _VALUE == loads(dumps(_VALUE).encode())
+
+    def test_dumps_compact(self):
+        assert '{"a":[1,2]}' == dumps({"a": [1, 2]})
+
+    def test_invalid(self):
+        for data in ["---", b"\xff{}", b"{"]:
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    loads(data)
+
+    def test_message_types(self):
+        assert _TYPED_VALUE == loads_message(dumps_message(_TYPED_VALUE))
+        assert _TYPED_VALUE == loads_message(dumps_message(_TYPED_VALUE).encode())
+
+    def test_message_as_kombu(self):
+        assert _TYPED_VALUE == kombu_loads(dumps_message(_TYPED_VALUE))
+        assert _TYPED_VALUE == loads_message(kombu_dumps(_TYPED_VALUE))
+
+    def test_message_plain(self):
+        assert _VALUE == loads_message(dumps_message(_VALUE))
+
+    def test_message_uuid(self):
+        uuid = UUID(int=1)
+        assert {"id": str(uuid)} == loads_message(dumps_message({"id": uuid}))
+
+    def test_message_non_str_keys(self):
+        assert '{"1":"a"}' == dumps_message({1: "a"})
+        assert kombu_loads(kombu_dumps({1: "a"})) == loads_message('{"1":"a"}')
+
+    def test_message_big_integers(self):
+        value = {"x": 2**70, "y": -(2**64)}
+        assert value == kombu_loads(dumps_message(value))
+        assert value == loads_message(dumps_message(value))
+        assert value == loads_message(dumps_message(value).encode())
+
+    def test_message_unsupported(self):
+        with self.assertRaises(TypeError):
+            dumps_message({"a": object()})
+        with self.assertRaises(ValueError):
+            loads_message('{"__type__": "other", "__value__": 1}')
+
+
+@patch(f"{MODULE_PATH}._orjson_dumps", None)
+@patch(f"{MODULE_PATH}._orjson_loads", None)
+class CodecFallbackTests(TestCase):
+    def test_roundtrip(self):
+        assert _VALUE == loads(dumps(_VALUE).encode())
+
+    def test_dumps_compact(self):
+        assert '{"a":"¡"}' == dumps({"a": "¡"})
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            loads(b"\xff{}")
+
+    def test_message_same_as_orjson(self):
+        with patch(f"{MODULE_PATH}._orjson_dumps", _orjson_dumps):
+            encoded = dumps_message(_TYPED_VALUE)
+        assert encoded == dumps_message(_TYPED_VALUE)
+        assert _TYPED_VALUE == loads_message(encoded)
+
+    def test_message_uuid(self):
+        uuid = UUID(int=1)
+        assert {"id": str(uuid)} == loads_message(dumps_message({"id": uuid}))
+
+    def test_message_big_integers(self):
+        value = {"x": 2**70, 1: "a"}
+        assert {"x": 2**70, "1": "a"} == loads_message(dumps_message(value))
@@ -0,0 +1,128 @@
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import AsyncMock, MagicMock
+
+from telegram.ext import ApplicationHandlerStop
+
+from fjfnaranjobot.backends.sqldb.metrics import query_scope
+from fjfnaranjobot.command import BotCommandError, Command, Paginator
+from fjfnaranjobot.common import PaginatorSource
+from fjfnaranjobot.db import _identity_map
+
+
+class ListSource(PaginatorSource):
+    def __init__(self, items):
+        self.items = items
+        self.page_calls = []
+
+    def count(self):
+        return len(self.items)
+
+    def page(self, offset, limit):
+        self.page_calls.append((offset, limit))
+        return self.items[offset : offset + limit]
+
+    def get_by_id(self, id_):
+        return id_ if id_ in self.items else None
+
+
+class PaginatorTests(TestCase):
+    def _paginator(self, iterable, page_size=2):
+        return Paginator(iterable, str, str, "empty", "handler", page_size)
+
+    def test_invalid_page_size(self):
+        with self.assertRaises(BotCommandError):
+            self._paginator([], 0)
+
+    def test_iterable(self):
+        paginator = self._paginator([1, 2, 3])
+        assert 3 == paginator.count
+        assert not paginator.is_empty
+        assert paginator.has_pages
+        assert paginator.has_next_page(0)
+        assert not paginator.has_next_page(1)
+        assert [3] == paginator.items_in_page(1)
+        assert 2 == paginator.get_by_id("2")
+
+    def test_iterable_empty(self):
+        paginator = self._paginator([])
+        assert paginator.is_empty
+        assert not paginator.has_pages
+
+    def test_source_is_lazy(self):
+        source = MagicMock(spec=PaginatorSource)
+        paginator = self._paginator(source)
+        paginator.reset_items()
+        source.count.assert_not_called()
+        source.page.assert_not_called()
+
+    def test_source_fetches_one_page(self):
+        source = ListSource([1, 2, 3, 4, 5])
+        paginator = self._paginator(source)
+        assert [3, 4] == paginator.items_in_page(1)
+        assert paginator.has_next_page(1)
+        assert [(2, 3)] == source.page_calls
+
+    def test_source_last_page(self):
+        source = ListSource([1, 2, 3])
+        paginator = self._paginator(source)
+        assert paginator.has_pages
+        assert not paginator.has_next_page(1)
+        assert [3] == paginator.items_in_page(1)
+
+    def test_source_exact_pages(self):
+        paginator = self._paginator(ListSource([1, 2]))
+        assert not paginator.has_pages
+        assert [1, 2] == paginator.items_in_page(0)
+
+    def test_source_empty(self):
+        paginator = self._paginator(ListSource([]))
+        assert paginator.is_empty
+        assert 0 == paginator.count
+
+    def test_source_reset_items(self):
+        source = ListSource([1, 2, 3])
+        paginator = self._paginator(source)
+        paginator.items_in_page(0)
+        paginator.items_in_page(0)
+        assert 1 == len(source.page_calls)
+        paginator.reset_items()
+        paginator.items_in_page(0)
+        assert 2 == len(source.page_calls)
+
+    def test_source_count_is_cached(self):
+        source = MagicMock(spec=PaginatorSource)
+        source.count.return_value = 7
+        paginator = self._paginator(source)
+        assert 7 == paginator.count
+        assert 7 == paginator.count
+        source.count.assert_called_once()
+
+    def test_source_get_by_id(self):
+        source = ListSource([1, 2, 3])
+        paginator = self._paginator(source)
+        assert 3 == paginator.get_by_id(3)
+        assert paginator.get_by_id(4) is None
+        assert [] == source.page_calls
+
+
+class ScopedCommand(Command):
+    async def handle(self):
+        self.seen = (query_scope.get(), _identity_map.get())
+
+
+class CommandHandlingTests(IsolatedAsyncioTestCase):
+    async def test_update_scope_reset(self):
+        command = ScopedCommand()
+        command.filter_command = AsyncMock(return_value=True)
+        with self.assertRaises(ApplicationHandlerStop):
+            await command.command_handler(MagicMock(), MagicMock())
+        assert ("ScopedCommand", {}) == command.seen
+        assert query_scope.get() is None
+        assert _identity_map.get() is None
+
+    async def test_update_scope_reset_when_filtered(self):
+        command = ScopedCommand()
+        command.filter_command = AsyncMock(return_value=False)
+        await command.command_handler(MagicMock(), MagicMock())
+        assert query_scope.get() is None
+        assert _identity_map.get() is None
@@ -1,4 +1,19 @@
-from fjfnaranjobot.db import DbField, DbRelation
+from sqlite3 import IntegrityError, OperationalError
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from fjfnaranjobot.db import (
+    Count,
+    DbField,
+    DbIndex,
+    DbRelation,
+    IterableDbRelation,
+    Sum,
+    _identity_map,
+    migrate,
+    transaction,
+    unit_of_work,
+)
 
 from .base import MemoryDbTestCase
 
@@ -9,7 +24,24 @@ class DbRelationMock(DbRelation):
     fields = [
         DbField("id", "INTEGER PRIMARY KEY"),
         DbField("field1", "INTEGER"),
-        DbField("field2"),
+        DbField("field2", "TEXT"),
+    ]
+
+
+class DbRelationIndexedMock(DbRelation):
+    fields = [
+        DbField("id", "INTEGER PRIMARY KEY"),
+        DbField("field1", "INTEGER", index=True),
+        DbField("field2", "INTEGER"),
+        DbField("field3", "INTEGER"),
+    ]
+    indexes = [DbIndex("field2", "field3", unique=True)]
+
+
+class DbRelationInvalidAlter(DbRelation):
+    fields = [
+        DbField("id", "INTEGER PRIMARY KEY"),
+        DbField("name", "TEXT NOT NULL"),
     ]
 
 
@@ -26,6 +58,9 @@ class DbRelationEndingUpperMockA(DbRelation):
 
 
 class DbObjectsTests(MemoryDbTestCase):
+    integrity_error = IntegrityError
+    migrate_error = OperationalError
+
     def setUp(self):
         super().setUp()
         self.sqldb = self.patch_sqldb(f"{MODULE_PATH}.sqldb")
@@ -35,6 +70,57 @@ class DbObjectsTests(MemoryDbTestCase):
         assert "a" == field.name
         assert "b" == field.definition
 
+    def test_db_index_statement(self):
+        assert "CREATE UNIQUE INDEX IF NOT EXISTS t_a_b_idx ON t (a, b)" == DbIndex(
+            "a", "b", unique=True
+        ).create_statement("t")
+
+    def test_db_index_without_fields(self):
+        with self.assertRaises(ValueError):
+            DbIndex()
+
+    def test_db_index_invalid_field(self):
+        with self.assertRaises(ValueError):
+
+            class DbRelationInvalidIndex(DbRelation):
+                fields = [DbField("id", "INTEGER PRIMARY KEY")]
+                indexes = [DbIndex("missing")]
+
+    def test_db_indexes_created(self):
+        DbRelationIndexedMock.count()
+        indexes = self.sqldb.execute_and_fetch_all(
+            "SELECT name FROM sqlite_master WHERE type='index'"
+            " AND tbl_name='db_relation_indexed_mock' ORDER BY name"
+        )
+        assert [
+            ("db_relation_indexed_mock_field1_idx",),
+            ("db_relation_indexed_mock_field2_field3_idx",),
+        ] == indexes
+
+    def test_db_indexes_created_once(self):
+        DbRelationIndexedMock.count()
+        with patch.object(self.sqldb, "execute", side_effect=AssertionError):
+            DbRelationIndexedMock.count()
+
+    def test_explain_uses_index(self):
+        plan = DbRelationIndexedMock.explain(where={"field1": 1})
+        assert any(
+            "USING INDEX db_relation_indexed_mock_field1_idx" in step for step in plan
+        )
+
+    def test_explain_scan(self):
+        plan = DbRelationIndexedMock.explain(where={"field3": 1})
+        assert any(step.startswith("SCAN") for step in plan)
+
+    def test_unique_index(self):
+        first = DbRelationIndexedMock()
+        first.field2, first.field3 = 1, 2
+        first.commit()
+        second = DbRelationIndexedMock()
+        second.field2, second.field3 = 1, 2
+        with self.assertRaises(self.integrity_error):
+            second.commit()
+
     def test_db_object_relation_name(self):
         new_object = DbRelationMock()
         assert "db_relation_mock" == new_object.relation_name
@@ -47,11 +133,58 @@ class DbObjectsTests(MemoryDbTestCase):
         new_object = DbRelationEndingUpperMockA()
         assert "db_relation_ending_upper_mock_a" == new_object.relation_name
 
+    def test_db_relation_metadata_in_class(self):
+        assert "db_relation_mock" == DbRelationMock.relation_name
+        assert (
+            "SELECT id, field1, field2 FROM db_relation_mock"
+            == DbRelationMock._select_statement
+        )
+        assert (
+            "INSERT INTO db_relation_mock (id, field1, field2) VALUES (?, ?, ?)"
+            == DbRelationMock._insert_statement
+        )
+        assert (
+            "INSERT INTO db_relation_mock (id, field1, field2) VALUES (?, ?, ?)"
+            " ON CONFLICT (id) DO UPDATE SET field1=excluded.field1,"
+            " field2=excluded.field2" == DbRelationMock._upsert_statement
+        )
+
+    def test_db_relation_slots(self):
+        assert ("id", "field1", "field2") == DbRelationMock.__slots__
+        new_object = DbRelationMock()
+        assert not hasattr(new_object, "__dict__")
+        with self.assertRaises(AttributeError):
+            new_object.field3 = 0
+
+    def test_db_object_creates_table_once(self):
+        DbRelationMock()
+        with patch.object(self.sqldb, "execute", side_effect=AssertionError):
+            DbRelationMock()
+
+    def test_db_object_hydration_without_ddl(self):
+        for value in range(3):
+            new_object = DbRelationMock()
+            new_object.field1 = value
+            new_object.commit()
+        with patch.object(self.sqldb, "execute", side_effect=AssertionError):
+            assert 3 == len(list(DbRelationMock.all()))
+            assert 1 == len(list(DbRelationMock.select(field1=0)))
+
+    def test_db_object_creates_table_in_each_db(self):
+        DbRelationMock()
+        other_sqldb = self.patch_sqldb(f"{MODULE_PATH}.sqldb")
+        new_object = DbRelationMock()
+        new_object.commit()
+        assert [(1,)] == other_sqldb.execute_and_fetch_all(
+            "SELECT count(*) FROM db_relation_mock"
+        )
+
     def test_db_object_creates_table(self):
         new_object = DbRelationMock()
         new_object.commit()
         values = self.sqldb.execute_and_fetch_one(
-            "select name, sql from sqlite_master where type='table'"
+            "select name, sql from sqlite_master"
+            " where type='table' and name!='versions'"
         )
         create_statement = values[1]
         fields_section = create_statement[
@@ -62,7 +195,47 @@ class DbObjectsTests(MemoryDbTestCase):
         assert 3 == len(fields)
         assert "id INTEGER PRIMARY KEY" in fields
         assert "field1 INTEGER" in fields
-        assert "field2" in fields
+        assert "field2 TEXT" in fields
+
+    def test_db_object_adds_missing_fields(self):
+        self.sqldb.execute("CREATE TABLE db_relation_mock (id INTEGER PRIMARY KEY)")
+        self.sqldb.execute("INSERT INTO db_relation_mock VALUES (1)")
+        assert 1 == DbRelationMock.schema_version()
+        assert ["id", "field1", "field2"] == self.sqldb.table_columns(
+            "db_relation_mock"
+        )
+        assert DbRelationMock(1).field1 is None
+
+    def test_db_object_ignores_extra_columns(self):
+        self.sqldb.execute(
+            "CREATE TABLE db_relation_mock (extra, id INTEGER PRIMARY KEY, field1, field2)"
+        )
+        self.sqldb.execute("INSERT INTO db_relation_mock VALUES ('x', 1, 2, 3)")
+        assert 0 == DbRelationMock.schema_version()
+        assert 2 == DbRelationMock(1).field1
+
+    def test_db_object_schema_version(self):
+        assert 1 == DbRelationMock.schema_version()
+
+    def test_migrate(self):
+        migrate()
+        for relation in [DbRelationMock, DbRelationIndexedMock, A]:
+            assert [] != self.sqldb.table_columns(relation.relation_name)
+        with patch.object(self.sqldb, "execute", side_effect=AssertionError):
+            DbRelationMock.count()
+
+    def test_migrate_rolls_back(self):
+        self.sqldb.execute(
+            "CREATE TABLE db_relation_invalid_alter (id INTEGER PRIMARY KEY)"
+        )
+        self.sqldb.execute("INSERT INTO db_relation_invalid_alter VALUES (1)")
+        self.sqldb.execute("CREATE TABLE db_relation_mock (id INTEGER PRIMARY KEY)")
+        with patch(
+            f"{MODULE_PATH}._relations", [DbRelationMock, DbRelationInvalidAlter]
+        ):
+            with self.assertRaises(self.migrate_error):
+                migrate()
+        assert ["id"] == self.sqldb.table_columns("db_relation_mock")
 
     def test_object_dont_exists(self):
         with self.assertRaises(RuntimeError) as e:
@@ -153,3 +326,462 @@ class DbObjectsTests(MemoryDbTestCase):
         assert 2 == len(selected_objects)
         assert 0 == selected_objects[0].field1
         assert 1 == selected_objects[1].field1
+
+    def test_transaction_groups_commits(self):
+        with self.assertRaises(ValueError):
+            with transaction():
+                for value in range(3):
+                    new_object = DbRelationMock()
+                    new_object.field1 = value
+                    new_object.commit()
+                raise ValueError()
+        assert [] == list(DbRelationMock.all())
+
+    def _create_objects(self, count):
+        for value in range(count):
+            new_object = DbRelationMock()
+            new_object.field1 = value
+            new_object.field2 = "even" if value % 2 == 0 else "odd"
+            new_object.commit()
+
+    def test_object_stream_is_lazy(self):
+        self._create_objects(3)
+        with patch.object(
+            self.sqldb, "execute_and_iterate", wraps=self.sqldb.execute_and_iterate
+        ) as execute_and_iterate:
+            rows = DbRelationMock.all()
+            execute_and_iterate.assert_not_called()
+            assert 0 == next(rows).field1
+            execute_and_iterate.assert_called_once()
+
+    def test_object_stream_order_limit_offset(self):
+        self._create_objects(5)
+        rows = DbRelationMock.stream(
+            where={"field2": "even"}, order_by=["-field1"], limit=2, offset=1
+        )
+        assert [2, 0] == [row.field1 for row in rows]
+
+    def test_object_stream_offset_without_limit(self):
+        self._create_objects(3)
+        rows = DbRelationMock.stream(order_by=["field1"], offset=1)
+        assert [1, 2] == [row.field1 for row in rows]
+
+    def test_object_stream_batches(self):
+        self._create_objects(5)
+        with patch.object(
+            self.sqldb, "execute_and_iterate", wraps=self.sqldb.execute_and_iterate
+        ) as execute_and_iterate:
+            assert 5 == len(list(DbRelationMock.stream(batch_size=2)))
+        assert 2 == execute_and_iterate.call_args.kwargs["batch_size"]
+
+    def test_object_count(self):
+        self._create_objects(5)
+        assert 5 == DbRelationMock.count()
+        assert 2 == DbRelationMock.count({"field2": "odd"})
+
+    def test_object_get(self):
+        self._create_objects(2)
+        assert 1 == DbRelationMock.get(2).field1
+        assert DbRelationMock.get(3) is None
+
+    def test_iterable_relation_paginator_source(self):
+        self._create_objects(5)
+        source = IterableDbRelation(DbRelationMock)
+        assert 5 == source.count()
+        assert [2, 3] == [row.field1 for row in source.page(2, 2)]
+        assert [4] == [row.field1 for row in source.page(4, 2)]
+        assert 3 == source.get_by_id(4).field1
+        assert source.get_by_id(6) is None
+
+    def test_object_commit_single_statement(self):
+        self._create_objects(1)
+        new_object = DbRelationMock(1)
+        new_object.field1 = 5
+        with patch.object(
+            self.sqldb, "execute_and_fetch_one", wraps=self.sqldb.execute_and_fetch_one
+        ) as execute_and_fetch_one:
+            new_object.commit()
+        execute_and_fetch_one.assert_called_once_with(
+            "UPDATE db_relation_mock SET field1=? WHERE id=? RETURNING id", [5, 1]
+        )
+        assert 5 == DbRelationMock.get(1).field1
+
+    def test_object_commit_new_id(self):
+        new_object = DbRelationMock()
+        new_object.id = 7
+        new_object.commit()
+        assert 7 == DbRelationMock.get(7).id
+
+    def test_object_commit_unchanged(self):
+        self._create_objects(1)
+        new_object = DbRelationMock(1)
+        with patch.object(
+            self.sqldb, "execute_and_fetch_one", side_effect=AssertionError
+        ):
+            with patch.object(self.sqldb, "execute", side_effect=AssertionError):
+                new_object.commit()
+
+    def test_object_commit_twice(self):
+        self._create_objects(1)
+        new_object = DbRelationMock(1)
+        new_object.field1 = 5
+        new_object.commit()
+        with patch.object(
+            self.sqldb, "execute_and_fetch_one", side_effect=AssertionError
+        ):
+            new_object.commit()
+
+    def test_object_commit_new_then_unchanged(self):
+        new_object = DbRelationMock()
+        new_object.commit()
+        with patch.object(
+            self.sqldb, "execute_and_fetch_one", side_effect=AssertionError
+        ):
+            new_object.commit()
+
+    def test_object_commit_deleted_meanwhile(self):
+        self._create_objects(1)
+        new_object = DbRelationMock(1)
+        self.sqldb.execute("DELETE FROM db_relation_mock")
+        new_object.field1 = 5
+        new_object.commit()
+        assert 5 == DbRelationMock.get(1).field1
+
+    def test_object_commit_partial(self):
+        self._create_objects(1)
+        (row,) = DbRelationMock.only("id", "field1")
+        row.field1 = 5
+        row.commit()
+        assert (5, "even") == (
+            DbRelationMock.get(1).field1,
+            DbRelationMock.get(1).field2,
+        )
+
+    def test_object_upsert_many(self):
+        self._create_objects(2)
+        first = DbRelationMock(1)
+        first.field1 = 10
+        new_object = DbRelationMock()
+        new_object.field1 = 20
+        DbRelationMock.upsert_many([first, new_object])
+        assert 3 == new_object.id
+        assert [10, 1, 20] == [
+            row.field1 for row in DbRelationMock.query().order_by("id")
+        ]
+
+    def test_object_new_ids_after_own_ids(self):
+        upserted = DbRelationMock()
+        upserted.id = 10
+        upserted.upsert()
+        created = DbRelationMock()
+        created.id = 20
+        DbRelationMock.bulk_create([created, DbRelationMock()])
+        many = DbRelationMock()
+        many.id = 30
+        many_new = DbRelationMock()
+        DbRelationMock.upsert_many([many, many_new])
+        new_object = DbRelationMock()
+        new_object.commit()
+        assert 31 == many_new.id
+        assert 32 == new_object.id
+        assert [10, 20, 21, 30, 31, 32] == [
+            row.id for row in DbRelationMock.query().order_by("id")
+        ]
+
+    def test_object_only(self):
+        self._create_objects(3)
+        rows = list(DbRelationMock.only("id", "field1", where={"field2": "even"}))
+        assert [(1, 0), (3, 2)] == [(row.id, row.field1) for row in rows]
+        with self.assertRaises(AttributeError):
+            rows[0].field2
+
+    def test_object_only_reads_named_columns(self):
+        self._create_objects(1)
+        with patch.object(
+            self.sqldb, "execute_and_iterate", wraps=self.sqldb.execute_and_iterate
+        ) as execute_and_iterate:
+            list(DbRelationMock.only("field1"))
+        assert execute_and_iterate.call_args.args[0].startswith(
+            "SELECT field1 FROM db_relation_mock"
+        )
+
+    def test_object_only_invalid_field(self):
+        with self.assertRaises(ValueError):
+            list(DbRelationMock.only("field3"))
+
+    def test_object_values(self):
+        self._create_objects(3)
+        assert [(2, "even"), (1, "odd")] == list(
+            DbRelationMock.values("field1", "field2", order_by=["-field1"], limit=2)
+        )
+
+    def test_object_get_only(self):
+        self._create_objects(2)
+        row = DbRelationMock.get(2, only=("id", "field2"))
+        assert "odd" == row.field2
+        with self.assertRaises(AttributeError):
+            row.field1
+        assert DbRelationMock.get(3, only=("id",)) is None
+
+    def test_object_bulk_create(self):
+        new_objects = []
+        for value in range(3):
+            new_object = DbRelationMock()
+            new_object.field1 = value
+            new_objects.append(new_object)
+        with patch.object(
+            self.sqldb, "execute_many", wraps=self.sqldb.execute_many
+        ) as execute_many:
+            DbRelationMock.bulk_create(new_objects)
+        execute_many.assert_called_once()
+        assert [0, 1, 2] == [row.field1 for row in DbRelationMock.all()]
+
+    def test_object_bulk_create_rolls_back(self):
+        first, second = DbRelationMock(), DbRelationMock()
+        first.id = second.id = 1
+        with self.assertRaises(self.integrity_error):
+            DbRelationMock.bulk_create([first, second])
+        assert 0 == DbRelationMock.count()
+
+    def test_object_bulk_update(self):
+        self._create_objects(3)
+        rows = list(DbRelationMock.all())
+        for row in rows:
+            row.field1 += 10
+            row.field2 = "changed"
+        DbRelationMock.bulk_update(rows, ["field1"])
+        assert [(10, "even"), (11, "odd"), (12, "even")] == list(
+            DbRelationMock.values("field1", "field2")
+        )
+        rows[0].commit()
+        assert "changed" == DbRelationMock.get(1).field2
+
+    def test_object_bulk_update_all_fields(self):
+        self._create_objects(1)
+        (row,) = DbRelationMock.all()
+        row.field2 = "changed"
+        DbRelationMock.bulk_update([row])
+        assert "changed" == DbRelationMock.get(1).field2
+
+    def test_object_bulk_update_without_id(self):
+        with self.assertRaises(ValueError):
+            DbRelationMock.bulk_update([DbRelationMock()])
+
+    def test_object_delete_where(self):
+        self._create_objects(4)
+        DbRelationMock.delete_where(field2="odd", field1__gt=1)
+        assert [0, 1, 2] == [row.field1 for row in DbRelationMock.all()]
+
+    def test_object_delete_where_forgets_rows(self):
+        self._create_objects(1)
+        with unit_of_work():
+            DbRelationMock(1)
+            DbRelationMock.delete_where()
+            assert DbRelationMock.get(1) is None
+
+    def test_query_delete_with_limit(self):
+        with self.assertRaises(ValueError):
+            DbRelationMock.query().limit(1).delete()
+
+    def test_unit_of_work_reuses_rows(self):
+        self._create_objects(2)
+        with unit_of_work():
+            first = DbRelationMock(1)
+            with patch.object(
+                self.sqldb, "execute_and_fetch_one", side_effect=AssertionError
+            ):
+                assert first is DbRelationMock(1)
+                assert first is DbRelationMock.get(1)
+            assert first is next(DbRelationMock.all())
+        assert first is not DbRelationMock(1)
+
+    def test_unit_of_work_remembers_new_rows(self):
+        with unit_of_work():
+            new_object = DbRelationMock()
+            new_object.commit()
+            assert new_object is DbRelationMock(new_object.id)
+
+    def test_unit_of_work_forgets_deleted_rows(self):
+        self._create_objects(1)
+        with unit_of_work():
+            DbRelationMock(1).delete()
+            with self.assertRaises(RuntimeError):
+                DbRelationMock(1)
+
+    def test_unit_of_work_streamed_rows_not_remembered(self):
+        self._create_objects(50)
+        with unit_of_work():
+            assert 50 == sum(1 for _ in DbRelationMock.stream(batch_size=10))
+            assert {} == _identity_map.get()
+            first = DbRelationMock.get(1)
+            assert 1 == len(_identity_map.get())
+            assert first is next(DbRelationMock.all())
+
+    def test_unit_of_work_partial_rows_not_remembered(self):
+        self._create_objects(1)
+        with unit_of_work():
+            (row,) = DbRelationMock.only("id")
+            assert row is not DbRelationMock(1)
+
+    def test_no_unit_of_work(self):
+        self._create_objects(1)
+        assert DbRelationMock(1) is not DbRelationMock(1)
+
+    def test_iterable_relation_only(self):
+        self._create_objects(2)
+        source = IterableDbRelation(DbRelationMock, only=("id", "field2"))
+        assert ["even", "odd"] == [row.field2 for row in source]
+        assert ["odd"] == [row.field2 for row in source.page(1, 1)]
+        assert "even" == source.get_by_id(1).field2
+
+    def test_object_stream_invalid_field(self):
+        with self.assertRaises(ValueError) as e:
+            list(DbRelationMock.stream(order_by=["-field1; DROP"]))
+        assert (
+            "Field 'field1; DROP' doesn't exists in relation 'db_relation_mock'."
+            == e.exception.args[0]
+        )
+
+
+class DbObjectsAsyncTests(MemoryDbTestCase, IsolatedAsyncioTestCase):
+    def setUp(self):
+        super().setUp()
+        sqldb = self.patch_sqldb(f"{MODULE_PATH}.sqldb")
+        self.patch_async_sqldb(f"{MODULE_PATH}.async_sqldb", sqldb)
+
+    async def test_object_aget_dont_exists(self):
+        with self.assertRaises(RuntimeError) as e:
+            await DbRelationMock.aget(1)
+        assert (
+            "Row with id 1 doesn't exists in relation 'db_relation_mock'."
+            == e.exception.args[0]
+        )
+
+    async def test_object_acommit_aget(self):
+        new_object = DbRelationMock()
+        new_object.field1 = 0
+        await new_object.acommit()
+        created_object = await DbRelationMock.aget(new_object.id)
+        assert 0 == created_object.field1
+        created_object.field2 = "f"
+        await created_object.acommit()
+        replaced_object = DbRelationMock(new_object.id)
+        assert "f" == replaced_object.field2
+
+    async def test_object_aget_unit_of_work(self):
+        new_object = DbRelationMock()
+        await new_object.acommit()
+        with unit_of_work():
+            first = await DbRelationMock.aget(new_object.id)
+            assert first is await DbRelationMock.aget(new_object.id)
+
+    async def test_object_adelete(self):
+        new_object = DbRelationMock()
+        await new_object.acommit()
+        await new_object.adelete()
+        assert [] == list(DbRelationMock.all())
+
+
+class QueryTests(MemoryDbTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sqldb = self.patch_sqldb(f"{MODULE_PATH}.sqldb")
+        for value in range(6):
+            new_object = DbRelationMock()
+            new_object.field1 = value
+            new_object.field2 = "even" if value % 2 == 0 else "odd"
+            new_object.commit()
+
+    def test_query_compiles_parameterized_sql(self):
+        query = (
+            DbRelationMock.query()
+            .filter(field1__gte=1, field2__in=["odd"])
+            .order_by("-field1")
+            .limit(2)
+        )
+        assert (
+            "SELECT id, field1, field2 FROM db_relation_mock"
+            " WHERE field1>=? AND field2 IN (?) ORDER BY field1 DESC"
+            " LIMIT ? OFFSET ?",
+            [1, "odd", 2, 0],
+        ) == query._compile_rows()
+
+    def test_query_comparisons(self):
+        query = DbRelationMock.query().filter(field1__gt=1, field1__lte=3)
+        assert [2, 3] == [row.field1 for row in query]
+        query = DbRelationMock.query().filter(field1__lt=1)
+        assert [0] == [row.field1 for row in query]
+        query = DbRelationMock.query().filter(field2__ne="even")
+        assert [1, 3, 5] == [row.field1 for row in query]
+
+    def test_query_in(self):
+        query = DbRelationMock.query().filter(field1__in=(1, 4, 7))
+        assert [1, 4] == [row.field1 for row in query]
+
+    def test_query_in_empty(self):
+        assert [] == list(DbRelationMock.query().filter(field1__in=[]))
+
+    def test_query_unknown_lookup(self):
+        with self.assertRaises(ValueError) as e:
+            DbRelationMock.query().filter(field1__like="a")
+        assert "Unknown lookup 'like' for field 'field1'." == e.exception.args[0]
+
+    def test_query_invalid_field(self):
+        with self.assertRaises(ValueError):
+            DbRelationMock.query().filter(field3=1)
+        with self.assertRaises(ValueError):
+            DbRelationMock.query().order_by("-field3")
+
+    def test_query_is_immutable(self):
+        query = DbRelationMock.query().filter(field2="odd")
+        query.filter(field1=1)
+        assert 3 == query.count()
+
+    def test_query_order_limit_offset(self):
+        query = DbRelationMock.query().order_by("-field1").limit(2).offset(1)
+        assert [4, 3] == [row.field1 for row in query]
+
+    def test_query_first(self):
+        assert 5 == DbRelationMock.query().order_by("-field1").first().field1
+        assert DbRelationMock.query().filter(field1=9).first() is None
+
+    def test_query_values(self):
+        query = DbRelationMock.query().filter(field1__lt=2)
+        assert [(0, "even"), (1, "odd")] == list(query.values("field1", "field2"))
+
+    def test_query_count(self):
+        assert 6 == DbRelationMock.query().count()
+        assert 2 == DbRelationMock.query().filter(field1__gt=3).count()
+
+    def test_query_count_with_limit(self):
+        assert 2 == DbRelationMock.query().offset(4).count()
+
+    def test_query_sum(self):
+        assert 9 == DbRelationMock.query().filter(field2="odd").sum("field1")
+        assert 9 == DbRelationMock.query().order_by("-field1").limit(2).sum("field1")
+
+    def test_query_sum_empty(self):
+        assert DbRelationMock.query().filter(field1=9).sum("field1") is None
+
+    def test_query_scalar_with_group_by(self):
+        with self.assertRaises(ValueError):
+            DbRelationMock.query().group_by("field2").count()
+
+    def test_query_aggregate(self):
+        query = DbRelationMock.query().filter(field1__gte=1).group_by("field2")
+        assert [("even", 2, 6), ("odd", 3, 9)] == list(
+            query.order_by("field2").aggregate(Count(), Sum("field1"))
+        )
+
+    def test_query_aggregate_without_group(self):
+        assert [(6, 15)] == list(
+            DbRelationMock.query().aggregate(Count("field1"), Sum("field1"))
+        )
+
+    def test_query_aggregate_invalid_field(self):
+        with self.assertRaises(ValueError):
+            list(DbRelationMock.query().aggregate(Sum("field3")))
+
+    def test_query_explain(self):
+        plan = DbRelationMock.query().filter(id=1).explain()
+        assert any("INTEGER PRIMARY KEY" in step for step in plan)
@@ -0,0 +1,68 @@
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+from fjfnaranjobot.dedup import RedisUpdateDeduplicator, UpdateDeduplicator
+
+from .fake_redis import FakeRedis
+
+MODULE_PATH = "fjfnaranjobot.dedup"
+
+
+class UpdateDeduplicatorTests(TestCase):
+    def test_repeated(self):
+        deduplicator = UpdateDeduplicator()
+        assert deduplicator.first_seen(1)
+        assert deduplicator.first_seen(2)
+        assert not deduplicator.first_seen(1)
+
+    def test_forget(self):
+        deduplicator = UpdateDeduplicator()
+        assert deduplicator.first_seen(1)
+        deduplicator.forget(1)
+        deduplicator.forget(2)
+        assert deduplicator.first_seen(1)
+
+    @patch(f"{MODULE_PATH}.monotonic")
+    def test_window_expires(self, monotonic):
+        deduplicator = UpdateDeduplicator(window_seconds=10)
+        monotonic.return_value = 100
+        assert deduplicator.first_seen(1)
+        monotonic.return_value = 105
+        assert deduplicator.first_seen(2)
+        monotonic.return_value = 110
+        assert deduplicator.first_seen(1)
+        assert not deduplicator.first_seen(2)
+
+    def test_bounded(self):
+        deduplicator = UpdateDeduplicator(max_size=2)
+        for update_id in [1, 2, 3]:
+            assert deduplicator.first_seen(update_id)
+        assert 2 == len(deduplicator._seen)
+        assert deduplicator.first_seen(1)
+        assert not deduplicator.first_seen(3)
+
+
+class RedisUpdateDeduplicatorTests(TestCase):
+    def test_shared_by_replicas(self):
+        redis = FakeRedis()
+        first = RedisUpdateDeduplicator(redis, window_seconds=30)
+        second = RedisUpdateDeduplicator(redis, window_seconds=30)
+        assert first.first_seen(1)
+        assert not second.first_seen(1)
+        assert second.first_seen(2)
+        assert {"update:1": 30, "update:2": 30} == redis.expirations
+
+    def test_forget(self):
+        deduplicator = RedisUpdateDeduplicator(FakeRedis())
+        assert deduplicator.first_seen(1)
+        deduplicator.forget(1)
+        assert deduplicator.first_seen(1)
+
+
+class RedisUpdateDeduplicatorAsyncTests(IsolatedAsyncioTestCase):
+    async def test_async(self):
+        deduplicator = RedisUpdateDeduplicator(FakeRedis())
+        assert await deduplicator.afirst_seen(1)
+        assert not await deduplicator.afirst_seen(1)
+        await deduplicator.aforget(1)
+        assert await deduplicator.afirst_seen(1)
@@ -0,0 +1,90 @@
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, patch
+
+from fjfnaranjobot.bot import BotBusyError, BotJSONError
+from fjfnaranjobot.server import application
+
+MODULE_PATH = "fjfnaranjobot.server"
+
+
+@patch(f"{MODULE_PATH}.BOT_MAX_BODY_BYTES", 10)
+class ApplicationTests(IsolatedAsyncioTestCase):
+    def setUp(self):
+        super().setUp()
+        bot_patcher = patch(f"{MODULE_PATH}.bot")
+        self.bot = bot_patcher.start()
+        self.addCleanup(bot_patcher.stop)
+        self.bot.process_request = AsyncMock(return_value="ok")
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def request(self, chunks, headers=None):
+        messages = [
+            {"body": chunk, "more_body": index < len(chunks) - 1}
+            for index, chunk in enumerate(chunks)
+        ]
+        receive = AsyncMock(side_effect=messages)
+        scope = {"type": "http", "path": "/bwt", "headers": headers or []}
+        await application(scope, receive, self.send)
+        return receive
+
+    @property
+    def status(self):
+        return self.sent[0]["status"]
+
+    async def test_chunks_joined(self):
+        await self.request([b"{", b'"a"', b":1}"])
+        self.bot.process_request.assert_called_once_with("/bwt", b'{"a":1}')
+        assert 200 == self.status
+
+    async def test_single_chunk(self):
+        await self.request([b"{}"])
+        self.bot.process_request.assert_called_once_with("/bwt", b"{}")
+
+    async def test_body_too_large(self):
+        await self.request([b"123456", b"123456"])
+        self.bot.process_request.assert_not_called()
+        assert 413 == self.status
+
+    async def test_content_length_too_large(self):
+        receive = await self.request([b"{}"], [(b"content-length", b"11")])
+        receive.assert_not_called()
+        self.bot.process_request.assert_not_called()
+        assert 413 == self.status
+
+    async def test_content_length_invalid(self):
+        await self.request([b"{}"], [(b"content-length", b"x")])
+        self.bot.process_request.assert_not_called()
+        assert 400 == self.status
+
+    async def test_content_length_valid(self):
+        await self.request([b"{}"], [(b"content-length", b"2")])
+        assert 200 == self.status
+
+    async def test_static_replies_without_bot(self):
+        for path, reply in [("/", b"I'm fjfnaranjo's bot."), ("/ping", b"pong")]:
+            with self.subTest(path=path):
+                self.sent = []
+                receive = AsyncMock()
+                await application(
+                    {"type": "http", "path": path, "headers": []},
+                    receive,
+                    self.send,
+                )
+                assert 200 == self.status
+                assert reply == self.sent[1]["body"]
+                receive.assert_not_called()
+        self.bot.process_request.assert_not_called()
+
+    async def test_bot_json_error(self):
+        self.bot.process_request.side_effect = BotJSONError("Sent content isn't JSON.")
+        await self.request([b"-"])
+        assert 400 == self.status
+
+    async def test_bot_busy(self):
+        self.bot.process_request.side_effect = BotBusyError("Too many updates.")
+        await self.request([b"{}"])
+        assert 429 == self.status
+        assert [b"retry-after", b"5"] in self.sent[0]["headers"]
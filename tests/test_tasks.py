@@ -1,9 +1,22 @@
+from datetime import datetime
 from unittest import TestCase
-from unittest.mock import call, patch
+from unittest.mock import MagicMock, call, patch
 
 from celery import Celery
+from kombu.serialization import dumps, loads
 
-from fjfnaranjobot.tasks import app, setup_periodic_tasks, setup_tasks
+from fjfnaranjobot.backends.sqldb.metrics import query_scope
+from fjfnaranjobot.codec import CELERY_CONTENT_TYPE, CELERY_SERIALIZER
+from fjfnaranjobot.db import _identity_map
+from fjfnaranjobot.tasks import (
+    app,
+    end_task_unit_of_work,
+    setup_periodic_tasks,
+    setup_tasks,
+    start_task_unit_of_work,
+    start_worker_backends,
+    stop_worker_backends,
+)
 
 MODULE_PATH = "fjfnaranjobot.tasks"
 
@@ -12,6 +25,36 @@ class TasksTests(TestCase):
     def test_app_is_celery(self):
         assert isinstance(app, Celery)
 
+    def test_app_uses_codec_serializer(self):
+        assert CELERY_SERIALIZER == app.conf.task_serializer
+        assert "json" == app.conf.result_serializer
+        payload = {
+            "profile_id": 1,
+            "players": [{"nickname": "n"}],
+            "at": datetime(2024, 1, 2, 3, 4, 5),
+        }
+        content_type, content_encoding, data = dumps(payload, CELERY_SERIALIZER)
+        assert CELERY_CONTENT_TYPE == content_type
+        assert payload == loads(data, content_type, content_encoding)
+        # Same envelopes as kombu's json serializer
+        assert payload == loads(data, "application/json", content_encoding)
+
+    def test_task_unit_of_work(self):
+        start_task_unit_of_work(task_id="id", task=MagicMock(name="task"))
+        assert {} == _identity_map.get()
+        assert query_scope.get() is not None
+        end_task_unit_of_work(task_id="id")
+        assert _identity_map.get() is None
+        assert query_scope.get() is None
+
+    @patch(f"{MODULE_PATH}.stop_backends")
+    @patch(f"{MODULE_PATH}.start_backends")
+    def test_worker_backends(self, start_backends, stop_backends):
+        start_worker_backends()
+        start_backends.assert_called_once_with()
+        stop_worker_backends()
+        stop_backends.assert_called_once_with()
+
 
 @patch(f"{MODULE_PATH}.app")
 @patch(f"{MODULE_PATH}.get_bot_components", return_value="comp1,comp2")